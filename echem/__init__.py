@@ -0,0 +1,6 @@
+# Roc_Huang
+#
+# 电化学数据处理公共库
+#
+# 各作图脚本共用的读取与分析函数放在这里，脚本通过把仓库根目录加入 sys.path 后
+# 使用 `from echem import chi_parser` 的方式导入。
@@ -0,0 +1,273 @@
+# Roc_Huang
+#
+# 程序功能：
+# 解析结果的磁盘缓存，同一数据目录反复作图时不再重复解析文本。
+# 1. 每个源文件按 (路径, 大小, mtime) 快速判断是否变化；变化时再计算内容哈希，内容未变则沿用旧缓存。
+# 2. 解析得到的数组与头部元数据以 .npz 二进制形式保存在缓存目录中，文件名由内容哈希与读取方式组成。
+# 3. 缓存总大小超过上限时按最近使用时间（LRU）淘汰。
+# 3a. 索引写回时在文件锁内与磁盘上的索引合并，只写入本进程新增 / 使用 / 淘汰的条目；只有本进程写入过新条目时才检查是否需要淘汰。
+#     命中缓存时最近使用时间只在超过 TOUCH_SECONDS 后才更新，热缓存上的重复运行不必写回索引。
+#     进程池的子进程不会执行 atexit，创建进程池时传入 initializer=cache.worker_init，子进程退出时统一写回一次。
+# 4. 缓存目录与大小上限可用环境变量 ECHEM_CACHE_DIR / ECHEM_CACHE_MAX_MB 修改，ECHEM_CACHE=0 时关闭缓存。
+
+import atexit
+import contextlib
+import hashlib
+import json
+import multiprocessing.util
+import os
+import time
+
+import numpy as np
+
+CACHE_DIR = os.environ.get('ECHEM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'echem'))
+MAX_CACHE_BYTES = int(float(os.environ.get('ECHEM_CACHE_MAX_MB', '512')) * 1024 * 1024)
+ENABLED = os.environ.get('ECHEM_CACHE', '1') != '0'
+
+_INDEX_NAME = 'index.json'
+_LOCK_NAME = 'index.lock'
+# 锁文件超过该时间未释放时视为持有进程已退出
+_LOCK_STALE_SECONDS = 30.0
+# 缓存格式变化时递增，旧条目自动失效
+_VERSION = 1
+# 命中缓存时，记录的最近使用时间早于该秒数才更新（LRU 只需粗略的时间）
+TOUCH_SECONDS = 3600.0
+
+_index = None
+_dirty = False
+# 本进程是否写入过新条目（只有此时才可能超出大小上限）
+_added = False
+# 本进程自上次写回以来改动过的源文件记录、缓存条目与已删除的条目
+_touched_sources = set()
+_touched_entries = set()
+_removed_entries = set()
+
+
+def _index_path():
+    return os.path.join(CACHE_DIR, _INDEX_NAME)
+
+
+def _read_index():
+    """读取磁盘上的索引，不存在或版本不符时返回空索引"""
+    try:
+        with open(_index_path(), 'r', encoding='utf-8') as file:
+            index = json.load(file)
+        if index.get('version') != _VERSION:
+            raise ValueError
+        return index
+    except (OSError, ValueError):
+        return {'version': _VERSION, 'sources': {}, 'entries': {}}
+
+
+def _load_index():
+    global _index
+    if _index is None:
+        _index = _read_index()
+    return _index
+
+
+@contextlib.contextmanager
+def _locked():
+    """以独占创建锁文件的方式在进程之间互斥（Windows 与 POSIX 通用）"""
+    lock_path = os.path.join(CACHE_DIR, _LOCK_NAME)
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > _LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _merge(disk):
+    """把本进程的改动合并进磁盘上的索引；同一条目的最近使用时间取两者中较晚的"""
+    for key in _touched_sources:
+        if key in _index['sources']:
+            disk['sources'][key] = _index['sources'][key]
+    for name in _removed_entries:
+        disk['entries'].pop(name, None)
+    for name in _touched_entries:
+        entry = _index['entries'].get(name)
+        if entry is None:
+            continue
+        previous = disk['entries'].get(name)
+        if previous:
+            entry = {**entry, 'last_used': max(entry['last_used'], previous['last_used'])}
+        disk['entries'][name] = entry
+    return disk
+
+
+def _write_index(index):
+    tmp_path = f'{_index_path()}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(index, file, ensure_ascii=False)
+    os.replace(tmp_path, _index_path())
+
+
+def flush():
+    """在文件锁内与磁盘上的索引合并，写入过新条目且超出上限时先淘汰，再写回（先写临时文件再替换，避免中断时损坏）"""
+    global _index, _dirty, _added
+    if not _dirty or _index is None:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with _locked():
+            _index = _merge(_read_index())
+            if _added:
+                _evict()
+            _write_index(_index)
+    except OSError as e:
+        print(f"写入缓存索引失败: {e}")
+        return
+    _touched_sources.clear()
+    _touched_entries.clear()
+    _removed_entries.clear()
+    _dirty = _added = False
+
+
+atexit.register(flush)
+
+
+def worker_init():
+    """进程池的 initializer：子进程不执行 atexit，改为在子进程退出时写回一次索引"""
+    multiprocessing.util.Finalize(None, flush, exitpriority=10)
+
+
+def file_hash(file_path):
+    """源文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_hash(file_path, stat):
+    """大小与 mtime 未变时直接使用记录的哈希，否则重新计算"""
+    global _dirty
+    sources = _load_index()['sources']
+    key = os.path.abspath(file_path)
+    record = sources.get(key)
+    if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+        return record['hash']
+    digest = file_hash(file_path)
+    sources[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+    _touched_sources.add(key)
+    _dirty = True
+    return digest
+
+
+def _evict():
+    """按最近使用时间淘汰，直到总大小不超过上限"""
+    global _dirty
+    entries = _load_index()['entries']
+    total = sum(entry['bytes'] for entry in entries.values())
+    if total <= MAX_CACHE_BYTES:
+        return
+    for name in sorted(entries, key=lambda n: entries[n]['last_used']):
+        if total <= MAX_CACHE_BYTES:
+            break
+        total -= entries.pop(name)['bytes']
+        _forget(name)
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
+    _dirty = True
+
+
+def _forget(name):
+    _touched_entries.discard(name)
+    _removed_entries.add(name)
+
+
+def _touch(name):
+    _removed_entries.discard(name)
+    _touched_entries.add(name)
+
+
+def _read_entry(path):
+    with np.load(path) as archive:
+        return json.loads(str(archive['meta'])), archive['data']
+
+
+def _write_entry(path, meta, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, meta=np.array(json.dumps(meta, ensure_ascii=False)), data=np.asarray(data))
+    os.replace(tmp_path, path)
+
+
+def load(file_path, kind, loader):
+    """
+    读取 file_path 的解析结果：命中缓存时直接读取 .npz，否则调用 loader(file_path) 解析并写入缓存。
+
+    kind 区分同一文件的不同读取方式；loader 需返回 (meta, data)，meta 可 JSON 序列化，data 为 NumPy 数组。
+    """
+    if not ENABLED:
+        return loader(file_path)
+
+    return _load(file_path, kind, loader)
+
+
+def _load(file_path, kind, loader):
+    global _dirty, _added
+    stat = os.stat(file_path)
+    name = f'{_source_hash(file_path, stat)}-{kind}.npz'
+    path = os.path.join(CACHE_DIR, name)
+    entries = _load_index()['entries']
+
+    if name in entries:
+        try:
+            meta, data = _read_entry(path)
+            now = time.time()
+            if now - entries[name]['last_used'] > TOUCH_SECONDS:
+                entries[name]['last_used'] = now
+                _touch(name)
+                _dirty = True
+            return meta, data
+        except (OSError, ValueError, KeyError):
+            entries.pop(name, None)
+            _forget(name)
+            _dirty = True
+
+    meta, data = loader(file_path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_entry(path, meta, data)
+        entries[name] = {'bytes': os.path.getsize(path), 'last_used': time.time()}
+        _touch(name)
+        _dirty = _added = True
+    except OSError as e:
+        # 缓存目录不可写时只影响速度，不影响结果
+        print(f"写入缓存失败: {e}")
+    return meta, data
+
+
+def clear():
+    """删除全部缓存条目与索引"""
+    global _index, _dirty
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _locked():
+        for name in set(_read_index()['entries']) | set(_load_index()['entries']):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+        _index = {'version': _VERSION, 'sources': {}, 'entries': {}}
+        _write_index(_index)
+    _touched_sources.clear()
+    _touched_entries.clear()
+    _removed_entries.clear()
+    _dirty = _added = False
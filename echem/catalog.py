@@ -0,0 +1,261 @@
+# Roc_Huang
+#
+# 程序功能：
+# 整个数据归档的 SQLite 实验目录，查找"11 月所有 0.848 V 的 EIS"之类的问题不再需要逐个打开文件。
+# 1. files 表：每个 CHI 文件的头部信息（日期、技术、Init E、扫速、频率范围、仪器型号）以及大小 / mtime。
+# 2. samples 表：每个样品文件夹的派生量（Rs（高频截距，见 echem.ohmic）、10 / 100 mA/cm² 过电位、
+#    非法拉第电位处 Δj/2 对扫速拟合得到的 Cdl、R² 与 ECSA，与 echem.cdl / cdl_data.csv 相同）。
+#    表结构变化时递增 _SCHEMA_VERSION，旧目录在下次连接时重建。
+# 3. 重复扫描时只重新读取大小或 mtime 变化的文件，只重新计算这些文件所在文件夹的派生量；已删除的文件从目录中移除。
+# 4. experiments() 按条件查询，返回与 echem.manifest 相同结构的实验字典，可直接交给各作图脚本的处理函数。
+#
+# 用法：python -m echem.catalog <数据根目录> [--db catalog.sqlite]
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+from echem import cdl, chi_binary, chi_parser, manifest, ohmic, overpotential
+
+DB_NAME = 'catalog.sqlite'
+
+# 与作图脚本一致的计算参数（定义见 echem.overpotential）
+AREA_CM2 = overpotential.AREA_CM2  # 电极面积
+REFERENCE_OFFSET = overpotential.REFERENCE_OFFSET  # 参比电极换算到 RHE 的偏移
+EQUILIBRIUM_POTENTIAL = overpotential.EQUILIBRIUM_POTENTIAL  # OER 平衡电位
+
+# 记录在 PRAGMA user_version 中；samples 表由 cdl_max / cdl_min 改为 cdl / cdl_r2 / ecsa 时升为 2
+_SCHEMA_VERSION = 2
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    sample TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    technique TEXT,
+    recorded_at TEXT,
+    init_e REAL,
+    scan_rate REAL,
+    high_freq REAL,
+    low_freq REAL,
+    instrument TEXT,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_kind_init_e ON files (kind, init_e);
+CREATE INDEX IF NOT EXISTS files_recorded_at ON files (recorded_at);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+CREATE TABLE IF NOT EXISTS samples (
+    folder TEXT PRIMARY KEY,
+    sample TEXT NOT NULL,
+    rs REAL,
+    eta_10 REAL,
+    eta_100 REAL,
+    cdl REAL,
+    cdl_r2 REAL,
+    ecsa REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS samples_eta_10 ON samples (eta_10);
+'''
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    if connection.execute('PRAGMA user_version').fetchone()[0] != _SCHEMA_VERSION:
+        # 旧版本的目录直接重建，下次 update 重新读取全部文件
+        connection.executescript('DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS samples;')
+        connection.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _parse_date(text):
+    """CHI 头部日期，如 'Nov. 23, 2024   17:47:14'，转换为 ISO 格式；无法识别时返回 None"""
+    if not text:
+        return None
+    parts = text.replace('.', ' ').replace(',', ' ').split()
+    if len(parts) < 4:
+        return None
+    try:
+        return datetime.strptime(f'{parts[0][:3]} {parts[1]} {parts[2]} {parts[3]}', '%b %d %Y %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+
+def _read_header(path):
+    """只读取文件头部，返回元数据字典"""
+    if path.lower().endswith('.bin'):
+        meta, _ = chi_binary.read_header(path)
+        return meta
+    _, meta = chi_parser.find_data_offset(path)
+    return meta
+
+
+def _file_row(path, experiment, kind, key, stat):
+    meta = _read_header(path)
+    number = lambda name: meta.get(name) if isinstance(meta.get(name), (int, float)) else None
+    init_e = number('Init E (V)')
+    if kind == 'drt' and init_e is None:
+        # DRT 结果文件没有 CHI 头部，电压取自文件名
+        init_e = key
+    return (path, experiment['folder'], experiment['name'], kind, meta.get('technique'),
+            _parse_date(meta.get('date')), init_e, number('Scan Rate (V/s)'),
+            number('High Frequency (Hz)'), number('Low Frequency (Hz)'), meta.get('Instrument Model'),
+            stat.st_size, stat.st_mtime_ns)
+
+
+def overpotentials(potential, current, resistance):
+    """iR 校正后电流密度首次达到 10 / 100 mA/cm² 时的过电位（插值，与作图脚本相同），达不到时为 None"""
+    etas = overpotential.overpotentials([overpotential.corrected_curve(potential, current, resistance)], (10, 100))[0]
+    return tuple(None if np.isnan(eta) else float(eta) for eta in etas)
+
+
+def cv_extrema(current):
+    """CV 电流密度 (mA/cm²) 的最大值与最小值"""
+    current_density = np.asarray(current) * 1000 / AREA_CM2
+    return float(current_density.max()), float(current_density.min())
+
+
+def double_layer_capacitance(experiment):
+    """由实验中各扫速的 CV 计算 Δj/2 法的 Cdl，返回 (Cdl (mF/cm²), R², ECSA (cm²))；不足两个扫速时均为 None"""
+    result = cdl.sample_result(*cdl.experiment_points(experiment))
+    if result is None:
+        return None, None, None
+    return result['cdl'], result['r2'], result['ecsa']
+
+
+def _sample_row(experiment):
+    rs = eta_10 = eta_100 = None
+    try:
+        eis = manifest.read_frame(experiment, 'eis')
+        if eis is not None and not eis.empty:
+            rs = ohmic.spectrum_resistance(eis['Freq'], eis["Z'"], eis["Z''"])
+        lsv = manifest.read_frame(experiment, 'lsv')
+        if rs is not None and lsv is not None and not lsv.empty:
+            eta_10, eta_100 = overpotentials(lsv['Potential'], lsv['Current'], rs)
+        capacitance, r2, ecsa = double_layer_capacitance(experiment)
+    except (OSError, ValueError) as e:
+        print(f"计算 {experiment['name']} 的派生量失败: {e}")
+        capacitance = r2 = ecsa = None
+    return (experiment['folder'], experiment['name'], rs, eta_10, eta_100, capacitance, r2, ecsa, time.time())
+
+
+def update(db_path, root_folder):
+    """扫描 root_folder 并增量更新目录，返回 (新增或变化的文件数, 删除的文件数)"""
+    root_folder = os.path.abspath(root_folder)
+    experiments = manifest.crawl(root_folder)
+    connection = connect(db_path)
+    root_prefix = os.path.join(root_folder, '')
+
+    known = {row['path']: (row['size'], row['mtime_ns'])
+             for row in connection.execute('SELECT path, size, mtime_ns FROM files WHERE substr(path, 1, ?) = ?',
+                                           (len(root_prefix), root_prefix))}
+    seen = set()
+    changed_folders = set()
+    changed = 0
+    with connection:
+        for folder, experiment in experiments.items():
+            for kind, key, path in manifest.files_of(experiment):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # 扫描之后被重命名或删除的文件按已删除处理
+                    continue
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                try:
+                    row = _file_row(path, experiment, kind, key, stat)
+                except (OSError, ValueError) as e:
+                    print(f"读取 {path} 头部失败: {e}")
+                    continue
+                connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+                changed_folders.add(folder)
+                changed += 1
+
+        removed = [path for path in known if path not in seen]
+        for path in removed:
+            folder = connection.execute('SELECT folder FROM files WHERE path = ?', (path,)).fetchone()['folder']
+            connection.execute('DELETE FROM files WHERE path = ?', (path,))
+            changed_folders.add(folder)
+        connection.execute('DELETE FROM samples WHERE folder NOT IN (SELECT DISTINCT folder FROM files)')
+
+        for folder in changed_folders:
+            experiment = experiments.get(folder)
+            if experiment is not None:
+                connection.execute('INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   _sample_row(experiment))
+    connection.close()
+    return changed, len(removed)
+
+
+def query(db_path, kind=None, init_e=None, since=None, until=None, sample=None, tolerance=1e-6):
+    """
+    按条件查询 files 表，返回 sqlite3.Row 列表，每行同时带有所在样品的派生量。
+
+    kind 为 'eis'、'lsv'、'cv'、'cv_rate'、'drt'；since / until 为 ISO 日期字符串（如 '2024-11-01'），
+    until 为开区间（如 '2024-12-01' 表示 11 月底之前）；sample 为样品名中包含的子串。
+    """
+    conditions, params = [], []
+    if kind is not None:
+        conditions.append('f.kind = ?')
+        params.append(kind)
+    if init_e is not None:
+        conditions.append('f.init_e BETWEEN ? AND ?')
+        params += [init_e - tolerance, init_e + tolerance]
+    if since is not None:
+        conditions.append('f.recorded_at >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('f.recorded_at < ?')
+        params.append(until)
+    if sample is not None:
+        conditions.append('f.sample LIKE ?')
+        params.append(f'%{sample}%')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    connection = connect(db_path)
+    rows = connection.execute(f'''
+        SELECT f.*, s.rs, s.eta_10, s.eta_100, s.cdl, s.cdl_r2, s.ecsa
+        FROM files AS f LEFT JOIN samples AS s ON s.folder = f.folder
+        {where}
+        ORDER BY f.folder, f.path''', params).fetchall()
+    connection.close()
+    return rows
+
+
+def experiments(db_path, **conditions):
+    """按 query 的条件查询，并整理为 echem.manifest 结构的实验字典列表，可直接交给 process_eis_files 等函数"""
+    result = {}
+    for row in query(db_path, **conditions):
+        experiment = result.setdefault(row['folder'], manifest.new_experiment(row['folder']))
+        if row['kind'] == 'cv_rate':
+            experiment['cv_rates'][round(row['scan_rate'] * 1000) if row['scan_rate'] else len(experiment['cv_rates'])] = row['path']
+        elif row['kind'] == 'drt':
+            experiment['drt'][row['init_e'] if row['init_e'] is not None else len(experiment['drt'])] = row['path']
+        else:
+            experiment[row['kind']] = row['path']
+    for experiment in result.values():
+        experiment['cv_rates'] = dict(sorted(experiment['cv_rates'].items()))
+        experiment['drt'] = dict(sorted(experiment['drt'].items()))
+    return list(result.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='扫描数据目录并更新 SQLite 实验目录')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--db', help=f'数据库路径，默认为根目录下的 {DB_NAME}')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(args.root, DB_NAME)
+    start = time.perf_counter()
+    changed, removed = update(db_path, args.root)
+    print(f"目录已更新：{changed} 个文件新增或变化，{removed} 个文件删除，用时 {time.perf_counter() - start:.2f} s")
+    print(f"数据库：{db_path}")
@@ -0,0 +1,186 @@
+# Roc_Huang
+#
+# 程序功能：
+# 批量计算双电层电容 Cdl 与电化学活性面积 ECSA，代替逐个文件夹用电流密度最大 / 最小值对扫速 np.polyfit。
+# 1. 每条 CV-<扫速> 取最后一个正扫与负扫半周期（见 echem.dunn.branches），在非法拉第电位 POTENTIAL 处
+#    （WINDOW > 0 时为 POTENTIAL ± WINDOW/2 内的平均值）取 Δj/2 = (j正扫 − j负扫)/2，不受法拉第电流的最大值影响。
+#    POTENTIAL 为 None 时取各样品所有扫速共有电位范围的中点。
+# 2. 所有样品的 Δj/2 – 扫速补齐成 (样品数, 最多扫速数) 的矩阵（不足处为 NaN），
+#    用 n、Σx、Σy、Σx²、Σxy、Σy² 的闭式解一次算出全部样品的斜率（即 Cdl）、截距与 R²。
+# 3. ECSA = Cdl / SPECIFIC_CAPACITANCE × 电极面积。
+#
+# 用法：python -m echem.cdl <数据根目录> [--potential 0.52] [--window 0.02] [--workers N]
+# 结果保存为根目录下的 cdl_data.csv。
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from echem import cache, dunn, manifest, overpotential
+
+AREA_CM2 = overpotential.AREA_CM2  # 电极面积
+POTENTIAL = None  # 取 Δj 的非法拉第电位 (V)，None 为共有电位范围的中点
+WINDOW = 0.0  # 取平均的电位窗口宽度 (V)，0 为单点
+WINDOW_POINTS = 21  # 窗口平均使用的插值点数
+SPECIFIC_CAPACITANCE = 0.04  # 平整电极的比电容 (mF/cm²)，碱性电解液常用值
+
+OUTPUT_CSV = 'cdl_data.csv'
+
+
+def window_grid(low, high, potential=POTENTIAL, window=WINDOW):
+    """取 Δj 的电位点：单点时长度为 1，否则为窗口内 WINDOW_POINTS 个等间距点；超出 [low, high] 时报错"""
+    center = (low + high) / 2 if potential is None else potential
+    grid = np.linspace(center - window / 2, center + window / 2, WINDOW_POINTS if window > 0 else 1)
+    if grid[0] < low or grid[-1] > high:
+        raise ValueError(f"电位 {center:g} V（窗口 {window:g} V）超出 CV 共有范围 {low:.3f}–{high:.3f} V")
+    return grid
+
+
+def half_differences(curves, potential=POTENTIAL, window=WINDOW):
+    """同一样品各扫速 CV（[(电位, 电流密度)]）在取值电位处的 Δj/2，返回与 curves 对应的数组"""
+    halves = [dunn.branches(x, j) for x, j in curves]
+    if any(half is None for pair in halves for half in pair):
+        raise ValueError("CV 数据缺少完整的正扫或负扫")
+    low = max(half[0][0] for pair in halves for half in pair)
+    high = min(half[0][-1] for pair in halves for half in pair)
+    grid = window_grid(low, high, potential, window)
+    return np.array([(np.interp(grid, *anodic) - np.interp(grid, *cathodic)).mean() / 2
+                     for anodic, cathodic in halves])
+
+
+def fit(rates, values):
+    """
+    所有样品 values 对扫速的线性回归，rates / values 为 (样品数, 最多扫速数) 的矩阵，不足处为 NaN。
+
+    返回 (斜率, 截距, R²)，每个样品一个值；有效点少于两个的样品为 NaN。
+    扫速单位 mV/s、values 单位 mA/cm² 时斜率即 Cdl (F/cm²)。
+    """
+    valid = np.isfinite(rates) & np.isfinite(values)
+    x = np.where(valid, rates, 0.0)
+    y = np.where(valid, values, 0.0)
+    n = valid.sum(axis=1).astype(np.float64)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cxx = (x * x).sum(axis=1) - sx * sx / n
+        cyy = (y * y).sum(axis=1) - sy * sy / n
+        cxy = (x * y).sum(axis=1) - sx * sy / n
+        slope = cxy / cxx
+        intercept = (sy - slope * sx) / n
+        r2 = cxy * cxy / (cxx * cyy)
+    enough = n >= 2
+    return np.where(enough, slope, np.nan), np.where(enough, intercept, np.nan), np.where(enough, r2, np.nan)
+
+
+def _pad(rows):
+    """[(扫速, Δj/2)] 补齐为两个 (样品数, 最多扫速数) 的矩阵"""
+    length = max((len(r) for r, _ in rows), default=0)
+    rates = np.full((len(rows), length), np.nan)
+    values = np.full((len(rows), length), np.nan)
+    for row, (r, v) in enumerate(rows):
+        rates[row, :len(r)] = r
+        values[row, :len(v)] = v
+    return rates, values
+
+
+def experiment_points(experiment, potential=POTENTIAL, window=WINDOW):
+    """读取一个样品文件夹的 CV-<扫速> 文件，返回 (扫速 (mV/s), Δj/2 (mA/cm²))；不足两个扫速或无法取值时为空"""
+    rates, curves = [], []
+    for rate, data in manifest.read_cv_rates(experiment):
+        rates.append(rate)
+        curves.append((data['Potential'].to_numpy(), data['Current'].to_numpy() * 1000 / AREA_CM2))
+    if len(rates) < 2:
+        return [], []
+    try:
+        return rates, half_differences(curves, potential, window).tolist()
+    except ValueError as e:
+        print(f"{experiment['name']} 的 Cdl 取值失败: {e}")
+        return [], []
+
+
+def _result(rates, values, slope, r2):
+    """由拟合斜率 (F/cm²) 整理出 'cdl' 结果字典，斜率为 NaN 时为 None"""
+    if np.isnan(slope):
+        return None
+    c = slope * 1000  # mF/cm²
+    return {
+        'cdl': float(c),
+        'r2': float(r2),
+        'ecsa': float(c / SPECIFIC_CAPACITANCE * AREA_CM2),
+        'rates': list(rates),
+        'values': list(values),
+    }
+
+
+def sample_result(rates, values):
+    """单个样品的 Cdl 结果字典（结构同 estimate_experiments 存入的 'cdl'），有效扫速不足两个时为 None"""
+    slope, _, r2 = fit(*_pad([(rates, values)]))
+    return _result(rates, values, slope[0], r2[0])
+
+
+def _points(args):
+    return experiment_points(*args)
+
+
+def estimate_experiments(experiments, potential=POTENTIAL, window=WINDOW, workers=None):
+    """
+    一次性计算各实验的 Cdl，结果保存在实验字典的 'cdl' 中：
+    {'cdl' (mF/cm²), 'r2', 'ecsa' (cm²), 'rates', 'values'}，不足两个扫速时为 None。返回 experiments。
+    """
+    experiments = list(experiments)
+    payload = [({key: value for key, value in experiment.items() if key != 'frames'}, potential, window)
+               for experiment in experiments]
+    if len(payload) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=cache.worker_init) as executor:
+            rows = list(executor.map(_points, payload, chunksize=max(1, len(payload) // 64)))
+    else:
+        rows = [_points(args) for args in payload]
+
+    slope, _, r2 = fit(*_pad(rows))
+    for experiment, (rates, values), s, r in zip(experiments, rows, slope, r2):
+        experiment['cdl'] = _result(rates, values, s, r)
+    return experiments
+
+
+def table(experiments):
+    """有 Cdl 结果的样品每个一行（行字典列表）"""
+    return [{
+        'Folder': experiment['name'],
+        'Cdl (mF/cm²)': experiment['cdl']['cdl'],
+        'R²': experiment['cdl']['r2'],
+        'ECSA (cm²)': experiment['cdl']['ecsa'],
+        'Scan Rates (mV/s)': ', '.join(f'{rate:g}' for rate in experiment['cdl']['rates']),
+    } for experiment in experiments if experiment.get('cdl')]
+
+
+def plot(ax, experiment, unit='mA/cm²', **kwargs):
+    """Δj/2 对扫速的散点与拟合直线；unit 为 Δj/2 的单位（如 CV.py 中的 mA/mg、mA），电容单位随之换成 mF"""
+    result = experiment['cdl']
+    rates = np.asarray(result['rates'], dtype=np.float64)
+    values = np.asarray(result['values'], dtype=np.float64)
+    order = np.argsort(rates, kind='stable')  # 文件顺序不一定按扫速排列，拟合直线按扫速从小到大绘制
+    rates, values = rates[order], values[order]
+    slope, intercept, _ = fit(rates[None], values[None])
+    points = ax.scatter(rates, values, **kwargs)
+    ax.plot(rates, slope[0] * rates + intercept[0], linestyle='--', color=points.get_facecolor()[0],
+            label=f"Cdl: {result['cdl']:.2f} {unit.replace('mA', 'mF', 1)} (R² = {result['r2']:.4f})")
+    ax.set_xlabel('Scan Rate (mV/s)')
+    ax.set_ylabel(f'Δj/2 ({unit})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量计算双电层电容 Cdl 与 ECSA')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--potential', type=float, default=POTENTIAL, help='取 Δj 的电位 (V)，默认为共有电位范围的中点')
+    parser.add_argument('--window', type=float, default=WINDOW, help='取平均的电位窗口宽度 (V)')
+    parser.add_argument('--workers', type=int, help='进程数，默认为 CPU 核数')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    experiments = estimate_experiments(manifest.crawl(root).values(), args.potential, args.window, args.workers)
+    rows = table(experiments)
+    output = os.path.join(root, OUTPUT_CSV)
+    pd.DataFrame(rows).to_csv(output, index=False, encoding='utf-8-sig')
+    print(f"已计算 {len(rows)} 个样品的 Cdl，结果保存到：{output}")
@@ -0,0 +1,129 @@
+# Roc_Huang
+#
+# 程序功能：
+# CV 的电荷积分：每个半周期（Segment）的阳极 / 阴极电荷、∫ I dE 与比电容，以及相对第一段的容量保持率。
+# 1. 多个文件的电位、电流首尾相接成一个数组，每个文件按 echem.cv_cycles.segment_bounds 分段后加上文件偏移。
+# 2. 对整个数组只做一次梯形积分：dt = |dE| / 扫速，I > 0 与 I < 0 部分分别积分得到阳极 / 阴极电荷增量，
+#    文件之间的衔接增量置 0；再用 np.add.reduceat 在各段起点处一次归约出所有段的结果。
+# 3. 比电容 = (阳极电荷 + |阴极电荷|) / 该段电位窗口；给出活性物质质量 (mg) 时电荷与电容都除以质量。
+# 4. retention 为每段总电荷与同一文件、同一扫描方向第一段之比，所有文件的容量衰减一次得到。
+#
+# 用法：python -m echem.charge <数据根目录> [--mass 0.5]
+# 所有样品文件夹的 CV 与 CV-<扫速> 文件的逐段结果保存为根目录下的 cv_charge.csv。
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from echem import chi_parser, cv_cycles, manifest
+
+OUTPUT_CSV = 'cv_charge.csv'
+
+
+def integrate(curves, mass=0.0):
+    """
+    curves 为 [(电位 (V), 电流, 扫速 (V/s))]，返回各列为 NumPy 数组的字典（每段一行，可直接交给 pd.DataFrame）：
+    file（curves 中的序号）、segment / cycle（文件内从 1 开始）、start / stop（文件内下标）、direction（1 正扫，−1 负扫）、
+    window（电位窗口，V）、anodic_charge、cathodic_charge、area（∫ I dE）、capacitance 与 retention。
+
+    电流为 mA 时电荷单位 mC、电容单位 mF；mass > 0 时再除以质量 (mg)，即 C/g 与 F/g。扫速未知的文件电荷为 NaN。
+    """
+    curves = list(curves)
+    potentials = [np.asarray(potential, dtype=np.float64) for potential, _, _ in curves]
+    lengths = np.array([len(potential) for potential in potentials], dtype=np.intp)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.intp)
+    if lengths.sum() < 2:
+        return {}
+
+    bounds = [cv_cycles.segment_bounds(potential) + offset for potential, offset in zip(potentials, offsets) if len(potential)]
+    files = np.repeat(np.flatnonzero(lengths), [len(b) for b in bounds])
+    bounds = np.concatenate(bounds)
+    keep = bounds[:, 1] > bounds[:, 0]
+    bounds, files = bounds[keep], files[keep]
+    if not len(bounds):
+        return {}
+
+    potential = np.concatenate(potentials)
+    current = np.concatenate([np.asarray(current, dtype=np.float64) for _, current, _ in curves])
+    rates = np.array([np.nan if rate is None else rate for _, _, rate in curves], dtype=np.float64)
+
+    # 整个数组一次梯形积分；文件衔接处的增量置 0
+    step = np.diff(potential)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dt = np.abs(step) / np.repeat(rates, lengths)[:-1]
+    joint = np.zeros(len(step), dtype=bool)
+    joint[offsets[1:][(offsets[1:] > 0) & (offsets[1:] < len(potential))] - 1] = True
+    positive, negative = np.maximum(current, 0), np.minimum(current, 0)
+    anodic = np.where(joint, 0.0, 0.5 * (positive[1:] + positive[:-1]) * dt)
+    cathodic = np.where(joint, 0.0, 0.5 * (negative[1:] + negative[:-1]) * dt)
+    area = np.where(joint, 0.0, 0.5 * (current[1:] + current[:-1]) * step)
+
+    # 各段在整个数组中首尾相接，段 i 的增量为 [start_i, start_{i+1})，文件末段包含已置 0 的衔接增量
+    starts = bounds[:, 0]
+    scale = 1.0 / mass if mass and mass > 0 else 1.0
+    anodic_charge = np.add.reduceat(anodic, starts) * scale
+    cathodic_charge = np.add.reduceat(cathodic, starts) * scale
+    area = np.add.reduceat(area, starts) * scale
+
+    window = np.abs(potential[bounds[:, 1]] - potential[bounds[:, 0]])
+    direction = np.where(potential[bounds[:, 1]] >= potential[bounds[:, 0]], 1, -1)
+    total = anodic_charge - cathodic_charge
+    with np.errstate(invalid='ignore', divide='ignore'):
+        capacitance = total / window
+
+    # 同一文件、同一方向的第一段作为基准；段按文件顺序排列，np.unique 给出每组第一次出现的位置
+    _, first, group = np.unique(files * 2 + (direction < 0), return_index=True, return_inverse=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        retention = total / total[first][group.ravel()]
+
+    _, file_first = np.unique(files, return_index=True)
+    segment = np.arange(len(files)) - np.repeat(file_first, np.diff(np.append(file_first, len(files)))) + 1
+    return {
+        'file': files,
+        'segment': segment,
+        'cycle': (segment + 1) // 2,
+        'start': bounds[:, 0] - offsets[files],
+        'stop': bounds[:, 1] - offsets[files],
+        'direction': direction,
+        'window': window,
+        'anodic_charge': anodic_charge,
+        'cathodic_charge': cathodic_charge,
+        'area': area,
+        'capacitance': capacitance,
+        'retention': retention,
+    }
+
+
+def experiment_curves(experiment):
+    """一个样品文件夹中 CV 与 CV-<扫速> 文件的 [(文件路径, (电位, 电流 (mA), 扫速 (V/s)))]"""
+    paths = [experiment['cv']] if experiment['cv'] else []
+    paths += [path for _, path in sorted(experiment['cv_rates'].items())]
+    curves = []
+    for path in paths:
+        meta, data = chi_parser.read_chi_file(path)
+        if not len(data[0]):
+            continue
+        curves.append((path, (data[0], np.asarray(data[1], dtype=np.float64) * 1000, meta.get('Scan Rate (V/s)'))))
+    return curves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量计算 CV 各段的电荷、比电容与容量保持率')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--mass', type=float, default=0.0, help='活性物质质量 (mg)，0 为不归一化')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    labelled = []
+    for experiment in manifest.crawl(root).values():
+        labelled += [(experiment['name'], path, curve) for path, curve in experiment_curves(experiment)]
+    result = integrate([curve for _, _, curve in labelled], args.mass)
+    table = pd.DataFrame(result)
+    if not table.empty:
+        table.insert(0, 'Folder', [labelled[i][0] for i in table['file']])
+        table['file'] = [os.path.basename(labelled[i][1]) for i in table['file']]
+    output = os.path.join(root, OUTPUT_CSV)
+    table.to_csv(output, index=False, encoding='utf-8-sig')
+    print(f"已积分 {len(labelled)} 个 CV 文件、{len(table)} 个半周期，结果保存到：{output}")
@@ -0,0 +1,168 @@
+# Roc_Huang
+#
+# 程序功能：
+# 直接读取 CHI660E 仪器保存的原始 .bin 文件，无需先在软件里导出 .txt / .csv。
+# 1. 解析文件头：魔数、技术缩写（CV / LSV / IMP）与技术全称，以及固定长度的参数区。
+# 2. 参数区中的 float32 参数（Init E、High/Low E、Scan Rate、Segment、频率范围等）整理为与文本导出相同键名的元数据。
+# 3. 数据区用 np.memmap 映射，电流 / 阻抗列直接以 NumPy 视图返回，不做任何文本解码与拷贝。
+#
+# 文件布局（按本仓库 data 目录下 CHI660E 文件核对）：
+#   0x00  魔数 80 F2 + 版本号（见到过 1C 00 / 1D 00）
+#   0x04  int32 长度 + 技术缩写，如 "CV"
+#         int32 长度 + 技术全称，如 "Cyclic Voltammetry"
+#   之后  参数区，其中有一段 float32 参数表；参数区长度随版本变化（1D: 1653 字节，表在 1053；1C: 1414 字节，表在 814）
+#   之后  数据记录：CV / LSV 每点 1 个 float32 电流；IMP 每点 4 个 float32 (freq, freq, Z', Z")
+# CV / LSV 文件不保存电位，电位由 Init E、High/Low E、采样间隔按扫描波形重建。
+
+import struct
+
+import numpy as np
+
+CHI_MAGIC = b'\x80\xf2'
+
+# 版本号 -> (技术全称之后参数区的长度, 参数区内 float32 参数表的起点)
+_LAYOUTS = {
+    0x1d: (1653, 1053),
+    0x1c: (1414, 814),
+}
+
+# float32 参数表中各字段的下标
+_PARAM_INDEX = {
+    'Init E (V)': 0,
+    'High E (V)': 1,
+    'Final E (V)': 2,
+    'Low E (V)': 3,
+    'Scan Rate (V/s)': 4,
+    'Init P/N': 6,
+    'Segment': 7,
+    'Sample Interval (V)': 8,
+    'Sensitivity (A/V)': 10,
+    'Quiet Time (sec)': 11,
+    'Amplitude (V)': 16,
+    'High Frequency (Hz)': 22,
+}
+
+# 各技术的数据记录格式与对应文本导出的列名
+_RECORD_DTYPES = {
+    'CV': np.dtype([('current', '<f4')]),
+    'LSV': np.dtype([('current', '<f4')]),
+    'IMP': np.dtype([('freq', '<f4'), ('freq_set', '<f4'), ('z_real', '<f4'), ('z_imag', '<f4')]),
+}
+
+_COLUMNS = {
+    'CV': ['Potential/V', 'Current/A'],
+    'LSV': ['Potential/V', 'Current/A'],
+    'IMP': ['Freq/Hz', "Z'/ohm", 'Z"/ohm', 'Z/ohm', 'Phase/deg'],
+}
+
+
+def _read_string(buffer, offset):
+    length = struct.unpack_from('<i', buffer, offset)[0]
+    start = offset + 4
+    return buffer[start:start + length].decode('ascii', errors='replace'), start + length
+
+
+def _round_param(value):
+    """float32 参数保留 6 位有效数字，使 0.4699999 还原为 0.47"""
+    return float(f'{value:.6g}')
+
+
+def read_header(file_path):
+    """读取文件头，返回 (meta, data_offset)"""
+    with open(file_path, 'rb') as file:
+        head = file.read(1024 + max(size for size, _ in _LAYOUTS.values()))
+
+    if head[:2] != CHI_MAGIC:
+        raise ValueError(f"{file_path} 不是 CHI 二进制文件")
+    if head[2] not in _LAYOUTS:
+        raise ValueError(f"暂不支持的 CHI 文件版本: 0x{head[2]:02x}")
+    block_size, table_offset = _LAYOUTS[head[2]]
+
+    code, offset = _read_string(head, 4)
+    technique, offset = _read_string(head, offset)
+    if code not in _RECORD_DTYPES:
+        raise ValueError(f"暂不支持的 CHI 技术类型: {code} ({technique})")
+
+    table = np.frombuffer(head, dtype='<f4', count=max(_PARAM_INDEX.values()) + 1,
+                          offset=offset + table_offset)
+
+    meta = {'technique': technique, 'technique_code': code}
+    if code == 'IMP':
+        meta['Init E (V)'] = _round_param(table[_PARAM_INDEX['Init E (V)']])
+        meta['High Frequency (Hz)'] = _round_param(table[_PARAM_INDEX['High Frequency (Hz)']])
+        # 阻抗文件中扫速位置存放的是低频下限
+        meta['Low Frequency (Hz)'] = _round_param(table[_PARAM_INDEX['Scan Rate (V/s)']])
+        meta['Amplitude (V)'] = _round_param(table[_PARAM_INDEX['Amplitude (V)']])
+        meta['Quiet Time (sec)'] = _round_param(table[_PARAM_INDEX['Quiet Time (sec)']])
+    else:
+        for key in ('Init E (V)', 'Scan Rate (V/s)', 'Sample Interval (V)',
+                    'Quiet Time (sec)', 'Sensitivity (A/V)'):
+            meta[key] = _round_param(table[_PARAM_INDEX[key]])
+        if code == 'CV':
+            meta['High E (V)'] = _round_param(table[_PARAM_INDEX['High E (V)']])
+            meta['Low E (V)'] = _round_param(table[_PARAM_INDEX['Low E (V)']])
+            meta['Init P/N'] = 'P' if table[_PARAM_INDEX['Init P/N']] > 0 else 'N'
+            meta['Segment'] = int(round(table[_PARAM_INDEX['Segment']]))
+        else:
+            meta['Final E (V)'] = _round_param(table[_PARAM_INDEX['Final E (V)']])
+
+    meta['columns'] = list(_COLUMNS[code])
+    return meta, offset + block_size
+
+
+def cv_potential(meta, n_points):
+    """按 CV 三角波重建电位：从 Init E 出发，在 Low E 与 High E 之间往返"""
+    step = meta['Sample Interval (V)']
+    low, high, init = meta['Low E (V)'], meta['High E (V)'], meta['Init E (V)']
+    span = int(round((high - low) / step))
+    if span <= 0:
+        return np.full(n_points, init)
+
+    # 以 Low E 为起点、周期 2*span 的展开坐标
+    if meta.get('Init P/N', 'P') == 'P':
+        start = int(round((init - low) / step))
+    else:
+        start = span + int(round((high - init) / step))
+    phase = (start + np.arange(n_points)) % (2 * span)
+    index = np.where(phase <= span, phase, 2 * span - phase)
+    return np.round(low + index * step, 6)
+
+
+def lsv_potential(meta, n_points):
+    """按 LSV 线性扫描重建电位"""
+    step = meta['Sample Interval (V)']
+    direction = 1.0 if meta['Final E (V)'] >= meta['Init E (V)'] else -1.0
+    return np.round(meta['Init E (V)'] + direction * step * np.arange(n_points), 6)
+
+
+def read_chi_bin(file_path):
+    """
+    读取 CHI .bin 文件。
+
+    返回 (meta, data)：meta 的键名与文本导出一致，data 为按 meta['columns'] 顺序排列的一维数组元组。
+    CV / LSV: (电位, 电流)，电流为 memmap 视图；
+    IMP: (频率, Z', Z", |Z|, 相位)，前三列为 memmap 视图，|Z| 与相位按需计算。
+    视图为 float32、只读，需要修改时请先 astype(np.float64)。
+    """
+    meta, data_offset = read_header(file_path)
+    dtype = _RECORD_DTYPES[meta['technique_code']]
+
+    with open(file_path, 'rb') as file:
+        file.seek(0, 2)
+        n_points = (file.tell() - data_offset) // dtype.itemsize
+    meta['n_points'] = n_points
+
+    if n_points <= 0:
+        return meta, tuple(np.empty(0) for _ in meta['columns'])
+
+    records = np.memmap(file_path, dtype=dtype, mode='r', offset=data_offset, shape=(n_points,))
+    code = meta['technique_code']
+    if code == 'IMP':
+        z_real, z_imag = records['z_real'], records['z_imag']
+        z_abs = np.hypot(z_real, z_imag)
+        phase = np.degrees(np.arctan2(z_imag, z_real))
+        return meta, (records['freq'], z_real, z_imag, z_abs, phase)
+
+    current = records['current']
+    potential = cv_potential(meta, n_points) if code == 'CV' else lsv_potential(meta, n_points)
+    return meta, (potential, current)
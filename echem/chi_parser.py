@@ -0,0 +1,236 @@
+# Roc_Huang
+#
+# 程序功能：
+# CHI660E 导出文本（CV / LSV / EIS / DRTtools 结果 / 预处理后的 EIS 数据）的统一解析器。
+# 1. 只扫描一次头部，找到头部与数据区的分界行。
+# 2. 头部中的 "Key = Value" 与 "Key: Value" 行解析为带类型的元数据（Init E、Scan Rate、Segment、频率等）。
+# 3. 数据区整体交给 NumPy 一次性转换为 float64，按列返回连续的 NumPy 数组，不再逐行 float()。
+# 4. read_chi_file 对 .bin 原始文件直接走 chi_binary，不需要先导出文本。
+# 5. read_chi_frame 根据头部确定数据起始行，直接交给 pandas 按 float64 读取，替代写死的 skiprows。
+# 6. 文本解析结果经 echem.cache 缓存为 .npz，数据未变时重复运行不再解析文本；.bin 本身已是映射读取，不经缓存。
+
+import numpy as np
+import pandas as pd
+
+from echem import cache, chi_binary
+
+# 文本数据区允许的分隔符，统一替换为空白后整体切分
+_SEPARATORS = (',', '\t', ';')
+
+
+def _decode(raw):
+    """CHI 软件在中文系统下可能以 GBK 保存备注，UTF-8 失败时回退"""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('gbk', errors='replace')
+
+
+def _split_fields(line):
+    for sep in _SEPARATORS:
+        line = line.replace(sep, ' ')
+    return line.split()
+
+
+def _is_numeric_line(line):
+    """整行的所有字段都能转换为浮点数时才视为数据行"""
+    fields = _split_fields(line)
+    if not fields:
+        return False
+    try:
+        for field in fields:
+            float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def _to_value(text):
+    """将头部中的取值转换为 int / float，无法转换时保留字符串"""
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def find_data_start(lines):
+    """返回第一行纯数字数据的行号，以及其上方最近一行非空文本（列名行）的行号；找不到数据时返回 (None, None)"""
+    header_idx = None
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        if _is_numeric_line(line):
+            return i, header_idx
+        header_idx = i
+    return None, None
+
+
+def parse_header(lines):
+    """解析头部行，返回元数据字典"""
+    meta = {}
+    non_empty = [line.strip() for line in lines if line.strip()]
+    if non_empty:
+        meta['date'] = non_empty[0]
+    if len(non_empty) > 1:
+        meta['technique'] = non_empty[1]
+
+    segments = 0
+    for line in non_empty[2:]:
+        if ' = ' in line:
+            key, value = line.split(' = ', 1)
+            meta[key.strip()] = _to_value(value)
+        elif line.startswith('Segment ') and line.endswith(':'):
+            segments += 1
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            if value.strip():
+                meta[key.strip()] = value.strip()
+    if segments:
+        meta['segments_listed'] = segments
+    return meta
+
+
+def _parse_columns(header_line, ncols):
+    if header_line is None:
+        return [f'col{i}' for i in range(ncols)]
+    names = [name.strip() for name in header_line.split(',')]
+    if len(names) != ncols:
+        names = _split_fields(header_line)
+    if len(names) != ncols:
+        return [f'col{i}' for i in range(ncols)]
+    return names
+
+
+def _convert_block(data_lines, ncols):
+    """数据区交给 np.loadtxt 的 C 解析器整体转换；若有残缺行则退回到逐行过滤"""
+    delimiter = ',' if ',' in data_lines[0] else None
+    try:
+        values = np.loadtxt(data_lines, delimiter=delimiter, dtype=np.float64, ndmin=2)
+        if values.shape[1] == ncols:
+            return values
+    except ValueError:
+        pass
+
+    rows = []
+    for line in data_lines:
+        fields = _split_fields(line)
+        if len(fields) != ncols:
+            continue
+        try:
+            rows.append([float(field) for field in fields])
+        except ValueError:
+            continue
+    return np.asarray(rows, dtype=np.float64).reshape(-1, ncols)
+
+
+def parse_chi_text(text):
+    """
+    解析 CHI 导出文本内容。
+
+    返回 (meta, data)：meta 为元数据字典（含 'columns' 列名与 'data_start' 行号），
+    data 为形状 (列数, 点数) 的 float64 数组，每一列 data[i] 都是连续内存。
+    没有数据区时 data 的形状为 (0, 0)。
+    """
+    lines = text.splitlines()
+    start, header_idx = find_data_start(lines)
+    if start is None:
+        meta = parse_header(lines)
+        meta['columns'] = []
+        meta['data_start'] = None
+        return meta, np.empty((0, 0))
+
+    meta = parse_header(lines[:header_idx] if header_idx is not None else [])
+    ncols = len(_split_fields(lines[start]))
+    values = _convert_block(lines[start:], ncols)
+
+    meta['columns'] = _parse_columns(lines[header_idx] if header_idx is not None else None, ncols)
+    meta['data_start'] = start
+    return meta, np.ascontiguousarray(values.T)
+
+
+def _read_chi_text(file_path):
+    with open(file_path, 'rb') as file:
+        raw = file.read()
+    return parse_chi_text(_decode(raw))
+
+
+def read_chi_text(file_path):
+    """读取 CHI 导出的文本文件，返回值同 parse_chi_text；文件未变化时直接读取缓存"""
+    return cache.load(file_path, 'text', _read_chi_text)
+
+
+def find_data_offset(file_path):
+    """只读取头部，返回 (数据区起始行号, 头部元数据)；行号可直接作为 pd.read_csv 的 skiprows"""
+    header = []
+    with open(file_path, 'rb') as file:
+        for raw in file:
+            line = _decode(raw)
+            if line.strip() and _is_numeric_line(line):
+                break
+            header.append(line)
+        else:
+            return None, parse_header(header)
+    return len(header), parse_header(header)
+
+
+def header_text(file_path, key):
+    """头部中 'key = 值' 一行的原始值文本（不做数值转换，保留文件中的写法，如 '-0.10'）；找不到时返回 None"""
+    with open(file_path, 'rb') as file:
+        for raw in file:
+            line = _decode(raw)
+            if line.strip() and _is_numeric_line(line):
+                break
+            name, separator, value = line.partition(' = ')
+            if separator and name.strip() == key:
+                return value.strip()
+    return None
+
+
+def _read_frame_columns(file_path):
+    """按头部检测到的起始行交给 pandas 读取，返回 (meta, 形状为 (列数, 点数) 的数组)"""
+    start, meta = find_data_offset(file_path)
+    if start is None:
+        return meta, np.empty((0, 0))
+    frame = pd.read_csv(file_path, skiprows=start, header=None, dtype=np.float64,
+                        skipinitialspace=True, skip_blank_lines=True)
+    meta['data_start'] = start
+    return meta, np.ascontiguousarray(frame.to_numpy().T)
+
+
+def read_chi_frame(file_path, names):
+    """
+    按头部检测到的数据起始行读取为 DataFrame，列名为 names，所有列均为 float64。
+
+    额外的 "Segment N:" 行或备注行会自动跳过；数据区内出现非数字内容时抛出 ValueError。
+    .bin 原始文件同样返回 DataFrame。
+    """
+    if file_path.lower().endswith('.bin'):
+        _, data = chi_binary.read_chi_bin(file_path)
+        return pd.DataFrame({name: column for name, column in zip(names, data)}, dtype=np.float64)
+
+    _, data = cache.load(file_path, 'frame', _read_frame_columns)
+    if data.size == 0:
+        return pd.DataFrame({name: pd.Series(dtype=np.float64) for name in names})
+    return pd.DataFrame({name: column for name, column in zip(names, data)}, dtype=np.float64)
+
+
+def read_chi_file(file_path):
+    """按扩展名分派：.bin 交给 chi_binary 直接映射原始文件，其余按文本导出解析"""
+    if file_path.lower().endswith('.bin'):
+        return chi_binary.read_chi_bin(file_path)
+    return read_chi_text(file_path)
+
+
+def select_export(file_names, stem, extensions=('.txt', '.bin')):
+    """在文件名列表中为某个实验（如 'lsv'、'EIS'）选出要读取的文件：优先文本导出，没有导出时使用原始 .bin"""
+    candidates = {name.lower(): name for name in file_names}
+    for ext in extensions:
+        name = candidates.get(stem.lower() + ext)
+        if name is not None:
+            return name
+    return None
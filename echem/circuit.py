@@ -0,0 +1,241 @@
+# Roc_Huang
+#
+# 程序功能：
+# EIS 等效电路批量拟合，代替只取 Z' 第一个点作为 Rs 的做法。
+# 1. 模型：'R-RQ'（Rs + Rct‖CPE）、'randles'（Rs + CPE‖(Rct + Warburg)）、'tlm'（Rs + 反射边界的多孔电极传输线，界面为 Rct‖CPE）。
+#    CPE 导纳 Y = Q (jω)^n；各模型给出阻抗及其对参数的解析雅可比矩阵，交给 scipy least_squares（trf，参数有界）。
+# 2. 残差按 1/|Z| 加权（模量加权），实部、虚部一起拟合；默认去掉高频 Z'' > 0 的电感点。
+# 3. fit_sweep 按电压顺序拟合同一样品的一组谱，每个电压以相邻电压的结果为初值；初值拟合不好时再从默认初值拟合一次取较优者。
+# 4. fit_experiments 用进程池把各样品文件夹分给多个进程，返回每个文件一行的参数表。
+#
+# 用法：python -m echem.circuit <数据根目录> [--model R-RQ] [--workers N]
+# 结果保存为根目录下的 circuit_parameters.csv（与 overpotential_data.csv 同一目录）。
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import least_squares
+
+from echem import cache, drt, manifest
+
+OUTPUT_CSV = 'circuit_parameters.csv'
+
+# 相对误差超过该值时认为以相邻电压为初值的拟合失败，改用默认初值重新拟合
+RETRY_ERROR = 0.05
+
+
+def _cpe(omega, q, n):
+    """CPE 导纳 Y = Q (jω)^n 及 ln(jω)"""
+    log_jw = np.log(omega) + 0.5j * np.pi
+    return q * np.exp(n * log_jw), log_jw
+
+
+def _parallel_rq(omega, rct, q, n):
+    """Rct‖CPE 的阻抗及其对 (Rct, Q, n) 的导数"""
+    y, log_jw = _cpe(omega, q, n)
+    z = 1 / (1 / rct + y)
+    z2 = z ** 2
+    return z, [z2 / rct ** 2, -z2 * y / q, -z2 * y * log_jw]
+
+
+def _r_rq(omega, rs, rct, q, n):
+    z, jac = _parallel_rq(omega, rct, q, n)
+    return rs + z, [np.ones_like(z)] + jac
+
+
+def _randles(omega, rs, rct, q, n, w):
+    y, log_jw = _cpe(omega, q, n)
+    warburg = 1 / np.sqrt(1j * omega)
+    faradaic = rct + w * warburg
+    z = 1 / (1 / faradaic + y)
+    z2 = z ** 2
+    d_faradaic = z2 / faradaic ** 2
+    return rs + z, [np.ones_like(z), d_faradaic, -z2 * y / q, -z2 * y * log_jw, d_faradaic * warburg]
+
+
+def _tlm(omega, rs, rion, rct, q, n):
+    interface, interface_jac = _parallel_rq(omega, rct, q, n)
+    a = np.sqrt(rion * interface)
+    b = np.sqrt(rion / interface)
+    coth = 1 / np.tanh(b)
+    csch2 = coth ** 2 - 1
+    z = a * coth
+    # dZ = coth·da − a·csch²(b)·db
+    d_rion = coth * a / (2 * rion) - a * csch2 * b / (2 * rion)
+    d_interface = coth * a / (2 * interface) + a * csch2 * b / (2 * interface)
+    return rs + z, [np.ones_like(z), d_rion] + [d_interface * d for d in interface_jac]
+
+
+# 模型名 -> (参数名, 阻抗与雅可比函数, 参数下界, 参数上界)
+MODELS = {
+    'R-RQ': (('Rs', 'Rct', 'Q', 'n'), _r_rq, (0, 0, 0, 0), (np.inf, np.inf, np.inf, 1)),
+    'randles': (('Rs', 'Rct', 'Q', 'n', 'W'), _randles, (0, 0, 0, 0, 0), (np.inf, np.inf, np.inf, 1, np.inf)),
+    'tlm': (('Rs', 'Rion', 'Rct', 'Q', 'n'), _tlm, (0, 0, 0, 0, 0), (np.inf, np.inf, np.inf, np.inf, 1)),
+}
+
+
+def impedance(model, freq, params):
+    """模型阻抗（复数数组）"""
+    return MODELS[model][1](2 * np.pi * np.asarray(freq, dtype=np.float64), *params)[0]
+
+
+def initial_guess(model, freq, z_real, z_imag):
+    """由谱的形状估计初值：Rs 为最高频 Z'，Rct 为低频与高频 Z' 之差，Q 由 -Z'' 峰值频率估计，n = 0.8"""
+    rs = max(float(z_real[np.argmax(freq)]), 0.0)
+    rct = max(float(z_real[np.argmin(freq)]) - rs, 1e-3)
+    omega_peak = 2 * np.pi * freq[np.argmax(-z_imag)]
+    n = 0.8
+    q = 1 / (rct * omega_peak ** n)
+    if model == 'randles':
+        return [rs, rct, q, n, 0.1 * rct]
+    if model == 'tlm':
+        return [rs, 0.1 * rct, rct, q, n]
+    return [rs, rct, q, n]
+
+
+def relative_error(z_fit, z):
+    """相对误差 sqrt(mean(|Z_fit − Z|² / |Z|²))"""
+    return float(np.sqrt(np.mean(np.abs(z_fit - z) ** 2 / np.abs(z) ** 2)))
+
+
+def fit(freq, z_real, z_imag, model='R-RQ', start=None, capacitive_only=True):
+    """
+    拟合一条谱，返回参数字典（参数名 -> 值），另含 error（相对误差）、points（参与拟合的点数）与 success。
+
+    start 为初值（列表，顺序同 MODELS 中的参数名），默认由 initial_guess 估计。
+    """
+    if model not in MODELS:
+        raise ValueError(f"未知的等效电路模型: {model}")
+    names, function, lower, upper = MODELS[model]
+    freq = np.asarray(freq, dtype=np.float64)
+    z = np.asarray(z_real, dtype=np.float64) + 1j * np.asarray(z_imag, dtype=np.float64)
+    if capacitive_only:
+        keep = z.imag <= 0
+        freq, z = freq[keep], z[keep]
+    if len(freq) < len(names):
+        raise ValueError("数据点少于拟合参数个数")
+
+    omega = 2 * np.pi * freq
+    weight = 1 / np.abs(z)
+
+    def residual(params):
+        diff = (function(omega, *params)[0] - z) * weight
+        return np.concatenate((diff.real, diff.imag))
+
+    def jacobian(params):
+        columns = np.column_stack(function(omega, *params)[1]) * weight[:, None]
+        return np.vstack((columns.real, columns.imag))
+
+    if start is None:
+        start = initial_guess(model, freq, z.real, z.imag)
+    start = np.clip(np.asarray(start, dtype=np.float64), lower, upper)
+    solution = least_squares(residual, start, jac=jacobian, bounds=(lower, upper), method='trf', x_scale='jac')
+
+    result = dict(zip(names, map(float, solution.x)))
+    result['error'] = relative_error(function(omega, *solution.x)[0], z)
+    result['points'] = len(freq)
+    result['success'] = bool(solution.success)
+    return result
+
+
+def fit_sweep(spectra, model='R-RQ', capacitive_only=True):
+    """
+    按电压顺序拟合一组谱，spectra 为 [(电压, freq, Z', Z'')]；返回与 spectra 按电压排序后一一对应的结果列表。
+
+    每个电压以前一个电压的拟合结果为初值；相对误差超过 RETRY_ERROR 时再用默认初值拟合，取误差较小者。
+    """
+    names = MODELS[model][0]
+    results = []
+    previous = None
+    for voltage, freq, z_real, z_imag in sorted(spectra, key=lambda item: item[0]):
+        result = fit(freq, z_real, z_imag, model, start=previous, capacitive_only=capacitive_only)
+        if previous is not None and (result['error'] > RETRY_ERROR or not result['success']):
+            fresh = fit(freq, z_real, z_imag, model, capacitive_only=capacitive_only)
+            if fresh['error'] < result['error']:
+                result = fresh
+        result['voltage'] = voltage
+        results.append(result)
+        previous = [result[name] for name in names]
+    return results
+
+
+def _sweep_spectra(experiment):
+    """文件名带电压的 EIS 谱（如 process_eis_files.py 输出的 {Init E}.txt）；DRT 结果等非 EIS 文件跳过"""
+    spectra = []
+    for voltage, path in experiment['drt'].items():
+        try:
+            spectra.append((voltage, path, *drt.read_spectrum(path)))
+        except (OSError, ValueError):
+            continue
+    return spectra
+
+
+def _eis_spectrum(experiment):
+    """实验的 EIS 谱 (freq, Z', Z'')，按频率从高到低排列；与 ohmic、linkk 一样经 manifest.read_frame 读取，.bin 原始文件同样可用"""
+    data = manifest.read_frame(experiment, 'eis')
+    if data is None or data.empty:
+        raise ValueError(f"{experiment['eis']} 中没有 EIS 数据")
+    freq = data['Freq'].to_numpy()
+    valid = freq > 0
+    order = np.argsort(-freq[valid], kind='stable')
+    return freq[valid][order], data["Z'"].to_numpy()[valid][order], data["Z''"].to_numpy()[valid][order]
+
+
+def fit_experiment(experiment, model='R-RQ'):
+    """拟合一个样品文件夹：EIS 文件单独拟合，文件名带电压的谱作为一组扫描联合（热启动）拟合；返回行字典列表"""
+    rows = []
+    base = {'Folder': experiment['name']}
+    if experiment['eis'] is not None:
+        try:
+            freq, z_real, z_imag = _eis_spectrum(experiment)
+            rows.append({**base, 'File': os.path.basename(experiment['eis']), 'Voltage (V)': None,
+                         **fit(freq, z_real, z_imag, model)})
+        except (OSError, ValueError) as e:
+            print(f"拟合 {experiment['eis']} 失败: {e}")
+
+    spectra = _sweep_spectra(experiment)
+    if spectra:
+        paths = {voltage: path for voltage, path, *_ in spectra}
+        try:
+            results = fit_sweep([(voltage, *data) for voltage, _, *data in spectra], model)
+        except ValueError as e:
+            print(f"拟合 {experiment['name']} 的电压扫描失败: {e}")
+            results = []
+        for result in results:
+            voltage = result.pop('voltage')
+            rows.append({**base, 'File': os.path.basename(paths[voltage]), 'Voltage (V)': voltage, **result})
+    return rows
+
+
+def fit_experiments(experiments, model='R-RQ', workers=None):
+    """用进程池按样品文件夹并行拟合，返回参数表 DataFrame（每个文件一行）"""
+    experiments = list(experiments)
+    # 读取数据的缓存 frames 不需要传给子进程，子进程中重新读取
+    payload = [{**{key: value for key, value in experiment.items() if key != 'frames'}, 'frames': {}}
+               for experiment in experiments]
+    rows = []
+    if len(payload) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=cache.worker_init) as executor:
+            for result in executor.map(fit_experiment, payload, [model] * len(payload)):
+                rows += result
+    else:
+        for experiment in payload:
+            rows += fit_experiment(experiment, model)
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量拟合 EIS 等效电路')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--model', choices=sorted(MODELS), default='R-RQ', help='等效电路模型')
+    parser.add_argument('--workers', type=int, help='进程数，默认为 CPU 核数')
+    args = parser.parse_args()
+
+    table = fit_experiments(manifest.crawl(os.path.abspath(args.root)).values(), args.model, args.workers)
+    output_csv = os.path.join(args.root, OUTPUT_CSV)
+    table.to_csv(output_csv, index=False, encoding='utf-8-sig')
+    print(table.to_string(index=False))
+    print(f"参数表已保存为 CSV 文件: {output_csv}")
@@ -0,0 +1,114 @@
+# Roc_Huang
+#
+# 程序功能：
+# CV 数据的多周期分段。
+# 1. find_vertices 对电位一阶差分做一次符号变化检测，得到全部扫描换向点（顶点），不再逐点循环。
+# 2. segment_bounds / cycle_bounds 给出每个半周期（CHI 的 Segment）与完整周期的下标范围，
+#    half_cycles / cycles 按范围切片，返回的都是原数组的视图，不拷贝数据。
+# 3. cycle_statistics 一次性计算所有周期的峰电流、闭合曲线包围的电荷以及相对第一周期的漂移。
+
+import numpy as np
+
+
+def find_vertices(potential):
+    """
+    返回扫描换向点的下标。
+
+    判断规则与原 CV.py 一致：点 i 前后两段电位差异号即为换向点；电位不变的平台段沿用之前的扫描方向，
+    换向点记在平台末端。
+    """
+    step = np.sign(np.diff(np.asarray(potential, dtype=np.float64)))
+    if step.size < 2:
+        return np.empty(0, dtype=np.intp)
+
+    # 平台（差分为 0）沿用前一段非零方向
+    nonzero = step != 0
+    if not nonzero.any():
+        return np.empty(0, dtype=np.intp)
+    last = np.maximum.accumulate(np.where(nonzero, np.arange(step.size), -1))
+    filled = np.where(last >= 0, step[np.maximum(last, 0)], 0)
+
+    change = (filled[1:] * filled[:-1] < 0) & nonzero[1:]
+    return np.flatnonzero(change) + 1
+
+
+def segment_bounds(potential, vertices=None):
+    """每个半周期的 [start, stop] 下标（闭区间，相邻两段共享顶点），形状 (段数, 2)"""
+    n = len(potential)
+    if vertices is None:
+        vertices = find_vertices(potential)
+    edges = np.concatenate(([0], vertices, [n - 1])).astype(np.intp)
+    return np.column_stack((edges[:-1], edges[1:]))
+
+
+def cycle_bounds(bounds):
+    """由半周期两两组成完整周期的 [start, stop] 下标；最后不成对的半周期不计入"""
+    n_cycles = len(bounds) // 2
+    return np.column_stack((bounds[0:2 * n_cycles:2, 0], bounds[1:2 * n_cycles:2, 1]))
+
+
+def half_cycles(values, bounds):
+    """按 segment_bounds 切分，返回视图列表"""
+    return [values[start:stop + 1] for start, stop in bounds]
+
+
+def cycles(values, bounds):
+    """按 cycle_bounds 切分，返回视图列表"""
+    return [values[start:stop + 1] for start, stop in bounds]
+
+
+def last_cycle_start(vertices):
+    """与原 CV.py 相同的"最后一个周期"起点：倒数第二个换向点；换向点不足两个时从头开始"""
+    return int(vertices[-2]) if len(vertices) >= 2 else 0
+
+
+def _cycle_matrix(values, bounds, fill):
+    """把各周期排成 (周期数, 最长周期点数) 的矩阵，周期外的位置填充 fill，便于按行一次性归约"""
+    lengths = bounds[:, 1] - bounds[:, 0] + 1
+    index = bounds[:, :1] + np.arange(lengths.max())
+    inside = index <= bounds[:, 1:]
+    return np.where(inside, values[np.minimum(index, len(values) - 1)], fill), index
+
+
+def cycle_statistics(potential, current, bounds, scan_rate=None):
+    """
+    所有周期的统计量，返回各列为 NumPy 数组的字典（可直接交给 pd.DataFrame）。
+
+    anodic / cathodic 峰为周期内电流最大 / 最小值及其电位；area 为闭合曲线 ∮ I dE（电流单位 × V），
+    给出扫速 (V/s) 时 charge = |area| / scan_rate；*_drift 为相对第一周期的变化。
+    """
+    potential = np.asarray(potential, dtype=np.float64)
+    current = np.asarray(current, dtype=np.float64)
+    bounds = np.asarray(bounds, dtype=np.intp).reshape(-1, 2)
+    if not len(bounds):
+        return {}
+
+    rows = np.arange(len(bounds))
+    matrix, index = _cycle_matrix(current, bounds, -np.inf)
+    peak = matrix.argmax(axis=1)
+    i_max, e_max = matrix[rows, peak], potential[index[rows, peak]]
+    matrix, _ = _cycle_matrix(current, bounds, np.inf)
+    peak = matrix.argmin(axis=1)
+    i_min, e_min = matrix[rows, peak], potential[index[rows, peak]]
+
+    # 梯形积分 ∮ I dE，用累积和一次得到所有周期
+    trapezoid = 0.5 * (current[1:] + current[:-1]) * np.diff(potential)
+    cumulative = np.concatenate(([0.0], np.cumsum(trapezoid)))
+    area = cumulative[bounds[:, 1]] - cumulative[bounds[:, 0]]
+
+    stats = {
+        'cycle': np.arange(1, len(bounds) + 1),
+        'start': bounds[:, 0],
+        'stop': bounds[:, 1],
+        'anodic_peak_potential': e_max,
+        'anodic_peak_current': i_max,
+        'cathodic_peak_potential': e_min,
+        'cathodic_peak_current': i_min,
+        'area': area,
+        'anodic_peak_drift': i_max - i_max[0],
+        'cathodic_peak_drift': i_min - i_min[0],
+        'area_drift': area - area[0],
+    }
+    if scan_rate:
+        stats['charge'] = np.abs(area) / scan_rate
+    return stats
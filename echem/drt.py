@@ -0,0 +1,512 @@
+# Roc_Huang
+#
+# 程序功能：
+# 弛豫时间分布（DRT）反演，替代外部 MATLAB DRTtools。
+# 1. 模型：Z(ω) = R_inf + jωL + ∫ γ(ln τ) / (1 + jωτ) d ln τ，γ 用高斯径向基函数（'gaussian'）或分段线性函数（'pwl'）离散。
+# 2. 求解：Tikhonov 正则化（0 / 1 / 2 阶差分）的非负最小二乘，γ、R_inf、L 均约束为非负。
+# 3. 核矩阵只与频率点和离散方式有关，按频率网格缓存；同一批测试频率相同的文件共用一次计算结果。
+# 4. 读写与 DRTtools 导出相同的文本格式（L、R 两行 + "tau, gamma(tau)" + 数据），现有 DRT 作图脚本可直接读取。
+# 5. solve_joint 对整个电压序列联合反演：在 τ 方向正则化之外再加一项相邻电压之间的差分惩罚。
+#    联合系统按稀疏分块矩阵构造，其法方程矩阵为带状（带宽 = 单个电压的未知量数），
+#    用带状 Cholesky 分解 + ADMM 迭代处理非负约束，不构造稠密的联合矩阵，可处理数百个电压。
+# 6. select_lambda 自动选择正则化参数 λ（GCV、L 曲线拐点、偏差原理）：把问题化为标准形式后只做一次 SVD（按频率网格缓存），
+#    数百个候选 λ 的残差、解范数和 GCV 函数都由滤波因子向量运算得到，不必逐个重新求解。
+# 7. bootstrap 对拟合残差重采样、重复反演数百次（设计矩阵只构造一次），给出 γ(τ) 以及每个峰 τ、峰高的置信区间。
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import cho_solve_banded, cholesky_banded
+from scipy.optimize import nnls
+from scipy.signal import argrelextrema
+
+from echem import chi_parser
+
+BASES = ('gaussian', 'pwl')
+
+# 高斯基函数：半高宽 = 相邻 ln τ 间距 / fwhm_coeff，与 DRTtools 的 FWHM 系数含义一致（默认 0.5）
+DEFAULT_FWHM_COEFF = 0.5
+DEFAULT_LAMBDA = 1e-3
+DEFAULT_ORDER = 1
+# 联合反演中相邻电压之间的平滑权重
+DEFAULT_MU = 1e-1
+# 自动选择 λ 的方法与默认候选范围
+LAMBDA_METHODS = ('gcv', 'lcurve', 'discrepancy')
+DEFAULT_LAMBDAS = np.logspace(-6, 1, 200)
+# bootstrap 默认重采样次数、置信水平，以及与 DRT 处理脚本 find_extrema 相同的峰检测窗口
+BOOTSTRAP_SAMPLES = 200
+CONFIDENCE_LEVEL = 0.95
+PEAK_ORDER = 3
+# 重采样得到的峰与原始峰在 log10 τ 上相差超过该值时视为未检出
+PEAK_MATCH_DECADES = 0.5
+# 标准形式变换中补齐正则化矩阵零空间（以及 R_inf、L 两列）所用的小量
+_NULL_SPACE_WEIGHT = 1e-6
+POINTS_PER_DECADE = 10
+# 积分网格在每个 ln τ 间距内的点数
+_QUADRATURE_POINTS = 20
+
+_kernel_cache = {}
+_svd_cache = {}
+
+
+def tau_grid(freq, points_per_decade=POINTS_PER_DECADE, extend_decades=1.0):
+    """按测试频率范围生成对数等间距的 τ 网格，两端各外扩 extend_decades 个数量级"""
+    freq = np.asarray(freq, dtype=np.float64)
+    tau_min = 1 / (2 * np.pi * freq.max()) / 10 ** extend_decades
+    tau_max = 1 / (2 * np.pi * freq.min()) * 10 ** extend_decades
+    n = int(np.ceil(np.log10(tau_max / tau_min) * points_per_decade)) + 1
+    return np.logspace(np.log10(tau_min), np.log10(tau_max), n)
+
+
+def _basis(x, centers, basis, fwhm_coeff):
+    """基函数在 x（ln τ）处的取值，形状 (len(x), len(centers))"""
+    delta = np.mean(np.diff(centers))
+    distance = x[:, None] - centers[None, :]
+    if basis == 'gaussian':
+        epsilon = fwhm_coeff * 2 * np.sqrt(np.log(2)) / delta
+        return np.exp(-(epsilon * distance) ** 2)
+    return np.clip(1 - np.abs(distance) / delta, 0, None)
+
+
+def kernel(freq, tau, basis='gaussian', fwhm_coeff=DEFAULT_FWHM_COEFF):
+    """
+    实部 / 虚部核矩阵 (A_re, A_im)，形状均为 (频率数, τ 点数)，使 Z' ≈ A_re @ x、Z'' ≈ A_im @ x。
+
+    结果按 (频率, τ, 离散方式) 缓存，返回的数组不要原地修改。
+    """
+    if basis not in BASES:
+        raise ValueError(f"未知的 DRT 离散方式: {basis}")
+    freq = np.ascontiguousarray(freq, dtype=np.float64)
+    tau = np.ascontiguousarray(tau, dtype=np.float64)
+    key = (freq.tobytes(), tau.tobytes(), basis, fwhm_coeff)
+    cached = _kernel_cache.get(key)
+    if cached is not None:
+        return cached
+
+    centers = np.log(tau)
+    delta = np.mean(np.diff(centers))
+    # 在比 τ 网格两端再宽 5 个间距的细网格上做梯形积分
+    x = np.linspace(centers[0] - 5 * delta, centers[-1] + 5 * delta,
+                    (len(centers) + 10) * _QUADRATURE_POINTS)
+    weights = np.full(len(x), x[1] - x[0])
+    weights[[0, -1]] /= 2
+    phi = _basis(x, centers, basis, fwhm_coeff) * weights[:, None]
+
+    omega_tau = 2 * np.pi * freq[:, None] * np.exp(x)[None, :]
+    denominator = 1 + omega_tau ** 2
+    a_re = (1 / denominator) @ phi
+    a_im = (-omega_tau / denominator) @ phi
+
+    _kernel_cache[key] = (a_re, a_im)
+    return a_re, a_im
+
+
+def difference_matrix(n, order):
+    """order 阶差分矩阵（0 阶为单位矩阵）"""
+    matrix = np.eye(n)
+    for _ in range(order):
+        matrix = np.diff(matrix, axis=0)
+    return matrix
+
+
+def _design(freq, a_re, a_im, inductance):
+    """拟合部分的设计矩阵：列依次为 R_inf、（L）、γ 系数，行依次为实部、虚部"""
+    # 额外的未知量：R_inf，以及可选的电感 L
+    extra_re = [np.ones(len(freq))]
+    extra_im = [np.zeros(len(freq))]
+    if inductance:
+        extra_re.append(np.zeros(len(freq)))
+        extra_im.append(2 * np.pi * freq)
+
+    return np.vstack((np.column_stack(extra_re + [a_re]), np.column_stack(extra_im + [a_im])))
+
+
+def _stacked_design(freq, tau, lam, order, basis, fwhm_coeff, inductance, weights):
+    """NNLS 的完整设计矩阵（拟合行 + √λ·差分行），返回 (矩阵, 额外未知量个数)"""
+    a_re, a_im = kernel(freq, tau, basis, fwhm_coeff)
+    design = _design(freq, a_re, a_im, inductance)
+    if weights is not None:
+        design = design * np.tile(weights, 2)[:, None]
+    n_extra = design.shape[1] - len(tau)
+    regularization = difference_matrix(len(tau), order)
+    regularization = np.hstack((np.zeros((len(regularization), n_extra)), np.sqrt(lam) * regularization))
+    return np.vstack((design, regularization)), n_extra
+
+
+def _unpack(solution, n_extra, tau, basis, fwhm_coeff):
+    """NNLS 解拆分为 (γ 系数, γ(τ), R_inf, L)"""
+    coefficients = solution[n_extra:]
+    gamma = _basis(np.log(tau), np.log(tau), basis, fwhm_coeff) @ coefficients
+    return coefficients, gamma, solution[0], solution[1] if n_extra > 1 else 0.0
+
+
+def solve(freq, z_real, z_imag, lam=DEFAULT_LAMBDA, order=DEFAULT_ORDER, basis='gaussian',
+          fwhm_coeff=DEFAULT_FWHM_COEFF, tau=None, inductance=True, weights=None):
+    """
+    单条谱的 DRT 反演，返回字典：tau、gamma（在 tau 处的 γ，单位 Ω）、coefficients、R_inf、L、residual。
+
+    z_imag 为 CHI 导出中的 Z"（容抗为负）；weights 为每个频率点的权重（如 1/|Z|），默认等权。
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    z_real = np.asarray(z_real, dtype=np.float64)
+    z_imag = np.asarray(z_imag, dtype=np.float64)
+    if tau is None:
+        tau = tau_grid(freq)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+    design, n_extra = _stacked_design(freq, tau, lam, order, basis, fwhm_coeff, inductance, weights)
+
+    target = np.concatenate((z_real, z_imag))
+    if weights is not None:
+        target = target * np.tile(weights, 2)
+    target = np.concatenate((target, np.zeros(design.shape[0] - len(target))))
+    solution, residual = nnls(design, target, maxiter=50 * design.shape[1])
+
+    coefficients, gamma, r_inf, inductance_value = _unpack(solution, n_extra, tau, basis, fwhm_coeff)
+    return {
+        'tau': tau,
+        'gamma': gamma,
+        'coefficients': coefficients,
+        'R_inf': r_inf,
+        'L': inductance_value,
+        'residual': residual,
+        'lambda': lam,
+    }
+
+
+def _standard_form(freq, tau, order, basis, fwhm_coeff, inductance):
+    """
+    无约束 Tikhonov 问题的标准形式 SVD：B = A @ inv(L_full) = U diag(s) Vᵀ，返回 (U, s)。
+
+    L_full 为 τ 方向差分矩阵补齐零空间后的方阵（R_inf、L 两列只加极小的权重），
+    与拟合数据无关，按频率网格缓存，同一批文件只分解一次。
+    """
+    freq = np.ascontiguousarray(freq, dtype=np.float64)
+    tau = np.ascontiguousarray(tau, dtype=np.float64)
+    key = (freq.tobytes(), tau.tobytes(), order, basis, fwhm_coeff, inductance)
+    cached = _svd_cache.get(key)
+    if cached is not None:
+        return cached
+
+    a_re, a_im = kernel(freq, tau, basis, fwhm_coeff)
+    design = _design(freq, a_re, a_im, inductance)
+    n_extra = design.shape[1] - len(tau)
+    # R_inf、L 两列不受正则化，先归一化到单位列范数，避免 L 列（∝ ω）的量级影响分解精度
+    design[:, :n_extra] /= np.linalg.norm(design[:, :n_extra], axis=0)
+
+    n_tau = len(tau)
+    penalty = np.zeros((n_extra + n_tau, n_extra + n_tau))
+    penalty[:n_extra, :n_extra] = _NULL_SPACE_WEIGHT * np.eye(n_extra)
+    penalty[n_extra:n_extra + order, n_extra:n_extra + order] = _NULL_SPACE_WEIGHT * np.eye(order)
+    penalty[n_extra + order:, n_extra:] = difference_matrix(n_tau, order)
+
+    u, s, _ = np.linalg.svd(np.linalg.solve(penalty.T, design.T).T, full_matrices=False)
+    _svd_cache[key] = (u, s)
+    return u, s
+
+
+def lambda_curves(freq, z_real, z_imag, lambdas=None, order=DEFAULT_ORDER, basis='gaussian',
+                  fwhm_coeff=DEFAULT_FWHM_COEFF, tau=None, inductance=True):
+    """
+    各候选 λ 的残差范数、正则项范数、GCV 函数值与有效自由度（无约束 Tikhonov 解）。
+
+    返回字典：lambdas、residual_norm、solution_norm、gcv、dof。
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    lambdas = np.asarray(DEFAULT_LAMBDAS if lambdas is None else lambdas, dtype=np.float64)
+    if tau is None:
+        tau = tau_grid(freq)
+    u, s = _standard_form(freq, tau, order, basis, fwhm_coeff, inductance)
+
+    target = np.concatenate((np.asarray(z_real, dtype=np.float64), np.asarray(z_imag, dtype=np.float64)))
+    beta = u.T @ target
+    outside = max(target @ target - beta @ beta, 0.0)
+
+    # 滤波因子 f = s² / (s² + λ)，形状 (候选数, 奇异值数)
+    filters = s ** 2 / (s ** 2 + lambdas[:, None])
+    residual_norm = np.sqrt(((1 - filters) * beta) ** 2 @ np.ones(len(s)) + outside)
+    solution_norm = np.sqrt((filters * beta / s) ** 2 @ np.ones(len(s)))
+    dof = len(target) - filters.sum(axis=1)
+    return {
+        'lambdas': lambdas,
+        'residual_norm': residual_norm,
+        'solution_norm': solution_norm,
+        'gcv': residual_norm ** 2 / dof ** 2,
+        'dof': dof,
+    }
+
+
+def _lcurve_corner(curves):
+    """L 曲线（log 残差范数, log 正则项范数）曲率最大处的下标"""
+    x = np.log(curves['lambdas'])
+    rho = np.log(curves['residual_norm'])
+    eta = np.log(curves['solution_norm'])
+    d_rho, d_eta = np.gradient(rho, x), np.gradient(eta, x)
+    dd_rho, dd_eta = np.gradient(d_rho, x), np.gradient(d_eta, x)
+    curvature = (d_rho * dd_eta - dd_rho * d_eta) / np.maximum(d_rho ** 2 + d_eta ** 2, 1e-300) ** 1.5
+    return int(np.argmax(curvature))
+
+
+def select_lambda(freq, z_real, z_imag, method='gcv', lambdas=None, noise=None, **options):
+    """
+    自动选择正则化参数，返回 (λ, lambda_curves 的结果)。
+
+    method 为 'gcv'（广义交叉验证最小）、'lcurve'（L 曲线拐点）或 'discrepancy'（偏差原理：
+    残差范数不超过 noise·√(2N) 的最大 λ；noise 为每个数据点的噪声标准差，默认由 GCV 解的残差估计）。
+    options 与 solve 的 order、basis、fwhm_coeff、tau、inductance 相同。
+    """
+    if method not in LAMBDA_METHODS:
+        raise ValueError(f"未知的 λ 选择方法: {method}")
+    curves = lambda_curves(freq, z_real, z_imag, lambdas, **options)
+    best = int(np.argmin(curves['gcv']))
+    if method == 'lcurve':
+        best = _lcurve_corner(curves)
+    elif method == 'discrepancy':
+        if noise is None:
+            noise = curves['residual_norm'][best] / np.sqrt(curves['dof'][best])
+        allowed = np.flatnonzero(curves['residual_norm'] <= noise * np.sqrt(2 * len(freq)))
+        best = int(allowed[np.argmax(curves['lambdas'][allowed])]) if allowed.size else best
+    return float(curves['lambdas'][best]), curves
+
+
+def find_peaks(gamma, order=PEAK_ORDER):
+    """γ(τ) 极大值的下标（argrelextrema，与 DRT 处理脚本的 find_extrema 一致）"""
+    return argrelextrema(np.asarray(gamma), np.greater, order=order)[0]
+
+
+def refine_peak(tau, gamma, index):
+    """在 log τ 上用相邻三点抛物线插值，得到峰位与峰高的网格间估计，返回 (τ, γ)"""
+    if index <= 0 or index >= len(gamma) - 1:
+        return tau[index], gamma[index]
+    left, middle, right = gamma[index - 1:index + 2]
+    curvature = left - 2 * middle + right
+    shift = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+    log_tau = np.log(tau)
+    step = 0.5 * (log_tau[index + 1] - log_tau[index - 1])
+    return np.exp(log_tau[index] + shift * step), middle - 0.25 * (left - right) * shift
+
+
+def bootstrap(freq, z_real, z_imag, samples=BOOTSTRAP_SAMPLES, level=CONFIDENCE_LEVEL, seed=None,
+              lam=DEFAULT_LAMBDA, order=DEFAULT_ORDER, basis='gaussian', fwhm_coeff=DEFAULT_FWHM_COEFF,
+              tau=None, inductance=True):
+    """
+    残差重采样 bootstrap：按频率点有放回地抽取拟合残差（实部、虚部成对），加回拟合值后重新反演。
+
+    设计矩阵（核矩阵 + 正则化行）与 λ 在所有重采样中相同，只构造一次。
+    重采样数据比原始数据多一份噪声，正则化会使重采样结果整体偏低、偏宽，
+    因此区间以原始拟合为中心，宽度取重采样结果相对其均值的分位数。
+    返回 solve 的结果，另加 gamma_lower / gamma_upper（γ(τ) 的逐点区间）与 peaks：
+    原始拟合每个峰一项，含 tau、gamma（抛物线插值）及其 *_lower / *_upper，detected 为重采样中检出该峰的比例。
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    z_real = np.asarray(z_real, dtype=np.float64)
+    z_imag = np.asarray(z_imag, dtype=np.float64)
+    if tau is None:
+        tau = tau_grid(freq)
+    result = solve(freq, z_real, z_imag, lam=lam, order=order, basis=basis, fwhm_coeff=fwhm_coeff,
+                   tau=tau, inductance=inductance)
+    fit_real, fit_imag = reconstruct(result, freq, basis, fwhm_coeff)
+    residual_real, residual_imag = z_real - fit_real, z_imag - fit_imag
+
+    design, n_extra = _stacked_design(freq, tau, lam, order, basis, fwhm_coeff, inductance, None)
+    padding = np.zeros(design.shape[0] - 2 * len(freq))
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, len(freq), size=(samples, len(freq)))
+    gammas = np.empty((samples, len(tau)))
+    for i, draw in enumerate(draws):
+        target = np.concatenate((fit_real + residual_real[draw], fit_imag + residual_imag[draw], padding))
+        solution, _ = nnls(design, target, maxiter=50 * design.shape[1])
+        gammas[i] = _unpack(solution, n_extra, tau, basis, fwhm_coeff)[1]
+
+    tail = (1 - level) / 2 * 100
+
+    def interval(estimate, values):
+        values = np.asarray(values)
+        return estimate + np.percentile(values - values.mean(axis=0), [tail, 100 - tail], axis=0)
+
+    lower, upper = interval(result['gamma'], gammas)
+    result['gamma_lower'], result['gamma_upper'] = np.maximum(lower, 0), np.maximum(upper, 0)
+    result['samples'] = samples
+
+    # 每个重采样中取与原始峰最近（log τ）的峰；峰位区间在 log τ 上计算
+    log_tau = np.log10(tau)
+    sample_peaks = [find_peaks(gamma) for gamma in gammas]
+    result['peaks'] = []
+    for index in find_peaks(result['gamma']):
+        peak_tau, peak_gamma = refine_peak(tau, result['gamma'], index)
+        matched = []
+        for gamma, peaks in zip(gammas, sample_peaks):
+            if len(peaks):
+                nearest = peaks[np.argmin(np.abs(log_tau[peaks] - log_tau[index]))]
+                if abs(log_tau[nearest] - log_tau[index]) <= PEAK_MATCH_DECADES:
+                    matched.append(refine_peak(tau, gamma, nearest))
+        peak = {'tau': peak_tau, 'gamma': peak_gamma, 'detected': len(matched) / samples,
+                'tau_lower': np.nan, 'tau_upper': np.nan, 'gamma_lower': np.nan, 'gamma_upper': np.nan}
+        if matched:
+            matched = np.array(matched)
+            peak['tau_lower'], peak['tau_upper'] = 10 ** interval(np.log10(peak_tau), np.log10(matched[:, 0]))
+            peak['gamma_lower'], peak['gamma_upper'] = interval(peak_gamma, matched[:, 1])
+        result['peaks'].append(peak)
+    return result
+
+
+def write_bands(file_path, result):
+    """写出 γ(τ) 及其置信区间：tau, gamma, gamma_lower, gamma_upper"""
+    with open(file_path, 'w') as file:
+        file.write(f"samples,{result['samples']}\n")
+        file.write("tau, gamma(tau), gamma_lower, gamma_upper\n")
+        np.savetxt(file, np.column_stack((result['tau'], result['gamma'], result['gamma_lower'], result['gamma_upper'])),
+                   fmt='%e', delimiter=', ')
+
+
+def reconstruct(result, freq, basis='gaussian', fwhm_coeff=DEFAULT_FWHM_COEFF):
+    """由反演结果重建阻抗 (Z', Z'')，用于检查拟合质量"""
+    freq = np.asarray(freq, dtype=np.float64)
+    a_re, a_im = kernel(freq, result['tau'], basis, fwhm_coeff)
+    z_real = result['R_inf'] + a_re @ result['coefficients']
+    z_imag = 2 * np.pi * freq * result['L'] + a_im @ result['coefficients']
+    return z_real, z_imag
+
+
+def read_spectrum(file_path):
+    """读取 process_eis_files.py 输出、CHI 文本导出或 .bin 原始文件中的 EIS，返回 (freq, Z', Z'')，按频率从高到低排列"""
+    meta, data = chi_parser.read_chi_file(file_path)
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))  # .bin 返回按列的元组
+    if data.shape[0] < 3 or data.shape[1] == 0 or meta.get('columns', [''])[0].lower().startswith('tau'):
+        raise ValueError(f"{file_path} 中没有 EIS 数据")
+    freq, z_real, z_imag = data[0], data[1], data[2]
+    valid = freq > 0
+    order = np.argsort(-freq[valid], kind='stable')
+    return freq[valid][order], z_real[valid][order], z_imag[valid][order]
+
+
+def write_drt(file_path, result):
+    """按 DRTtools 导出格式写出 tau, gamma(tau)"""
+    with open(file_path, 'w') as file:
+        file.write(f"L,{result['L']:e}\n")
+        file.write(f"R,{result['R_inf']:e}\n")
+        if 'lambda' in result:
+            file.write(f"lambda,{result['lambda']:e}\n")
+        file.write("tau, gamma(tau)\n")
+        np.savetxt(file, np.column_stack((result['tau'], result['gamma'])), fmt='%e', delimiter=', ')
+
+
+def solve_batch(spectra, **options):
+    """
+    批量反演，spectra 为 [(名称, freq, Z', Z'')]；返回 [(名称, 结果)]。
+
+    频率网格相同的谱共用同一个 τ 网格与核矩阵，只计算一次。
+    """
+    results = []
+    tau_by_grid = {}
+    for name, freq, z_real, z_imag in spectra:
+        freq = np.ascontiguousarray(freq, dtype=np.float64)
+        tau = options.get('tau')
+        if tau is None:
+            tau = tau_by_grid.setdefault(freq.tobytes(), tau_grid(freq))
+        results.append((name, solve(freq, z_real, z_imag, **{**options, 'tau': tau})))
+    return results
+
+
+def solve_joint(spectra, lam=DEFAULT_LAMBDA, mu=DEFAULT_MU, order=DEFAULT_ORDER, basis='gaussian',
+                fwhm_coeff=DEFAULT_FWHM_COEFF, tau=None, inductance=True):
+    """
+    电压序列的联合 DRT 反演，spectra 为 [(电压, freq, Z', Z'')]。
+
+    目标函数为各电压拟合残差 + λ·τ 方向差分 + μ·相邻电压 γ 系数之差（按平均电压间距归一化）。
+    返回字典：voltages（升序）、tau、gamma（形状 (电压数, τ 点数)）、coefficients、R_inf、L、iterations。
+    """
+    spectra = sorted(spectra, key=lambda item: item[0])
+    voltages = np.array([item[0] for item in spectra], dtype=np.float64)
+    if tau is None:
+        tau = tau_grid(np.concatenate([np.asarray(item[1], dtype=np.float64) for item in spectra]))
+    n_tau = len(tau)
+    n_extra = 2 if inductance else 1
+    n_block = n_extra + n_tau
+    n_voltages = len(spectra)
+
+    blocks, targets = [], []
+    for _, freq, z_real, z_imag in spectra:
+        freq = np.asarray(freq, dtype=np.float64)
+        a_re, a_im = kernel(freq, tau, basis, fwhm_coeff)
+        blocks.append(sparse.csr_matrix(_design(freq, a_re, a_im, inductance)))
+        targets.append(np.concatenate((np.asarray(z_real, dtype=np.float64), np.asarray(z_imag, dtype=np.float64))))
+
+    # 只作用于 γ 系数、不作用于 R_inf / L 的列选择矩阵
+    select = sparse.hstack((sparse.csr_matrix((n_tau, n_extra)), sparse.identity(n_tau, format='csr')))
+    tau_difference = np.sqrt(lam) * sparse.csr_matrix(difference_matrix(n_tau, order)) @ select
+    rows = [sparse.block_diag(blocks, format='csr'), sparse.kron(sparse.identity(n_voltages), tau_difference)]
+    if n_voltages > 1:
+        # 电压间距不均匀时按间距缩放差分，使 μ 对应单位电压变化的惩罚
+        spacing = np.diff(voltages)
+        scale = np.where(spacing > 0, np.mean(spacing) / np.where(spacing > 0, spacing, 1), 1.0)
+        voltage_difference = sparse.diags(np.sqrt(mu) * scale) @ sparse.csr_matrix(difference_matrix(n_voltages, 1))
+        rows.append(sparse.kron(voltage_difference, select))
+
+    design = sparse.vstack(rows, format='csr')
+    target = np.concatenate(targets + [np.zeros(design.shape[0] - sum(len(t) for t in targets))])
+
+    # 以各电压单独反演的结果作为初值
+    start = []
+    for _, freq, z_real, z_imag in spectra:
+        result = solve(freq, z_real, z_imag, lam=lam, order=order, basis=basis, fwhm_coeff=fwhm_coeff,
+                       tau=tau, inductance=inductance)
+        start += [[result['R_inf'], result['L']][:n_extra], result['coefficients']]
+    solution, iterations = _nonnegative_least_squares(design, target, np.concatenate(start))
+    solution = solution.reshape(n_voltages, n_block)
+
+    coefficients = solution[:, n_extra:]
+    gamma = coefficients @ _basis(np.log(tau), np.log(tau), basis, fwhm_coeff).T
+    return {
+        'voltages': voltages,
+        'tau': tau,
+        'gamma': gamma,
+        'coefficients': coefficients,
+        'R_inf': solution[:, 0],
+        'L': solution[:, 1] if inductance else np.zeros(n_voltages),
+        'iterations': iterations,
+    }
+
+
+def _nonnegative_least_squares(design, target, start, tol=1e-5, max_iter=5000):
+    """
+    稀疏 min ||design @ x - target||, x >= 0，返回 (x, 迭代次数)。
+
+    列先归一化（R_inf、L 与 γ 系数量级差别很大），再对带状法方程矩阵做 ADMM；
+    罚参数 ρ 按原始 / 对偶残差自适应调整，每次调整只需重新做一次带状 Cholesky 分解。
+    """
+    norms = np.sqrt(np.asarray(design.multiply(design).sum(axis=0)).ravel())
+    scale = 1 / np.where(norms > 0, norms, 1)
+    design = design @ sparse.diags(scale)
+    normal = (design.T @ design).tocoo()
+    rhs = design.T @ target
+
+    upper = normal.row <= normal.col
+    rows, cols, values = normal.row[upper], normal.col[upper], normal.data[upper]
+    bandwidth = int((cols - rows).max()) if len(rows) else 0
+    band = np.zeros((bandwidth + 1, len(rhs)))
+    np.add.at(band, (bandwidth + rows - cols, cols), values)
+
+    def factor(rho):
+        shifted = band.copy()
+        shifted[bandwidth] += rho
+        return cholesky_banded(shifted)
+
+    rho = 0.01 * np.mean(band[bandwidth])
+    cholesky = factor(rho)
+    z = np.maximum(start / scale, 0)
+    u = np.zeros_like(z)
+    for iteration in range(1, max_iter + 1):
+        x = cho_solve_banded((cholesky, False), rhs + rho * (z - u))
+        z_new = np.maximum(x + u, 0)
+        u += x - z_new
+        primal = np.linalg.norm(x - z_new) / max(1.0, np.linalg.norm(z_new))
+        dual = rho * np.linalg.norm(z_new - z) / max(1.0, np.linalg.norm(rhs))
+        z = z_new
+        if primal < tol and dual < tol:
+            break
+        if iteration % 20 == 0 and (primal > 10 * dual or dual > 10 * primal):
+            change = 2.0 if primal > dual else 0.5
+            rho *= change
+            u /= change
+            cholesky = factor(rho)
+    return z * scale, iteration
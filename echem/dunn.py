@@ -0,0 +1,228 @@
+# Roc_Huang
+#
+# 程序功能：
+# 多扫速 CV 的电容 / 扩散电流分离（Dunn 方法）与 b 值分析。
+# 1. 每条 CV 取最后一个正扫与负扫半周期，插值到所有扫速共有的电位网格上（GRID_POINTS 个点）。
+# 2. 每个电位处 i(V) = k1·v + k2·v^½；各电位的设计矩阵 [v, v^½] 相同，
+#    因此所有电位、两个扫描方向一次矩阵乘法（设计矩阵的伪逆 × 电流矩阵）同时求解。
+# 3. 电容电流 k1·v 与总电流之比在电位上积分得到每个扫速的电容贡献比例。
+# 4. b 值：每个电位处 log|i| 对 log v 线性回归的斜率（同样一次求解），b ≈ 1 为电容控制，b ≈ 0.5 为扩散控制；
+#    各扫速电流不同号或为 0 的电位记为 NaN。
+#
+# 用法：python -m echem.dunn <数据根目录> [--workers N]
+# 对每个有两个以上 CV-<扫速> 文件的文件夹输出 dunn_analysis.png、dunn_fraction.csv 与 dunn_b_values.csv。
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from echem import cache, cv_cycles, manifest
+
+GRID_POINTS = 200
+AREA_CM2 = 0.196  # 电极面积
+
+OUTPUT_PNG = 'dunn_analysis.png'
+FRACTION_CSV = 'dunn_fraction.csv'
+B_VALUES_CSV = 'dunn_b_values.csv'
+
+# 两个扫描方向，依次为正扫（电位升高）与负扫
+BRANCHES = ('anodic', 'cathodic')
+
+
+def branches(potential, current):
+    """最后一个正扫与负扫半周期，返回 [(电位, 电流)]（按电位升序排列）；缺少某个方向时该项为 None"""
+    potential = np.asarray(potential, dtype=np.float64)
+    current = np.asarray(current, dtype=np.float64)
+    found = [None, None]
+    for start, stop in cv_cycles.segment_bounds(potential)[::-1]:
+        if stop - start < 2:
+            continue
+        side = 0 if potential[stop] > potential[start] else 1
+        if found[side] is None:
+            order = np.argsort(potential[start:stop + 1], kind='stable')
+            found[side] = (potential[start:stop + 1][order], current[start:stop + 1][order])
+        if all(item is not None for item in found):
+            break
+    return found
+
+
+def resample(curves, grid_points=GRID_POINTS):
+    """
+    把各扫速的 CV（[(电位, 电流)]）插值到共有的电位网格，返回 (网格, 电流数组 (扫速数, 2, 网格点数))。
+
+    网格取所有曲线两个扫描方向电位范围的交集。
+    """
+    halves = [branches(potential, current) for potential, current in curves]
+    if any(half is None for pair in halves for half in pair):
+        raise ValueError("CV 数据缺少完整的正扫或负扫")
+    low = max(half[0][0] for pair in halves for half in pair)
+    high = min(half[0][-1] for pair in halves for half in pair)
+    if not high > low:
+        raise ValueError("各扫速 CV 的电位范围没有交集")
+    grid = np.linspace(low, high, grid_points)
+    currents = np.array([[np.interp(grid, potential, current) for potential, current in pair] for pair in halves])
+    return grid, currents
+
+
+def _regression(design, values):
+    """同一设计矩阵对多组数据的最小二乘：values 形状 (观测数, ...)，返回系数形状 (参数数, ...)"""
+    shape = values.shape
+    coefficients = np.linalg.pinv(design) @ values.reshape(shape[0], -1)
+    return coefficients.reshape((design.shape[1],) + shape[1:])
+
+
+def _integral(values, grid):
+    """沿最后一维对等间距网格做梯形积分"""
+    return (values[..., 1:] + values[..., :-1]).sum(axis=-1) * (grid[1] - grid[0]) / 2
+
+
+def deconvolve(scan_rates, curves, grid_points=GRID_POINTS):
+    """
+    Dunn 方法分离电容与扩散电流。scan_rates 单位 mV/s，curves 为对应的 [(电位 (V), 电流)]。
+
+    返回字典：grid、scan_rates (mV/s)、current / capacitive / diffusive（形状 (扫速数, 2, 网格点数)，第二维为正扫、负扫）、
+    k1、k2（形状 (2, 网格点数)）、fraction（每个扫速的电容贡献比例）与 b（形状 (2, 网格点数)）。
+    """
+    scan_rates = np.asarray(scan_rates, dtype=np.float64)
+    if len(scan_rates) < 2:
+        raise ValueError("至少需要两个扫速")
+    order = np.argsort(scan_rates)
+    scan_rates = scan_rates[order]
+    grid, current = resample([curves[i] for i in order], grid_points)
+
+    v = scan_rates / 1000  # V/s
+    k1, k2 = _regression(np.column_stack((v, np.sqrt(v))), current)
+    capacitive = v[:, None, None] * k1[None]
+    diffusive = np.sqrt(v)[:, None, None] * k2[None]
+
+    # 电容贡献比例 = ∮|k1·v| dE / ∮|i| dE（两个扫描方向合计）
+    total = _integral(np.abs(current), grid).sum(axis=1)
+    fraction = _integral(np.abs(capacitive), grid).sum(axis=1) / total
+
+    # b 值：各扫速电流同号且不为 0 的电位才有定义
+    same_sign = (np.all(current > 0, axis=0) | np.all(current < 0, axis=0))
+    log_current = np.log10(np.where(same_sign[None], np.abs(current), 1.0))
+    b = _regression(np.column_stack((np.log10(v), np.ones_like(v))), log_current)[0]
+    b = np.where(same_sign, b, np.nan)
+
+    return {
+        'grid': grid,
+        'scan_rates': scan_rates,
+        'current': current,
+        'capacitive': capacitive,
+        'diffusive': diffusive,
+        'k1': k1,
+        'k2': k2,
+        'fraction': fraction,
+        'b': b,
+    }
+
+
+def plot_contribution(ax, result, index=-1, unit='Current Density (mA/cm²)'):
+    """某个扫速（默认最大扫速）的 CV 与电容电流闭合曲线，电容贡献部分填充阴影"""
+    grid = result['grid']
+    loop = lambda values: np.concatenate((values[0], values[1][::-1]))
+    potential = np.concatenate((grid, grid[::-1]))
+    ax.plot(potential, loop(result['current'][index]), color='black', label='Total')
+    ax.fill(potential, loop(result['capacitive'][index]), color='tab:blue', alpha=0.4,
+            label=f"Capacitive ({result['fraction'][index]:.0%})")
+    ax.set_xlabel('Potential (V)')
+    ax.set_ylabel(unit)
+    ax.set_title(f"Capacitive Contribution at {result['scan_rates'][index]:g} mV/s")
+    ax.legend()
+
+
+def plot_fraction(ax, result):
+    """各扫速的电容 / 扩散贡献比例堆叠柱状图"""
+    x = np.arange(len(result['scan_rates']))
+    ax.bar(x, result['fraction'] * 100, color='tab:blue', label='Capacitive')
+    ax.bar(x, (1 - result['fraction']) * 100, bottom=result['fraction'] * 100, color='tab:orange', label='Diffusion')
+    ax.set_xticks(x)
+    ax.set_xticklabels([f'{rate:g}' for rate in result['scan_rates']])
+    ax.set_xlabel('Scan Rate (mV/s)')
+    ax.set_ylabel('Contribution (%)')
+    ax.set_title('Capacitive Fraction')
+    ax.legend()
+
+
+def plot_b_values(ax, result):
+    """b 值随电位的变化（正扫、负扫各一条）"""
+    for branch, b in zip(BRANCHES, result['b']):
+        ax.plot(result['grid'], b, label=branch.capitalize())
+    ax.axhline(1.0, color='gray', linestyle='--', linewidth=1)
+    ax.axhline(0.5, color='gray', linestyle=':', linewidth=1)
+    ax.set_xlabel('Potential (V)')
+    ax.set_ylabel('b value')
+    ax.set_title('b Value (log i vs log v)')
+    ax.legend()
+
+
+def save(folder, result, unit='Current Density (mA/cm²)'):
+    """在 folder 中保存三联图与两个结果表"""
+    fig = Figure(figsize=(18, 5.5))
+    axes = fig.subplots(1, 3)
+    plot_contribution(axes[0], result, unit=unit)
+    plot_fraction(axes[1], result)
+    plot_b_values(axes[2], result)
+    fig.tight_layout()
+    fig.savefig(os.path.join(folder, OUTPUT_PNG), dpi=300)
+
+    pd.DataFrame({
+        'Scan Rate (mV/s)': result['scan_rates'],
+        'Capacitive Fraction': result['fraction'],
+        'Diffusion Fraction': 1 - result['fraction'],
+    }).to_csv(os.path.join(folder, FRACTION_CSV), index=False, encoding='utf-8-sig')
+    pd.DataFrame({
+        'Potential (V)': result['grid'],
+        'b (Anodic)': result['b'][0],
+        'b (Cathodic)': result['b'][1],
+        'k1 (Anodic)': result['k1'][0],
+        'k1 (Cathodic)': result['k1'][1],
+        'k2 (Anodic)': result['k2'][0],
+        'k2 (Cathodic)': result['k2'][1],
+    }).to_csv(os.path.join(folder, B_VALUES_CSV), index=False, encoding='utf-8-sig')
+
+
+def analyze_experiment(experiment):
+    """对一个样品文件夹的 CV-<扫速> 文件做 Dunn 分析并保存结果，返回各扫速的电容贡献比例；扫速不足两个时返回 None"""
+    rates, curves = [], []
+    for rate, data in manifest.read_cv_rates(experiment):
+        rates.append(rate)
+        curves.append((data['Potential'].to_numpy(), data['Current'].to_numpy() * 1000 / AREA_CM2))
+    if len(rates) < 2:
+        return None
+    try:
+        result = deconvolve(rates, curves)
+    except ValueError as e:
+        print(f"{experiment['name']} 的 Dunn 分析失败: {e}")
+        return None
+    save(experiment['folder'], result)
+    return dict(zip(result['scan_rates'].tolist(), result['fraction'].tolist()))
+
+
+def analyze_experiments(experiments, workers=None):
+    """用进程池对各样品文件夹做 Dunn 分析，返回 {样品名: {扫速: 电容贡献比例}}"""
+    payload = [{key: value for key, value in experiment.items() if key != 'frames'}
+               for experiment in experiments if len(experiment['cv_rates']) >= 2]
+    if len(payload) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=cache.worker_init) as executor:
+            results = list(executor.map(analyze_experiment, payload))
+    else:
+        results = [analyze_experiment(experiment) for experiment in payload]
+    return {experiment['name']: result for experiment, result in zip(payload, results) if result is not None}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='多扫速 CV 的 Dunn 电容 / 扩散电流分离')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--workers', type=int, help='进程数，默认为 CPU 核数')
+    args = parser.parse_args()
+
+    fractions = analyze_experiments(manifest.crawl(os.path.abspath(args.root)).values(), args.workers)
+    for name, fraction in fractions.items():
+        print(name, ', '.join(f'{rate:g} mV/s: {value:.1%}' for rate, value in fraction.items()))
+    print(f"已完成 {len(fractions)} 个文件夹的 Dunn 分析。")
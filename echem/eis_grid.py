@@ -0,0 +1,61 @@
+# Roc_Huang
+#
+# 程序功能：
+# 多电压 EIS 谱映射到 (电压, Z') 网格，供热图使用。
+# 1. z_real_axis 生成 Z' 网格：所有 Z' 取值去重后不超过 resolution 个时直接使用，否则在最小、最大值间等分。
+# 2. grid_spectra 用 np.searchsorted 一次性找出全部数据点最近的网格列，
+#    'last' 模式与原热图一致（同一格子中后出现的点覆盖先出现的点），'mean' 模式对落在同一格子的点取平均。
+# 3. 没有数据点的格子为 0，与原实现相同。
+
+import numpy as np
+
+MODES = ('last', 'mean')
+
+
+def z_real_axis(z_real_arrays, resolution=100):
+    """由各条谱的 Z' 生成网格坐标"""
+    values = np.unique(np.concatenate([np.asarray(z, dtype=np.float64) for z in z_real_arrays]))
+    values = values[np.isfinite(values)]
+    if len(values) > resolution:
+        return np.linspace(values[0], values[-1], resolution)
+    return values
+
+
+def nearest_index(axis, values):
+    """axis（升序）中与每个 values 最近的下标；与 argmin 相同，距离相等时取较小的下标"""
+    right = np.clip(np.searchsorted(axis, values), 1, len(axis) - 1)
+    left = right - 1
+    choose_right = np.abs(axis[right] - values) < np.abs(values - axis[left])
+    return np.where(choose_right, right, left) if len(axis) > 1 else np.zeros(len(values), dtype=np.intp)
+
+
+def grid_spectra(z_real_arrays, value_arrays, axis, mode='last'):
+    """
+    把第 i 条谱放到网格第 i 行，返回形状 (谱数, len(axis)) 的数组。
+
+    value_arrays 为要着色的量（热图中为 -Z''），与 z_real_arrays 一一对应。
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的网格模式: {mode}")
+    lengths = [len(z) for z in z_real_arrays]
+    grid = np.zeros((len(lengths), len(axis)))
+    if not sum(lengths) or not len(axis):
+        return grid
+
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    z_real = np.concatenate([np.asarray(z, dtype=np.float64) for z in z_real_arrays])
+    values = np.concatenate([np.asarray(v, dtype=np.float64) for v in value_arrays])
+    valid = np.isfinite(z_real) & np.isfinite(values)
+    rows, z_real, values = rows[valid], z_real[valid], values[valid]
+    flat = rows * len(axis) + nearest_index(axis, z_real)
+
+    if mode == 'last':
+        # 同一格子有多个点时，保留每个格子最后出现的那个点
+        order = np.unique(flat[::-1], return_index=True)[1]
+        last = len(flat) - 1 - order
+        grid.flat[flat[last]] = values[last]
+    else:
+        sums = np.bincount(flat, weights=values, minlength=grid.size)
+        counts = np.bincount(flat, minlength=grid.size)
+        np.divide(sums, counts, out=grid.reshape(-1), where=counts > 0)
+    return grid
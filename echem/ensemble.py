@@ -0,0 +1,233 @@
+# Roc_Huang
+#
+# 程序功能：
+# 重复测试 / 多个电极的 CV、LSV 曲线插值到同一电位网格，按样品组给出平均值、标准差与百分位带，
+# 代替把采样点各不相同的原始曲线逐条叠加。
+# 1. 文件夹名去掉末尾的重复编号（REPLICATE，如 -r1、_rep2、#3、(2)、-平行1）后相同的为同一组。
+# 2. CV 取最后一个正扫与负扫半周期（见 echem.dunn.branches）分别插值，LSV 按电位排序后插值。
+# 3. interpolate 把所有曲线按行偏移首尾相接成一个单调数组，全部曲线、全部网格点只做一次 np.searchsorted，
+#    再在相邻两点间线性插值，得到 (曲线数, 网格点数) 的稠密矩阵；超出曲线电位范围的位置为 NaN。
+# 4. statistics 按组把矩阵排成 (组数, 最多重复数, ...) 后沿重复维一次归约出平均值、标准差与 PERCENTILES 百分位。
+#
+# 用法：python -m echem.ensemble <数据根目录> [--technique lsv|cv] [--rate 50]
+# 结果保存为根目录下的 ensemble_<technique>.png 与 ensemble_<technique>.csv。
+
+import argparse
+import os
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from echem import dunn, manifest, ohmic, overpotential
+
+GRID_POINTS = 400
+PERCENTILES = (10, 90)  # 带的上下百分位
+
+# 文件夹名末尾的重复编号；r / rep / repeat / run 前必须有分隔符，否则 Cr3、AIr2 这类元素加化学计量数会被误当作编号
+REPLICATE = re.compile(r'(?:[\s_-]+(?:r|rep|repeat|run)\d+|[\s_-]*(?:\(\d+\)|#\d+|平行\d+))$', re.IGNORECASE)
+
+STAT_KEYS = ('count', 'mean', 'std', 'low', 'high')
+BRANCH_LABELS = ('Anodic', 'Cathodic')
+
+
+def group_name(name):
+    """去掉末尾重复编号后的样品组名"""
+    return REPLICATE.sub('', name) or name
+
+
+def lsv_branch(potential, current):
+    """LSV 曲线按电位升序排列"""
+    potential = np.asarray(potential, dtype=np.float64)
+    order = np.argsort(potential, kind='stable')
+    return potential[order], np.asarray(current, dtype=np.float64)[order]
+
+
+def common_grid(branches, grid_points=GRID_POINTS):
+    """覆盖所有曲线电位范围（并集）的等间距网格"""
+    low = min(x[0] for x, _ in branches)
+    high = max(x[-1] for x, _ in branches)
+    return np.linspace(low, high, grid_points)
+
+
+def interpolate(branches, grid):
+    """
+    [(升序电位, 电流)] 在 grid 上的线性插值，返回 (曲线数, 网格点数) 的矩阵，超出各曲线电位范围处为 NaN。
+
+    各行补齐到相同长度（用本行最后一个点填充）并加上逐行递增的偏移，拼成一个单调数组后一次 searchsorted。
+    """
+    grid = np.asarray(grid, dtype=np.float64)
+    result = np.full((len(branches), len(grid)), np.nan)
+    lengths = np.array([len(x) for x, _ in branches], dtype=np.intp)
+    if not len(branches) or lengths.max(initial=0) < 2:
+        return result
+
+    length = lengths.max()
+    fill = np.arange(length)[None, :] >= lengths[:, None]
+    x = np.zeros((len(branches), length))
+    y = np.zeros((len(branches), length))
+    for row, (xs, ys) in enumerate(branches):
+        x[row, :len(xs)] = xs
+        y[row, :len(ys)] = ys
+    last = np.maximum(lengths - 1, 0)[:, None]
+    rows = np.arange(len(branches))[:, None]
+    x = np.where(fill, x[rows, last], x)
+    y = np.where(fill, y[rows, last], y)
+
+    low = min(x.min(), grid.min())
+    span = max(x.max(), grid.max()) - low + 1
+    offsets = rows * span
+    position = np.searchsorted((x - low + offsets).ravel(), (grid - low)[None, :] + offsets, side='left')
+    k = np.clip(position - rows * length, 1, np.maximum(last, 1))
+
+    x0, x1 = x[rows, k - 1], x[rows, k]
+    y0, y1 = y[rows, k - 1], y[rows, k]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = np.where(x1 > x0, y0 + (y1 - y0) * (grid[None, :] - x0) / (x1 - x0), y1)
+    inside = (grid[None, :] >= x[:, :1]) & (grid[None, :] <= x[rows, last]) & (lengths[:, None] >= 2)
+    result[inside] = values[inside]
+    return result
+
+
+def resample_lsv(curves, grid_points=GRID_POINTS):
+    """[(电位, 电流密度)] 的 LSV 插值到共同网格，返回 (网格, (曲线数, 网格点数))"""
+    branches = [lsv_branch(x, j) for x, j in curves]
+    grid = common_grid(branches, grid_points)
+    return grid, interpolate(branches, grid)
+
+
+def resample_cv(curves, grid_points=GRID_POINTS):
+    """[(电位, 电流密度)] 的 CV 正扫 / 负扫分别插值到共同网格，返回 (网格, (曲线数, 2, 网格点数))"""
+    halves = [dunn.branches(x, j) for x, j in curves]
+    if any(half is None for pair in halves for half in pair):
+        raise ValueError("CV 数据缺少完整的正扫或负扫")
+    branches = [half for pair in halves for half in pair]
+    grid = common_grid(branches, grid_points)
+    return grid, interpolate(branches, grid).reshape(len(halves), 2, len(grid))
+
+
+def statistics(values, names, percentiles=PERCENTILES):
+    """
+    按 group_name(names) 分组统计 values（第一维与 names 对应），返回 (组名列表, 结果字典)。
+
+    结果字典各项形状为 (组数,) + values.shape[1:]：count（非 NaN 的重复数）、mean、std（样本标准差，单条曲线为 NaN）、
+    low / high（percentiles 百分位）。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    groups, codes = np.unique([group_name(name) for name in names], return_inverse=True)
+    codes = codes.ravel()
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    member = np.arange(len(codes)) - np.repeat(starts, counts)
+
+    stacked = np.full((len(groups), counts.max(initial=0)) + values.shape[1:], np.nan)
+    stacked[codes[order], member] = values[order]
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        count = np.isfinite(stacked).sum(axis=1)
+        result = {
+            'count': count,
+            'mean': np.nanmean(stacked, axis=1),
+            'std': np.where(count >= 2, np.nanstd(stacked, axis=1, ddof=1), np.nan),
+            'low': np.nanpercentile(stacked, percentiles[0], axis=1),
+            'high': np.nanpercentile(stacked, percentiles[1], axis=1),
+        }
+    return [str(group) for group in groups], result
+
+
+def plot_bands(ax, grid, groups, stats, colors=None):
+    """每组一条平均曲线加百分位带；CV（结果含正扫 / 负扫维）两个方向用同一颜色"""
+    colors = colors or [f'C{i}' for i in range(10)]
+    for i, group in enumerate(groups):
+        color = colors[i % len(colors)]
+        mean, low, high = stats['mean'][i], stats['low'][i], stats['high'][i]
+        if mean.ndim == 1:
+            mean, low, high = mean[None], low[None], high[None]
+        replicates = int(stats['count'][i].max())
+        for side in range(len(mean)):
+            ax.plot(grid, mean[side], color=color, label=f'{group} (n={replicates})' if side == 0 else None)
+            ax.fill_between(grid, low[side], high[side], color=color, alpha=0.25, linewidth=0)
+
+
+def table(grid, groups, stats):
+    """网格与各组统计量的宽表（DataFrame），CV 的列名带 Anodic / Cathodic"""
+    columns = {'Potential (V)': grid}
+    low, high = PERCENTILES
+    labels = {'count': 'N', 'mean': 'Mean', 'std': 'Std', 'low': f'P{low}', 'high': f'P{high}'}
+    for i, group in enumerate(groups):
+        for key in STAT_KEYS:
+            values = stats[key][i]
+            if values.ndim == 1:
+                columns[f'{group} {labels[key]}'] = values
+            else:
+                for side, branch in enumerate(BRANCH_LABELS):
+                    columns[f'{group} {branch} {labels[key]}'] = values[side]
+    return pd.DataFrame(columns)
+
+
+def save(folder, technique, grid, groups, stats, xlabel, ylabel):
+    """保存带状图与统计表 ensemble_<technique>.png / .csv，返回两个路径"""
+    fig = Figure(figsize=(10, 8))
+    ax = fig.subplots()
+    plot_bands(ax, grid, groups, stats)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(f'{technique.upper()} Ensemble (mean, P{PERCENTILES[0]}–P{PERCENTILES[1]})')
+    ax.legend(fontsize=8)
+    ax.grid(True)
+    fig.tight_layout()
+    png = os.path.join(folder, f'ensemble_{technique}.png')
+    fig.savefig(png, dpi=300)
+    csv = os.path.join(folder, f'ensemble_{technique}.csv')
+    table(grid, groups, stats).to_csv(csv, index=False, encoding='utf-8-sig')
+    return png, csv
+
+
+def experiment_curves(experiments, technique='lsv', rate=None):
+    """各实验用于集合统计的曲线，返回 (样品名列表, [(电位, 电流密度 (mA/cm²))])；LSV 做 iR 校正"""
+    names, curves = [], []
+    for experiment in experiments:
+        if technique == 'lsv':
+            data = manifest.read_frame(experiment, 'lsv')
+            resistance = ohmic.resistance(experiment)
+            if data is None or data.empty or resistance is None:
+                continue
+            curves.append(overpotential.corrected_curve(data['Potential'], data['Current'], resistance))
+        else:
+            if rate is None:
+                data = manifest.read_frame(experiment, 'cv')
+            else:
+                data = dict(manifest.read_cv_rates(experiment)).get(rate)
+            if data is None or data.empty:
+                continue
+            curves.append((data['Potential'].to_numpy(), data['Current'].to_numpy() * 1000 / overpotential.AREA_CM2))
+        names.append(experiment['name'])
+    return names, curves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='重复样品的 CV / LSV 平均曲线与百分位带')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--technique', choices=('lsv', 'cv'), default='lsv')
+    parser.add_argument('--rate', type=int, help='CV 使用 CV-<扫速> 文件（mV/s），默认使用 CV 文件')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    experiments = list(manifest.crawl(root).values())
+    if args.technique == 'lsv':
+        ohmic.estimate_experiments(experiments)
+    names, curves = experiment_curves(experiments, args.technique, args.rate)
+    if not curves:
+        raise SystemExit("没有可用的曲线")
+    if args.technique == 'lsv':
+        grid, values = resample_lsv(curves)
+        xlabel = 'Calibrated Potential (V)'
+    else:
+        grid, values = resample_cv(curves)
+        xlabel = 'Potential (V)'
+    groups, stats = statistics(values, names)
+    png, csv = save(root, args.technique, grid, groups, stats, xlabel, 'Current Density (mA/cm²)')
+    print(f"{len(curves)} 条曲线分为 {len(groups)} 组，结果保存到：{png}、{csv}")
@@ -0,0 +1,249 @@
+# Roc_Huang
+#
+# 程序功能：
+# 线性 Kramers–Kronig 检验（Lin-KK，Schönleber 2014），在作图、取 Rs、DRT 之前判断 EIS 谱是否可信。
+# 1. 用 R0 + jωL + Σ R_k / (1 + jωτ_k) 拟合谱，τ_k 在 1/ω_max ~ 1/ω_min 间对数等分；该模型天然满足 KK 关系，
+#    拟合不好说明测试过程中体系漂移、不稳定或非线性。
+# 2. RC 基矩阵按 (频率网格, RC 个数) 缓存，同一频率网格的一批谱按 1/|Z| 加权后用一次批量 QR 分解同时求解。
+# 3. RC 个数 M 按 μ 判据自动选择：从每个数量级两个开始逐步增加 M，直到 μ = 1 − Σ|R_k<0| / Σ|R_k≥0| 低于 MU_CRITERION（开始过拟合）。
+# 4. 输出相对残差 (Z − Z_fit) / |Z|（实部、虚部）；残差绝对值的最大值不超过 MAX_RESIDUAL、平均值不超过 MEAN_RESIDUAL 视为通过。
+#    稳定体系的残差通常在 1% 以内，测试中 Rct 漂移一半时最大残差约 5%，因此默认阈值取 2% / 1%。
+#
+# 用法：python -m echem.linkk <数据根目录> [--threshold 0.02] [--mean-threshold 0.01]
+# 每个 EIS 文件（含文件名带电压的谱）一行，结果保存为根目录下的 kk_validation.csv。
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from echem import drt, manifest
+
+OUTPUT_CSV = 'kk_validation.csv'
+
+MU_CRITERION = 0.85
+# 残差绝对值（相对 |Z|）的最大值、平均值均不超过下列阈值视为通过
+MAX_RESIDUAL = 0.02
+MEAN_RESIDUAL = 0.01
+MIN_ELEMENTS = 3
+
+_basis_cache = {}
+
+
+def time_constants(freq, m):
+    """M 个 RC 单元的时间常数，在 1/ω_max ~ 1/ω_min 间对数等分"""
+    omega = 2 * np.pi * np.asarray(freq, dtype=np.float64)
+    return np.logspace(-np.log10(omega.max()), -np.log10(omega.min()), m)
+
+
+def basis(freq, m, inductance=True):
+    """
+    实部、虚部上下拼接的基矩阵，形状 (2 × 频率数, 列数)，各列依次为 R0、[L]、R_1 … R_M。
+
+    结果按 (频率网格, M, 是否含电感) 缓存，返回的数组不要原地修改。
+    """
+    freq = np.ascontiguousarray(freq, dtype=np.float64)
+    key = (freq.tobytes(), m, inductance)
+    cached = _basis_cache.get(key)
+    if cached is not None:
+        return cached
+
+    omega = 2 * np.pi * freq
+    omega_tau = omega[:, None] * time_constants(freq, m)[None, :]
+    denominator = 1 + omega_tau ** 2
+    real = [np.ones((len(freq), 1))]
+    imag = [np.zeros((len(freq), 1))]
+    if inductance:
+        real.append(np.zeros((len(freq), 1)))
+        imag.append(omega[:, None])
+    real.append(1 / denominator)
+    imag.append(-omega_tau / denominator)
+    matrix = np.vstack((np.hstack(real), np.hstack(imag)))
+    _basis_cache[key] = matrix
+    return matrix
+
+
+def _fit_batch(freq, z, m, inductance):
+    """同一频率网格的一批谱（z 形状 (谱数, 频率数)）按 1/|Z| 加权一次性最小二乘，返回 (系数, 拟合阻抗)"""
+    matrix = basis(freq, m, inductance)
+    # 列归一化后再加权，避免 L 一列（正比于 ω）与电阻列量级相差过大
+    scale = np.linalg.norm(matrix, axis=0)
+    weight = np.tile(1 / np.abs(z), 2)
+    target = np.hstack((z.real, z.imag)) * weight
+    q, r = np.linalg.qr(matrix[None, :, :] / scale * weight[:, :, None])
+    coefficients = np.linalg.solve(r, np.einsum('bij,bi->bj', q, target)[:, :, None])[:, :, 0] / scale
+    fitted = coefficients @ matrix.T
+    n = len(freq)
+    return coefficients, fitted[:, :n] + 1j * fitted[:, n:]
+
+
+def _mu(resistances):
+    positive = np.where(resistances >= 0, resistances, 0).sum(axis=1)
+    negative = np.where(resistances < 0, -resistances, 0).sum(axis=1)
+    return 1 - negative / np.where(positive > 0, positive, np.inf)
+
+
+def validate_grid(freq, z_real, z_imag, threshold=MAX_RESIDUAL, mean_threshold=MEAN_RESIDUAL, max_elements=None,
+                  inductance=True):
+    """
+    检验频率网格相同的一批谱，z_real / z_imag 形状为 (谱数, 频率数)；返回结果字典列表（与输入一一对应）。
+
+    各字典含 M、mu、R0、L、residual_real、residual_imag（相对 |Z| 的残差数组）、
+    max_residual、mean_residual（实部、虚部残差绝对值的最大值、平均值）、chi_square（残差平方和）与 valid。
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    z = np.atleast_2d(np.asarray(z_real, dtype=np.float64)) + 1j * np.atleast_2d(np.asarray(z_imag, dtype=np.float64))
+    count, n = z.shape
+    extra = 2 if inductance else 1
+    if n < MIN_ELEMENTS + extra:
+        raise ValueError("频率点太少，无法进行 Kramers–Kronig 检验")
+    if max_elements is None:
+        max_elements = n
+    max_elements = max(MIN_ELEMENTS, min(max_elements, 2 * n - extra))
+
+    # 逐步增加 M，只对尚未满足 μ 判据的谱继续求解；到上限仍未满足的取最大的 M。
+    # M 很小时 τ 间隔过大，欠拟合同样会出现负电阻使 μ 偏低，因此从每个数量级两个 RC 单元开始
+    start = min(max(MIN_ELEMENTS, int(np.ceil(2 * np.log10(freq.max() / freq.min())))), max_elements)
+    chosen_m = np.full(count, max_elements)
+    chosen_mu = np.ones(count)
+    coefficients = [None] * count
+    fitted = np.empty_like(z)
+    pending = np.arange(count)
+    for m in range(start, max_elements + 1):
+        coef, fit = _fit_batch(freq, z[pending], m, inductance)
+        mu = _mu(coef[:, extra:])
+        done = (mu <= MU_CRITERION) | (m == max_elements)
+        for row in np.flatnonzero(done):
+            coefficients[pending[row]] = coef[row]
+        index = pending[done]
+        chosen_m[index], chosen_mu[index], fitted[index] = m, mu[done], fit[done]
+        pending = pending[~done]
+        if not len(pending):
+            break
+
+    modulus = np.abs(z)
+    residual_real = (z.real - fitted.real) / modulus
+    residual_imag = (z.imag - fitted.imag) / modulus
+    max_residual = np.maximum(np.abs(residual_real).max(axis=1), np.abs(residual_imag).max(axis=1))
+    mean_residual = (np.abs(residual_real).mean(axis=1) + np.abs(residual_imag).mean(axis=1)) / 2
+    chi_square = (residual_real ** 2 + residual_imag ** 2).sum(axis=1)
+
+    return [{
+        'M': int(chosen_m[i]),
+        'mu': float(chosen_mu[i]),
+        'R0': float(coefficients[i][0]),
+        'L': float(coefficients[i][1]) if inductance else 0.0,
+        'residual_real': residual_real[i],
+        'residual_imag': residual_imag[i],
+        'max_residual': float(max_residual[i]),
+        'mean_residual': float(mean_residual[i]),
+        'chi_square': float(chi_square[i]),
+        'valid': bool(max_residual[i] <= threshold and mean_residual[i] <= mean_threshold),
+    } for i in range(count)]
+
+
+def validate(spectra, threshold=MAX_RESIDUAL, mean_threshold=MEAN_RESIDUAL, **options):
+    """
+    批量检验，spectra 为 [(freq, Z', Z'')]；返回与输入一一对应的结果字典列表（见 validate_grid），另含 freq。
+
+    频率网格相同的谱归为一组，每组只构造一次基矩阵、做一次批量求解。
+    """
+    spectra = [tuple(np.asarray(a, dtype=np.float64) for a in spectrum) for spectrum in spectra]
+    groups = {}
+    for i, (freq, _, _) in enumerate(spectra):
+        groups.setdefault(freq.tobytes(), []).append(i)
+
+    results = [None] * len(spectra)
+    for index in groups.values():
+        freq = spectra[index[0]][0]
+        grid = validate_grid(freq, np.stack([spectra[i][1] for i in index]), np.stack([spectra[i][2] for i in index]),
+                             threshold=threshold, mean_threshold=mean_threshold, **options)
+        for i, result in zip(index, grid):
+            result['freq'] = freq
+            results[i] = result
+    return results
+
+
+def _eis_spectrum(experiment):
+    """实验的 EIS 谱 (freq, Z', Z'')，与作图、取 Rs 共用 manifest.read_frame 已读入的数据"""
+    data = manifest.read_frame(experiment, 'eis')
+    if data is None or len(data) < MIN_ELEMENTS + 2:
+        return None
+    freq = data['Freq'].to_numpy()
+    keep = freq > 0
+    return freq[keep], data["Z'"].to_numpy()[keep], data["Z''"].to_numpy()[keep]
+
+
+def validate_experiments(experiments, threshold=MAX_RESIDUAL, mean_threshold=MEAN_RESIDUAL):
+    """
+    检验各实验的 EIS 文件，结果保存在实验字典的 'kk' 中（没有 EIS 或读取失败时为 None），
+    之后取 Rs、作图的步骤直接读取，不再重复计算。返回 experiments。
+    """
+    experiments = list(experiments)
+    spectra = []
+    for experiment in experiments:
+        experiment['kk'] = None
+        try:
+            spectrum = _eis_spectrum(experiment)
+        except ValueError as e:
+            print(f"读取 {experiment['name']} 的 EIS 文件失败: {e}")
+            continue
+        if spectrum is not None:
+            spectra.append((experiment, spectrum))
+
+    for (experiment, _), result in zip(spectra, validate([s for _, s in spectra], threshold, mean_threshold)):
+        experiment['kk'] = result
+        if not result['valid']:
+            print(f"{experiment['name']} 的 EIS 未通过 Kramers–Kronig 检验"
+                  f"（最大残差 {result['max_residual']:.2%}，平均残差 {result['mean_residual']:.2%}）")
+    return experiments
+
+
+def _spectrum_files(experiment):
+    """一个实验中全部 EIS 谱（EIS 文件与文件名带电压的谱），返回 [(路径, 电压, (freq, Z', Z''))]"""
+    entries = []
+    if experiment['eis'] is not None:
+        try:
+            spectrum = _eis_spectrum(experiment)
+            if spectrum is not None:
+                entries.append((experiment['eis'], None, spectrum))
+        except ValueError as e:
+            print(f"读取 {experiment['eis']} 失败: {e}")
+    for voltage, path in experiment['drt'].items():
+        try:
+            entries.append((path, voltage, drt.read_spectrum(path)))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def validation_table(experiments, threshold=MAX_RESIDUAL, mean_threshold=MEAN_RESIDUAL):
+    """全部实验的全部 EIS 谱一起检验（同一频率网格的谱一次求解），返回每个文件一行的 DataFrame"""
+    entries = [(experiment['name'], *entry) for experiment in experiments for entry in _spectrum_files(experiment)]
+    results = validate([spectrum for *_, spectrum in entries], threshold, mean_threshold)
+    return pd.DataFrame([{
+        'Folder': name,
+        'File': os.path.basename(path),
+        'Voltage (V)': voltage,
+        'M': result['M'],
+        'mu': result['mu'],
+        'Max Residual': result['max_residual'],
+        'Mean Residual': result['mean_residual'],
+        'Chi Square': result['chi_square'],
+        'Valid': result['valid'],
+    } for (name, path, voltage, _), result in zip(entries, results)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量 Kramers–Kronig 检验 EIS 谱')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--threshold', type=float, default=MAX_RESIDUAL, help='残差绝对值最大值的通过阈值（相对 |Z|）')
+    parser.add_argument('--mean-threshold', type=float, default=MEAN_RESIDUAL, help='残差绝对值平均值的通过阈值（相对 |Z|）')
+    args = parser.parse_args()
+
+    table = validation_table(manifest.crawl(os.path.abspath(args.root)).values(), args.threshold, args.mean_threshold)
+    output_csv = os.path.join(args.root, OUTPUT_CSV)
+    table.to_csv(output_csv, index=False, encoding='utf-8-sig')
+    print(table.to_string(index=False))
+    print(f"检验结果已保存为 CSV 文件: {output_csv}")
@@ -0,0 +1,130 @@
+# Roc_Huang
+#
+# 程序功能：
+# 对数据根目录只做一次 os.scandir 遍历，按文件名把各实验文件分类，生成本次运行的实验清单（manifest）。
+# 1. CV-<扫速>、CV、LSV、EIS 以及文件名中带电压的 DRT 数据分别归类；同一实验同时有文本导出和 .bin 时优先文本。
+# 2. 清单为 {文件夹路径: 实验字典}，后续各处理步骤只读清单，不再各自 os.walk。
+# 3. read_frame 在实验字典中记住已读取的数据，同一文件在一次运行中只打开一次。
+
+import os
+import re
+
+from echem import chi_parser
+
+# 同一实验有多个文件时的优先顺序
+_EXTENSIONS = ('.txt', '.bin')
+
+_CV_RATE = re.compile(r'^cv-(\d+)$', re.IGNORECASE)
+_DRT_VOLTAGE = re.compile(r'(\d+\.\d+)')
+
+# read_frame 返回的 DataFrame 列名，与各脚本原先的 names 参数一致
+COLUMNS = {
+    'cv': ['Potential', 'Current'],
+    'lsv': ['Potential', 'Current'],
+    'eis': ['Freq', "Z'", "Z''", 'Z', 'Phase'],
+}
+
+
+def new_experiment(folder):
+    return {
+        'folder': folder,
+        'name': os.path.basename(folder),
+        'cv_rates': {},  # 扫速 (mV/s) -> 文件路径
+        'cv': None,
+        'lsv': None,
+        'eis': None,
+        'drt': {},  # 电压 (V) -> 文件路径
+        'rs': None,  # 高频截距估计的溶液电阻，见 echem.ohmic.estimate_experiments
+        'kk': None,  # EIS 的 Kramers–Kronig 检验结果，见 echem.linkk.validate_experiments
+        'cdl': None,  # 双电层电容与 ECSA，见 echem.cdl.estimate_experiments
+        'peaks': None,  # CV 氧化还原峰与 ΔEp / Randles–Ševčík 分析，见 echem.peaks.estimate_experiments
+        'frames': {},
+    }
+
+
+def _prefer(current, candidate):
+    """按扩展名优先级在两个候选文件中取其一"""
+    if current is None:
+        return candidate
+    rank = lambda path: _EXTENSIONS.index(os.path.splitext(path)[1].lower())
+    return candidate if rank(candidate) < rank(current) else current
+
+
+def _classify(experiment, entry):
+    stem, ext = os.path.splitext(entry.name)
+    ext = ext.lower()
+    if ext not in _EXTENSIONS:
+        return
+    lower = stem.lower()
+
+    match = _CV_RATE.match(stem)
+    if match:
+        rate = int(match.group(1))
+        experiment['cv_rates'][rate] = _prefer(experiment['cv_rates'].get(rate), entry.path)
+    elif lower in ('cv', 'lsv', 'eis'):
+        experiment[lower] = _prefer(experiment[lower], entry.path)
+    elif ext == '.txt':
+        match = _DRT_VOLTAGE.search(stem)
+        if match:
+            experiment['drt'][float(match.group(1))] = entry.path
+
+
+def crawl(root_folder):
+    """遍历 root_folder 一次，返回按路径排序的 {文件夹路径: 实验字典}，只包含至少有一个数据文件的文件夹"""
+    experiments = {}
+    stack = [root_folder]
+    while stack:
+        folder = stack.pop()
+        experiment = new_experiment(folder)
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or entry.name == '__pycache__':
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        _classify(experiment, entry)
+        except OSError as e:
+            print(f"无法读取文件夹 {folder}: {e}")
+            continue
+
+        experiment['cv_rates'] = dict(sorted(experiment['cv_rates'].items()))
+        experiment['drt'] = dict(sorted(experiment['drt'].items()))
+        if experiment['cv_rates'] or experiment['drt'] or any(experiment[k] for k in ('cv', 'lsv', 'eis')):
+            experiments[folder] = experiment
+    return dict(sorted(experiments.items()))
+
+
+def files_of(experiment):
+    """实验字典中的全部文件，返回 [(kind, 扫速或电压, path)]，kind 为 'cv_rate'、'cv'、'lsv'、'eis'、'drt'"""
+    files = [('cv_rate', rate, path) for rate, path in experiment['cv_rates'].items()]
+    files += [(kind, None, experiment[kind]) for kind in ('cv', 'lsv', 'eis') if experiment[kind]]
+    files += [('drt', voltage, path) for voltage, path in experiment['drt'].items()]
+    return files
+
+
+def under(experiments, folder):
+    """清单中位于 folder 及其子文件夹下的实验"""
+    folder = os.path.normpath(folder)
+    return [experiment for path, experiment in experiments.items()
+            if os.path.normpath(path) == folder or os.path.normpath(path).startswith(folder + os.sep)]
+
+
+def read_frame(experiment, technique):
+    """读取实验中某项技术（'eis'、'lsv'、'cv'）的数据为 DataFrame，列名见 COLUMNS；同一次运行中只读取一次，没有该文件时返回 None"""
+    frames = experiment['frames']
+    if technique not in frames:
+        path = experiment[technique]
+        frames[technique] = None if path is None else chi_parser.read_chi_frame(path, COLUMNS[technique])
+    return frames[technique]
+
+
+def read_cv_rates(experiment):
+    """按扫速从小到大读取全部 CV-<扫速> 文件，返回 [(扫速 (mV/s), DataFrame)]，跳过没有数据的文件"""
+    rates = []
+    for rate, path in sorted(experiment['cv_rates'].items()):
+        data = chi_parser.read_chi_frame(path, COLUMNS['cv'])
+        if not data.empty:
+            rates.append((rate, data))
+    return rates
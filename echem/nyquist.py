@@ -0,0 +1,76 @@
+# Roc_Huang
+#
+# 程序功能：
+# 多个样品 EIS 谱的 Nyquist 叠加图。
+# 1. iter_spectra 按实验清单逐个读取 EIS，每个文件只解析一次。
+# 2. overlay 边读边更新 Z' 最大值与 |Z''| 最大值，不再为求坐标范围单独读一遍文件。
+# 3. 所有曲线合并为一个 LineCollection、所有数据点合并为一次 scatter，最后统一设置坐标范围。
+# 4. 已做 Kramers–Kronig 检验且未通过的谱在图例中标注 (KK fail)。
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.lines import Line2D
+
+from echem import manifest
+
+
+def iter_spectra(experiments):
+    """依次产出 (样品名, Z', Z'')；读取失败或没有 EIS 的实验跳过"""
+    for experiment in experiments:
+        try:
+            data = manifest.read_frame(experiment, 'eis')
+        except ValueError as e:
+            print(f"读取 {experiment['name']} 的 EIS 文件失败: {e}")
+            continue
+        if data is not None and not data.empty:
+            label = experiment['name']
+            if experiment.get('kk') is not None and not experiment['kk']['valid']:
+                label += ' (KK fail)'
+            yield label, data["Z'"].to_numpy(), data["Z''"].to_numpy()
+
+
+def overlay(ax, spectra, colors=None, marker='o', linewidth=1.5, markersize=6):
+    """
+    把 spectra 中的谱线画到同一个坐标轴上，spectra 只遍历一次（可以是生成器）。
+
+    坐标范围与原脚本一致：Z' 取 [0, max_abs]，Z'' 取 [-max_abs, 0]，max_abs 为 Z' 最大值与 |Z''| 最大值中的较大者。
+    返回图例句柄列表，供 ax.legend(handles=...) 使用；没有任何数据时返回空列表且不修改坐标范围。
+    """
+    colors = colors or plt.cm.tab20.colors
+
+    segments = []
+    segment_colors = []
+    handles = []
+    max_z_prime = 0
+    max_z_double_prime = 0
+
+    for label, z_real, z_imag in spectra:
+        xy = np.column_stack((np.asarray(z_real, dtype=np.float64), np.asarray(z_imag, dtype=np.float64)))
+        if not len(xy):
+            continue
+        color = colors[len(segments) % len(colors)]
+
+        # 边读边更新坐标范围
+        max_z_prime = max(max_z_prime, xy[:, 0].max())
+        max_z_double_prime = max(max_z_double_prime, abs(xy[:, 1].min()))
+
+        segments.append(xy)
+        segment_colors.append(color)
+        handles.append(Line2D([], [], color=color, marker=marker, linewidth=linewidth,
+                              markersize=markersize, label=label))
+
+    if not segments:
+        return handles
+
+    ax.add_collection(LineCollection(segments, colors=segment_colors, linewidths=linewidth))
+    if marker:
+        points = np.concatenate(segments)
+        point_colors = np.repeat(to_rgba_array(segment_colors), [len(xy) for xy in segments], axis=0)
+        ax.scatter(points[:, 0], points[:, 1], c=point_colors, marker=marker, s=markersize ** 2, zorder=3)
+
+    max_abs = max(max_z_prime, max_z_double_prime)
+    ax.set_xlim(0, max_abs)  # Z' axis from 0 to max_abs
+    ax.set_ylim(-max_abs, 0)  # Z'' axis from -max_abs to 0
+    return handles
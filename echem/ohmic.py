@@ -0,0 +1,142 @@
+# Roc_Huang
+#
+# 程序功能：
+# 由 EIS 高频段估计溶液电阻 Rs，供 LSV 的 iR 校正使用，代替直接取第一个 Z'（约 100 kHz 处 Z'' 往往还不为 0）。
+# 1. 'intercept'：高频端 Z'' ≥ 0（电感段）到 Z'' < 0 的交点，在相邻两点间线性插值得到 Z'' = 0 处的 Z'。
+# 2. 'arc'：取高频端前 ARC_POINTS 个电容性点（Z'' < 0）做代数圆拟合，取圆与实轴左侧的交点。
+#    'intercept' 找不到交点（谱一开始就是电容性的）时改用 'arc'，圆拟合失败时退回 'first'（最高频的 Z'，原做法）。
+# 3. 所有谱按频率从高到低排列后补齐成矩阵（不足处为 NaN），每种方法对全部谱只做一次数组运算。
+# 4. compensation 为 iR 补偿比例，校正时使用 compensation × Rs（1.0 为完全补偿）。
+
+import numpy as np
+
+from echem import manifest
+
+METHODS = ('intercept', 'arc', 'first')
+COMPENSATION = 1.0
+# 高频弧圆拟合使用的电容性数据点个数
+ARC_POINTS = 6
+
+
+def _pad(spectra):
+    """把 [(freq, Z', Z'')] 按频率从高到低排列并补齐为 (谱数, 最长点数) 的矩阵，返回 (Z', Z'')"""
+    length = max((len(freq) for freq, _, _ in spectra), default=0)
+    z_real = np.full((len(spectra), length), np.nan)
+    z_imag = np.full((len(spectra), length), np.nan)
+    for row, (freq, real, imag) in enumerate(spectra):
+        order = np.argsort(-np.asarray(freq, dtype=np.float64), kind='stable')
+        z_real[row, :len(order)] = np.asarray(real, dtype=np.float64)[order]
+        z_imag[row, :len(order)] = np.asarray(imag, dtype=np.float64)[order]
+    return z_real, z_imag
+
+
+def first_point(z_real):
+    """每行第一个（最高频）Z'"""
+    return z_real[:, 0] if z_real.shape[1] else np.full(len(z_real), np.nan)
+
+
+def intercept(z_real, z_imag):
+    """
+    高频电感段结束处 Z'' = 0 的插值 Z'，每行一个值。
+
+    只接受从第一个点开始的 Z'' ≥ 0 段与其后第一个 Z'' < 0 点之间的交点，
+    避免把低频段的噪声或电感回路当作高频截距；没有这样的交点时为 NaN。
+    """
+    rows = np.arange(len(z_real))
+    negative = z_imag < 0
+    k = negative.argmax(axis=1)
+    found = negative.any(axis=1) & (k > 0)
+    k = np.where(found, k, 1)
+    x0, x1 = z_real[rows, k - 1], z_real[rows, k]
+    y0, y1 = z_imag[rows, k - 1], z_imag[rows, k]
+    return np.where(found, x0 + (x1 - x0) * y0 / (y0 - y1), np.nan)
+
+
+def arc(z_real, z_imag, points=ARC_POINTS):
+    """
+    高频端前 points 个电容性点的代数圆拟合（x² + y² + D x + E y + F = 0），返回圆与实轴较小的交点。
+
+    所有谱的 3×3 正规方程一次性求解；点数不足三个或圆与实轴不相交时为 NaN。
+    """
+    capacitive = z_imag < 0
+    use = capacitive & (np.cumsum(capacitive, axis=1) <= points)
+    x = np.where(use, z_real, 0.0)
+    y = np.where(use, z_imag, 0.0)
+    design = np.stack((x, y, use.astype(np.float64)), axis=2)
+    normal = np.einsum('bni,bnj->bij', design, design)
+    rhs = -np.einsum('bni,bn->bi', design, x ** 2 + y ** 2)
+
+    enough = use.sum(axis=1) >= 3
+    normal[~enough] = np.eye(3)
+    singular = np.abs(np.linalg.det(normal)) < 1e-300
+    normal[singular] = np.eye(3)
+    d, _, f = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0].T
+
+    discriminant = d ** 2 - 4 * f
+    with np.errstate(invalid='ignore'):
+        root = (-d - np.sqrt(discriminant)) / 2
+    return np.where(enough & ~singular & (discriminant >= 0), root, np.nan)
+
+
+def estimate(spectra, method='intercept', compensation=1.0):
+    """
+    批量估计 Rs，spectra 为 [(freq, Z', Z'')]；返回与输入对应的数组（乘以 compensation）。
+
+    所选方法得不到结果的谱依次退回 'arc'、'first'。
+    """
+    if method not in METHODS:
+        raise ValueError(f"未知的 Rs 估计方法: {method}")
+    z_real, z_imag = _pad(list(spectra))
+    rs = np.full(len(z_real), np.nan)
+    if method == 'intercept':
+        rs = intercept(z_real, z_imag)
+    if method in ('intercept', 'arc'):
+        missing = np.isnan(rs)
+        if missing.any():
+            rs[missing] = arc(z_real[missing], z_imag[missing])
+    missing = np.isnan(rs)
+    rs[missing] = first_point(z_real[missing])
+    return rs * compensation
+
+
+def _eis_spectrum(experiment):
+    data = manifest.read_frame(experiment, 'eis')
+    if data is None or data.empty:
+        return None
+    return data['Freq'].to_numpy(), data["Z'"].to_numpy(), data["Z''"].to_numpy()
+
+
+def estimate_experiments(experiments, method='intercept'):
+    """
+    一次性估计各实验的 Rs（未乘补偿比例），保存在实验字典的 'rs' 中（没有 EIS 或读取失败时为 None）。
+    返回 experiments。
+    """
+    experiments = list(experiments)
+    spectra = []
+    for experiment in experiments:
+        experiment['rs'] = None
+        try:
+            spectrum = _eis_spectrum(experiment)
+        except ValueError as e:
+            print(f"读取 {experiment['name']} 的 EIS 文件失败: {e}")
+            continue
+        if spectrum is not None:
+            spectra.append((experiment, spectrum))
+
+    for (experiment, _), rs in zip(spectra, estimate([s for _, s in spectra], method)):
+        experiment['rs'] = float(rs)
+    return experiments
+
+
+def resistance(experiment, compensation=COMPENSATION, method='intercept'):
+    """用于 iR 校正的电阻 compensation × Rs；estimate_experiments 已计算过时直接使用，没有 EIS 时返回 None"""
+    if experiment.get('rs') is None:
+        estimate_experiments([experiment], method)
+    if experiment['rs'] is None:
+        return None
+    return experiment['rs'] * compensation
+
+
+def spectrum_resistance(freq, z_real, z_imag, method='intercept'):
+    """单条谱的 Rs"""
+    return float(estimate([(freq, z_real, z_imag)], method)[0])
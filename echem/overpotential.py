@@ -0,0 +1,104 @@
+# Roc_Huang
+#
+# 程序功能：
+# 批量计算任意电流密度下的过电位，代替逐个样品 x[current_density >= 10].iloc[0] 取第一个越过阈值的点。
+# 1. stack 把各样品 iR 校正后的 LSV 曲线补齐成 (样品数, 最长点数) 的矩阵，不足处为 NaN。
+# 2. 电流密度取沿扫描方向的累积最大值，噪声造成的回落不会让曲线"再次"越过阈值，首次达到目标的位置唯一。
+# 3. 各行累积最大值加上逐行递增的偏移后首尾相接成一个单调数组，所有样品、所有目标电流密度只做一次 np.searchsorted，
+#    再在越过目标的前后两点间对电位线性插值。
+# 4. table 输出每个样品一行、每个目标电流密度一列的宽表，替代原 overpotential_data.csv。
+
+import numpy as np
+
+AREA_CM2 = 0.196  # 电极面积
+REFERENCE_OFFSET = 0.652  # 参比电极换算到 RHE 的偏移
+EQUILIBRIUM_POTENTIAL = 1.23  # OER 平衡电位
+
+# 默认的目标电流密度 (mA/cm²)
+TARGETS = (10, 50, 100, 200, 500)
+
+
+def column_name(target):
+    """宽表中目标电流密度对应的列名，与原 overpotential_data.csv 一致"""
+    return f"Overpotential at {target:g} mA/cm² (V)"
+
+
+def stack(curves):
+    """把 [(电位, 电流密度)] 补齐为两个 (样品数, 最长点数) 的矩阵，不足处为 NaN"""
+    curves = list(curves)
+    length = max((len(potential) for potential, _ in curves), default=0)
+    potential = np.full((len(curves), length), np.nan)
+    current_density = np.full((len(curves), length), np.nan)
+    for row, (x, j) in enumerate(curves):
+        potential[row, :len(x)] = np.asarray(x, dtype=np.float64)
+        current_density[row, :len(j)] = np.asarray(j, dtype=np.float64)
+    return potential, current_density
+
+
+def crossing_potentials(potential, current_density, targets=TARGETS):
+    """
+    每个样品首次达到各目标电流密度时的电位（线性插值），返回形状 (样品数, 目标数)，达不到时为 NaN。
+
+    potential / current_density 为 stack 的输出；第一个点已超过目标时取第一个点的电位。
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    count, length = current_density.shape
+    result = np.full((count, len(targets)), np.nan)
+    if not count or not length:
+        return result
+
+    valid = np.isfinite(potential) & np.isfinite(current_density)
+    envelope = np.maximum.accumulate(np.where(valid, current_density, -np.inf), axis=1)
+    finite = envelope[np.isfinite(envelope)]
+    if not finite.size:
+        return result
+
+    # 各行平移到互不重叠的区间后拼成一个单调数组，一次 searchsorted 找出所有 (样品, 目标) 的位置
+    low, high = finite.min(), max(finite.max(), targets.max())
+    span = high - low + 1
+    offsets = np.arange(count)[:, None] * span
+    flat = (np.clip(envelope, low, None) - low + offsets).ravel()
+    position = np.searchsorted(flat, (np.clip(targets, low, None) - low)[None, :] + offsets, side='left')
+
+    rows = np.arange(count)[:, None]
+    index = position - rows * length
+    reached = index < length
+    index = np.clip(index, 0, length - 1)
+    reached &= envelope[rows, index] >= targets[None, :]
+
+    # 点 k 处电流密度首次达到目标，k − 1 处不超过此前的最大值，必然低于目标，两点间线性插值
+    previous = np.maximum(index - 1, 0)
+    j0, j1 = current_density[rows, previous], current_density[rows, index]
+    x0, x1 = potential[rows, previous], potential[rows, index]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = (targets[None, :] - j0) / (j1 - j0)
+        crossing = np.where((index > 0) & np.isfinite(fraction), x0 + (x1 - x0) * fraction, x1)
+    result[reached] = crossing[reached]
+    return result
+
+
+def overpotentials(curves, targets=TARGETS):
+    """[(iR 校正后的电位 (V), 电流密度 (mA/cm²))] 在各目标电流密度下的过电位 (V)，形状 (样品数, 目标数)"""
+    potential, current_density = stack(curves)
+    return crossing_potentials(potential, current_density, targets) + REFERENCE_OFFSET - EQUILIBRIUM_POTENTIAL
+
+
+def corrected_curve(potential, current, resistance):
+    """iR 校正后的电位与电流密度 (mA/cm²)"""
+    current = np.asarray(current, dtype=np.float64)
+    return np.asarray(potential, dtype=np.float64) - current * resistance, current * 1000 / AREA_CM2
+
+
+def table(names, curves, targets=TARGETS, columns=None):
+    """
+    宽表（行字典列表）：每个样品一行，列为 Folder、columns（{列名: 各样品的值}，如 Resistance (Ω)）中的附加列
+    以及各目标电流密度下的过电位，达不到的目标为 None。
+    """
+    etas = overpotentials(curves, targets)
+    rows = []
+    for i, name in enumerate(names):
+        row = {"Folder": name}
+        row.update({key: values[i] for key, values in (columns or {}).items()})
+        row.update({column_name(target): (None if np.isnan(eta) else float(eta)) for target, eta in zip(targets, etas[i])})
+        rows.append(row)
+    return rows
@@ -0,0 +1,236 @@
+# Roc_Huang
+#
+# 程序功能：
+# CV 扫速系列的氧化还原峰识别、ΔEp 与 Randles–Ševčík 分析，代替只取每个文件电流的 max() / min()（会把换向点处的电流当作峰）。
+# 1. 所有样品、所有扫速最后一个周期的正扫 / 负扫半周期（见 echem.dunn.branches）补齐成 (曲线数, 2, 最长点数) 的矩阵，
+#    负扫取 −j，峰统一为极大值。
+# 2. 峰候选为前后两点都存在的局部极大值；突出度 = 峰高 − max(左侧最低点, 右侧最低点)，左右最低点由前缀 / 后缀累积最小值一次得到。
+#    候选点与最低点都只在距两端（换向点）超过电位窗口 EDGE_FRACTION 的范围内取，换向处电流的回落不会形成峰。
+#    每个半周期取突出度最大的候选，小于该半周期电流跨度 MIN_PROMINENCE 倍时视为无峰（NaN），纯电容性的 CV 没有峰。
+# 3. 每个样品 ΔEp = Epa − Epc；ip 对 v^½ 与 ip 对 v 的线性回归、log|ip| 对 log v 的斜率
+#    用 echem.cdl.fit 对所有样品一次求解。
+# 4. Randles–Ševčík：ip = 2.69×10⁵ n^(3/2) A C D^½ v^½（25 °C），由 ip/A – v^½ 的斜率得到扩散系数 D (cm²/s)。
+#
+# 用法：python -m echem.peaks <数据根目录>
+# 每个样品、每个扫速一行的结果（含样品级的拟合结果）保存为根目录下的 cv_peaks.csv。
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from echem import cdl, dunn, manifest, overpotential
+
+AREA_CM2 = overpotential.AREA_CM2  # 电极面积
+ELECTRONS = 1  # 转移电子数 n
+CONCENTRATION = 5e-6  # 氧化还原物种浓度 (mol/cm³)，5 mM
+RANDLES_SEVCIK = 2.69e5  # 25 °C 时的 Randles–Ševčík 常数
+MIN_PROMINENCE = 0.05  # 突出度相对半周期电流跨度的下限
+EDGE_FRACTION = 0.05  # 换向点附近不识别峰的电位范围（占电位窗口的比例）
+
+# ΔEp (V) 不超过 REVERSIBLE_DELTA_EP / n 为可逆，不超过 QUASI_REVERSIBLE_DELTA_EP 为准可逆，否则为不可逆
+REVERSIBLE_DELTA_EP = 0.07
+QUASI_REVERSIBLE_DELTA_EP = 0.2
+
+PEAK_KEYS = ('potential', 'current', 'prominence')
+
+OUTPUT_CSV = 'cv_peaks.csv'
+
+
+def stack_branches(curves):
+    """[(电位, 电流密度)] 的正扫 / 负扫半周期补齐为 (曲线数, 2, 最长点数) 的电位与电流矩阵，缺少的半周期为 NaN"""
+    halves = [dunn.branches(x, j) for x, j in curves]
+    length = max((len(half[0]) for pair in halves for half in pair if half is not None), default=0)
+    potential = np.full((len(halves), 2, length), np.nan)
+    current = np.full((len(halves), 2, length), np.nan)
+    for row, pair in enumerate(halves):
+        for side, half in enumerate(pair):
+            if half is not None:
+                potential[row, side, :len(half[0])] = half[0]
+                current[row, side, :len(half[1])] = half[1]
+    return potential, current
+
+
+def find_peaks(curves, min_prominence=MIN_PROMINENCE):
+    """
+    所有曲线最后一个周期的阳极峰（正扫）与阴极峰（负扫），返回 {'potential', 'current', 'prominence'}，
+    各项形状 (曲线数, 2)，第二维依次为阳极、阴极；current 保留原符号，没有峰时为 NaN。
+    """
+    potential, current = stack_branches(curves)
+    result = {key: np.full(potential.shape[:2], np.nan) for key in PEAK_KEYS}
+    if potential.shape[-1] < 3:
+        return result
+
+    # 负扫取 −j，两个方向的峰都是极大值
+    values = current * np.array([1.0, -1.0])[None, :, None]
+    valid = np.isfinite(values) & np.isfinite(potential)
+
+    # 换向点附近电流的回落不是峰：候选点与两侧最低点都只在距两端超过 EDGE_FRACTION 的范围内取
+    low = np.where(valid, potential, np.inf).min(axis=-1, keepdims=True)
+    high = np.where(valid, potential, -np.inf).max(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore'):
+        margin = EDGE_FRACTION * (high - low)
+        interior = valid & (potential - low > margin) & (high - potential > margin)
+    candidate = (interior[..., 1:-1] & valid[..., :-2] & valid[..., 2:]
+                 & (values[..., 1:-1] > values[..., :-2]) & (values[..., 1:-1] >= values[..., 2:]))
+
+    lowest = np.where(interior, values, np.inf)
+    left = np.minimum.accumulate(lowest, axis=-1)[..., 1:-1]
+    right = np.minimum.accumulate(lowest[..., ::-1], axis=-1)[..., ::-1][..., 1:-1]
+    with np.errstate(invalid='ignore'):
+        prominence = np.where(candidate, values[..., 1:-1] - np.maximum(left, right), -np.inf)
+        span = np.where(valid, values, -np.inf).max(axis=-1) - np.where(valid, values, np.inf).min(axis=-1)
+
+    best = prominence.argmax(axis=-1)
+    top = np.take_along_axis(prominence, best[..., None], axis=-1)[..., 0]
+    found = np.isfinite(top) & (top >= min_prominence * span)
+    index = best[..., None] + 1
+    result['potential'] = np.where(found, np.take_along_axis(potential, index, axis=-1)[..., 0], np.nan)
+    result['current'] = np.where(found, np.take_along_axis(current, index, axis=-1)[..., 0], np.nan)
+    result['prominence'] = np.where(found, top, np.nan)
+    return result
+
+
+def reversibility(delta_ep, electrons=ELECTRONS):
+    """由 ΔEp (V) 判断可逆性"""
+    if delta_ep is None or not np.isfinite(delta_ep):
+        return None
+    if delta_ep <= REVERSIBLE_DELTA_EP / electrons:
+        return 'reversible'
+    if delta_ep <= QUASI_REVERSIBLE_DELTA_EP:
+        return 'quasi-reversible'
+    return 'irreversible'
+
+
+def diffusion_coefficient(slope, electrons=ELECTRONS, concentration=CONCENTRATION):
+    """由 j (mA/cm²) 对 v^½ ((V/s)^½) 的斜率计算 D (cm²/s)"""
+    return (np.abs(slope) / 1000 / (RANDLES_SEVCIK * electrons ** 1.5 * concentration)) ** 2
+
+
+def analyze(samples, min_prominence=MIN_PROMINENCE, electrons=ELECTRONS, concentration=CONCENTRATION):
+    """
+    samples 为 [(扫速列表 (mV/s), [(电位 (V), 电流密度 (mA/cm²))])]，所有样品、所有扫速一次识别峰并回归。
+
+    返回 (peaks, fits)：peaks 为 find_peaks 的结果另加 delta_ep，按样品补齐为 (样品数, 最多扫速数[, 2])；
+    fits 中每项形状为 (样品数, 2)（阳极、阴极）：sqrt_slope / sqrt_r2（ip 对 v^½）、linear_slope / linear_r2（ip 对 v）、
+    log_slope（log|ip| 对 log v，0.5 为扩散控制、1 为表面控制）与 diffusion (cm²/s)；另有 delta_ep（各扫速平均，V）
+    与 ratio（各扫速平均 |ipa / ipc|），形状 (样品数,)。
+    """
+    samples = [(rates, curves) for rates, curves in samples if len(rates)]
+    if not samples:
+        raise ValueError("没有可分析的 CV 数据")
+    counts = [len(rates) for rates, _ in samples]
+    width = max(counts)
+    flat = find_peaks([curve for _, curves in samples for curve in curves], min_prominence)
+
+    # 展开的曲线放回 (样品数, 最多扫速数) 的位置
+    rows = np.repeat(np.arange(len(samples)), counts)
+    columns = np.concatenate([np.arange(count) for count in counts])
+    rates = np.full((len(samples), width), np.nan)
+    rates[rows, columns] = np.concatenate([np.asarray(r, dtype=np.float64) for r, _ in samples])
+    peaks = {}
+    for key, values in flat.items():
+        peaks[key] = np.full((len(samples), width, 2), np.nan)
+        peaks[key][rows, columns] = values
+    peaks['delta_ep'] = peaks['potential'][..., 0] - peaks['potential'][..., 1]
+
+    # 两个方向展开为 (样品数 × 2, 最多扫速数) 后一次回归
+    v = np.repeat(rates / 1000, 2, axis=0)
+    ip = np.abs(peaks['current']).transpose(0, 2, 1).reshape(-1, width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sqrt_slope, _, sqrt_r2 = cdl.fit(np.sqrt(v), ip)
+        linear_slope, _, linear_r2 = cdl.fit(v, ip)
+        log_slope, _, _ = cdl.fit(np.log10(v), np.log10(ip))
+        ratio = np.abs(peaks['current'][..., 0] / peaks['current'][..., 1])
+    shape = (len(samples), 2)
+    fits = {
+        'sqrt_slope': sqrt_slope.reshape(shape),
+        'sqrt_r2': sqrt_r2.reshape(shape),
+        'linear_slope': linear_slope.reshape(shape),
+        'linear_r2': linear_r2.reshape(shape),
+        'log_slope': log_slope.reshape(shape),
+        'diffusion': diffusion_coefficient(sqrt_slope, electrons, concentration).reshape(shape),
+        'delta_ep': _nanmean(peaks['delta_ep']),
+        'ratio': _nanmean(ratio),
+    }
+    return peaks, fits
+
+
+def _nanmean(values):
+    """按行求平均，忽略 NaN；整行为 NaN 时结果为 NaN（不发出警告）"""
+    count = np.isfinite(values).sum(axis=1)
+    total = np.where(np.isfinite(values), values, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _value(x):
+    return None if x is None or not np.isfinite(x) else float(x)
+
+
+def estimate_experiments(experiments, min_prominence=MIN_PROMINENCE):
+    """
+    一次性分析各实验的 CV-<扫速> 文件，结果保存在实验字典的 'peaks' 中：
+    {'rates': {扫速: {'Epa', 'ipa', ..., 'ΔEp'}}, 'summary': {...}}；没有 CV-<扫速> 文件时为 None。返回 experiments。
+    """
+    experiments = list(experiments)
+    samples, owners = [], []
+    for experiment in experiments:
+        experiment['peaks'] = None
+        frames = manifest.read_cv_rates(experiment)
+        if frames:
+            samples.append(([rate for rate, _ in frames],
+                            [(data['Potential'].to_numpy(), data['Current'].to_numpy() * 1000 / AREA_CM2)
+                             for _, data in frames]))
+            owners.append(experiment)
+    if not samples:
+        return experiments
+
+    peaks, fits = analyze(samples, min_prominence)
+    for i, (experiment, (rates, _)) in enumerate(zip(owners, samples)):
+        per_rate = {}
+        for k, rate in enumerate(rates):
+            per_rate[rate] = {
+                'Epa (V)': _value(peaks['potential'][i, k, 0]),
+                'ipa (mA/cm²)': _value(peaks['current'][i, k, 0]),
+                'Anodic Prominence (mA/cm²)': _value(peaks['prominence'][i, k, 0]),
+                'Epc (V)': _value(peaks['potential'][i, k, 1]),
+                'ipc (mA/cm²)': _value(peaks['current'][i, k, 1]),
+                'Cathodic Prominence (mA/cm²)': _value(peaks['prominence'][i, k, 1]),
+                'ΔEp (V)': _value(peaks['delta_ep'][i, k]),
+            }
+        delta_ep = _value(fits['delta_ep'][i])
+        summary = {'Mean ΔEp (V)': delta_ep, '|ipa/ipc|': _value(fits['ratio'][i]),
+                   'Reversibility': reversibility(delta_ep)}
+        for side, label in enumerate(('Anodic', 'Cathodic')):
+            summary.update({
+                f'{label} ip–v^½ R²': _value(fits['sqrt_r2'][i, side]),
+                f'{label} ip–v R²': _value(fits['linear_r2'][i, side]),
+                f'{label} log ip–log v Slope': _value(fits['log_slope'][i, side]),
+                f'{label} D (cm²/s)': _value(fits['diffusion'][i, side]),
+            })
+        experiment['peaks'] = {'rates': per_rate, 'summary': summary}
+    return experiments
+
+
+def rows(experiment):
+    """一个样品每个扫速一行（行字典列表），样品级的拟合结果附在每一行"""
+    if not experiment.get('peaks'):
+        return []
+    return [{'Folder': experiment['name'], 'Scan Rate (mV/s)': rate, **values, **experiment['peaks']['summary']}
+            for rate, values in experiment['peaks']['rates'].items()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量识别 CV 氧化还原峰并做 ΔEp / Randles–Ševčík 分析')
+    parser.add_argument('root', help='数据根目录')
+    parser.add_argument('--min-prominence', type=float, default=MIN_PROMINENCE, help='突出度相对电流跨度的下限')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    experiments = estimate_experiments(manifest.crawl(root).values(), args.min_prominence)
+    table = [row for experiment in experiments for row in rows(experiment)]
+    output = os.path.join(root, OUTPUT_CSV)
+    pd.DataFrame(table).to_csv(output, index=False, encoding='utf-8-sig')
+    print(f"已分析 {sum(1 for e in experiments if e['peaks'])} 个样品的 CV 峰，结果保存到：{output}")
@@ -0,0 +1,107 @@
+# Roc_Huang
+#
+# 程序功能：
+# 取极值之前的批量平滑，避免噪声尖峰被当作峰、极值文件里堆满伪极值。
+# 1. 三种方法：'savgol'（Savitzky–Golay，WINDOW 点 POLYORDER 次多项式）、'median'（WINDOW 点中值滤波）、
+#    'whittaker'（Whittaker 平滑，min ‖y − z‖² + LAMBDA ‖D z‖²，D 为 DIFFERENCE_ORDER 阶差分）；'none' 为不平滑。
+#    中值滤波去除孤立尖峰最有效，但峰顶会留下平台，严格比较的 argrelextrema 可能找不到极值。
+# 2. smooth 把长度相同的曲线排成 (曲线数, 点数) 的矩阵，沿最后一维一次滤波；
+#    Whittaker 的稀疏带状矩阵 I + λDᵀD 只与点数有关，每种长度只做一次 LU 分解，全部曲线作为多列右端项一起求解。
+# 3. parameters / describe 给出本次使用的参数，随极值结果一起写出，便于复现。
+
+import numpy as np
+from scipy import sparse
+from scipy.ndimage import median_filter
+from scipy.signal import savgol_filter
+from scipy.sparse.linalg import splu
+
+METHODS = ('savgol', 'median', 'whittaker', 'none')
+METHOD = 'savgol'
+WINDOW = 7  # 滤波窗口点数（奇数），超过曲线长度时自动缩小
+POLYORDER = 2  # Savitzky–Golay 多项式次数
+LAMBDA = 10.0  # Whittaker 平滑强度
+DIFFERENCE_ORDER = 2  # Whittaker 惩罚项的差分阶数
+
+
+def parameters(method=METHOD, window=WINDOW, polyorder=POLYORDER, lam=LAMBDA):
+    """本次平滑实际使用的参数（字典），只包含所选方法用到的项"""
+    if method not in METHODS:
+        raise ValueError(f"未知的平滑方法 {method!r}，可选 {', '.join(METHODS)}")
+    if method == 'savgol':
+        return {'method': method, 'window': int(window), 'polyorder': int(polyorder)}
+    if method == 'median':
+        return {'method': method, 'window': int(window)}
+    if method == 'whittaker':
+        return {'method': method, 'lambda': float(lam), 'order': DIFFERENCE_ORDER}
+    return {'method': method}
+
+
+def describe(params=None):
+    """参数的单行文字说明，如 savgol(window=7, polyorder=2)"""
+    params = dict(params or parameters())
+    method = params.pop('method')
+    return f"{method}({', '.join(f'{key}={value:g}' for key, value in params.items())})"
+
+
+def _window(window, length):
+    """不超过曲线长度的奇数窗口"""
+    window = min(int(window), length)
+    return window if window % 2 else window - 1
+
+
+def savgol(values, window=WINDOW, polyorder=POLYORDER):
+    """(曲线数, 点数) 的矩阵逐行 Savitzky–Golay 平滑，端点用多项式外推（mode='interp'）"""
+    window = _window(window, values.shape[-1])
+    if window <= polyorder:
+        return values.copy()
+    return savgol_filter(values, window, polyorder, axis=-1, mode='interp')
+
+
+def median(values, window=WINDOW):
+    """(曲线数, 点数) 的矩阵逐行中值滤波，端点按最近值延拓"""
+    window = _window(window, values.shape[-1])
+    if window < 3:
+        return values.copy()
+    return median_filter(values, size=(1, window), mode='nearest')
+
+
+def whittaker(values, lam=LAMBDA, order=DIFFERENCE_ORDER):
+    """(曲线数, 点数) 的矩阵逐行 Whittaker 平滑：(I + λDᵀD) z = y，一次分解、所有行一起求解"""
+    n = values.shape[-1]
+    if n <= order:
+        return values.copy()
+    difference = sparse.eye(n, format='csr')
+    for _ in range(order):
+        difference = difference[1:] - difference[:-1]
+    system = (sparse.eye(n, format='csc') + lam * (difference.T @ difference)).tocsc()
+    return splu(system).solve(np.ascontiguousarray(values.T)).T
+
+
+def smooth(curves, method=METHOD, window=WINDOW, polyorder=POLYORDER, lam=LAMBDA):
+    """
+    批量平滑。curves 为二维数组（每行一条曲线）时返回同形状的数组；
+    为一维数组的列表时按长度分组、每组一次滤波，返回与 curves 对应的列表。
+    """
+    parameters(method, window, polyorder, lam)
+    if isinstance(curves, np.ndarray) and curves.ndim == 2:
+        return _apply(np.asarray(curves, dtype=np.float64), method, window, polyorder, lam)
+
+    curves = [np.asarray(curve, dtype=np.float64) for curve in curves]
+    result = [None] * len(curves)
+    lengths = np.array([len(curve) for curve in curves], dtype=np.intp)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        values = np.vstack([curves[row] for row in rows]) if length else np.empty((len(rows), 0))
+        for row, curve in zip(rows, _apply(values, method, window, polyorder, lam)):
+            result[row] = curve
+    return result
+
+
+def _apply(values, method, window, polyorder, lam):
+    if method == 'none' or values.shape[-1] < 3:
+        return values.copy()
+    if method == 'savgol':
+        return savgol(values, window, polyorder)
+    if method == 'median':
+        return median(values, window)
+    return whittaker(values, lam)
@@ -0,0 +1,160 @@
+# Roc_Huang
+#
+# 程序功能：
+# 批量 Tafel 分析：iR 校正后的 LSV 转为 η – log j，自动寻找最线性的区间，给出 Tafel 斜率与交换电流密度。
+# 1. 所有样品在同一 log j 网格（每个数量级 POINTS_PER_DECADE 个点）上取 η，
+#    借用 echem.overpotential 的一次 searchsorted 插值，噪声回落不会产生多个交点。
+# 2. 对每种窗口宽度，用 log j、η 及其平方、乘积的累积和一次算出所有样品、所有起点的线性回归
+#    （斜率、截距、R²），每种宽度只需 O(n)。
+# 3. 选区规则：R² ≥ MIN_R2 且斜率为正的窗口中取跨度最大者，宽度相同时取 R² 最大者；
+#    没有窗口达到 MIN_R2 时取最窄宽度中 R² 最大的窗口。
+# 4. 交换电流密度 j0 为拟合直线外推到 η = 0 处的电流密度。
+
+import numpy as np
+
+from echem import overpotential
+
+POINTS_PER_DECADE = 20
+MIN_DECADES = 0.5  # 拟合窗口的最小跨度（数量级）
+MAX_DECADES = 3.0  # 拟合窗口的最大跨度（数量级）
+MIN_R2 = 0.998
+
+RESULT_KEYS = ('slope', 'intercept', 'r2', 'exchange_current', 'j_start', 'j_end', 'eta_start', 'eta_end')
+
+OUTPUT_CSV = 'tafel_data.csv'
+OUTPUT_PNG = 'tafel_plot.png'
+
+
+def log_grid(curves, points_per_decade=POINTS_PER_DECADE):
+    """覆盖所有样品正电流密度范围的 log10 j 网格"""
+    positive = np.concatenate([np.asarray(j, dtype=np.float64)[np.asarray(j, dtype=np.float64) > 0] for _, j in curves]
+                              or [np.empty(0)])
+    positive = positive[np.isfinite(positive)]
+    if not positive.size:
+        return np.empty(0)
+    low = np.floor(np.log10(positive.min()) * points_per_decade) / points_per_decade
+    high = np.ceil(np.log10(positive.max()) * points_per_decade) / points_per_decade
+    return np.arange(round((high - low) * points_per_decade) + 1) / points_per_decade + low
+
+
+def tafel_lines(curves, points_per_decade=POINTS_PER_DECADE):
+    """所有样品的 η – log j 曲线，返回 (log j 网格, η 矩阵 (样品数, 网格点数))；达不到的电流密度为 NaN"""
+    curves = list(curves)
+    grid = log_grid(curves, points_per_decade)
+    return grid, overpotential.overpotentials(curves, 10 ** grid)
+
+
+def _window_sums(values, width):
+    """沿最后一维所有长度为 width 的窗口之和（累积和相减），形状 (样品数, 网格点数 − width + 1)"""
+    cumulative = np.concatenate((np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1)), axis=-1)
+    return cumulative[..., width:] - cumulative[..., :-width]
+
+
+def fit(curves, points_per_decade=POINTS_PER_DECADE, min_decades=MIN_DECADES, max_decades=MAX_DECADES,
+        min_r2=MIN_R2):
+    """
+    所有样品的 Tafel 拟合，返回各项为 NumPy 数组（每个样品一个值）的字典：
+    slope (mV/dec)、intercept（log j = 0 处的 η，V）、r2、exchange_current (mA/cm²)、
+    j_start / j_end (mA/cm²) 与 eta_start / eta_end (V)。没有可拟合区间的样品为 NaN。
+    """
+    grid, eta = tafel_lines(curves, points_per_decade)
+    count = len(eta)
+    best = {key: np.full(count, np.nan) for key in ('slope', 'intercept', 'r2', 'start', 'stop')}
+    best_width = np.zeros(count, dtype=np.intp)
+    fallback = {key: np.full(count, np.nan) for key in best}
+    if not count or len(grid) < 3:
+        return {key: np.full(count, np.nan) for key in RESULT_KEYS}
+
+    valid = np.isfinite(eta)
+    x = np.where(valid, grid[None, :], 0.0)
+    y = np.where(valid, eta, 0.0)
+    min_width = max(3, int(round(min_decades * points_per_decade)) + 1)
+    max_width = min(len(grid), int(round(max_decades * points_per_decade)) + 1)
+
+    for width in range(min_width, max_width + 1):
+        n = _window_sums(valid.astype(np.float64), width)
+        sx, sy = _window_sums(x, width), _window_sums(y, width)
+        sxx, syy, sxy = _window_sums(x * x, width), _window_sums(y * y, width), _window_sums(x * y, width)
+        complete = n == width
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cxx = sxx - sx * sx / width
+            cyy = syy - sy * sy / width
+            cxy = sxy - sx * sy / width
+            slope = cxy / cxx
+            r2 = np.where(complete & (slope > 0), cxy * cxy / (cxx * cyy), -np.inf)
+        r2 = np.where(np.isfinite(r2), r2, -np.inf)
+        position = r2.argmax(axis=1)
+        rows = np.arange(count)
+        top = r2[rows, position]
+        intercept = (sy[rows, position] - slope[rows, position] * sx[rows, position]) / width
+        candidate = {'slope': slope[rows, position], 'intercept': intercept, 'r2': top,
+                     'start': position, 'stop': position + width - 1}
+
+        # 达到 MIN_R2 的宽度越大越好（宽度从小到大遍历，后出现的覆盖先出现的）
+        accept = top >= min_r2
+        for key in best:
+            best[key][accept] = candidate[key][accept]
+        best_width[accept] = width
+        if width == min_width:
+            usable = np.isfinite(top)
+            for key in fallback:
+                fallback[key][usable] = candidate[key][usable]
+
+    missing = best_width == 0
+    for key in best:
+        best[key][missing] = fallback[key][missing]
+    return _results(grid, best)
+
+
+def _results(grid, best):
+    found = np.isfinite(best['start'])
+    start = np.where(found, best['start'], 0).astype(np.intp)
+    stop = np.where(found, best['stop'], 0).astype(np.intp)
+    slope, intercept = best['slope'], best['intercept']
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        exchange_current = 10 ** (-intercept / slope)
+    nan = lambda values: np.where(found, values, np.nan)
+    return {
+        'slope': slope * 1000,
+        'intercept': intercept,
+        'r2': best['r2'],
+        'exchange_current': nan(exchange_current),
+        'j_start': nan(10 ** grid[start]),
+        'j_end': nan(10 ** grid[stop]),
+        'eta_start': nan(intercept + slope * grid[start]),
+        'eta_end': nan(intercept + slope * grid[stop]),
+    }
+
+
+def table(names, results):
+    """每个样品一行的结果表（行字典列表）"""
+    columns = {
+        'Tafel Slope (mV/dec)': 'slope',
+        'R²': 'r2',
+        'Exchange Current Density (mA/cm²)': 'exchange_current',
+        'Window Start (mA/cm²)': 'j_start',
+        'Window End (mA/cm²)': 'j_end',
+        'Window Start η (V)': 'eta_start',
+        'Window End η (V)': 'eta_end',
+    }
+    rows = []
+    for i, name in enumerate(names):
+        row = {'Folder': name}
+        row.update({column: (None if np.isnan(results[key][i]) else float(results[key][i]))
+                    for column, key in columns.items()})
+        rows.append(row)
+    return rows
+
+
+def plot(ax, names, curves, results, points_per_decade=POINTS_PER_DECADE):
+    """η – log j 叠加图，拟合区间用同色虚线标出"""
+    grid, eta = tafel_lines(curves, points_per_decade)
+    for i, name in enumerate(names):
+        line, = ax.plot(grid, eta[i], label=f"{name} ({results['slope'][i]:.0f} mV/dec)")
+        if np.isfinite(results['slope'][i]):
+            window = np.log10([results['j_start'][i], results['j_end'][i]])
+            ax.plot(window, results['intercept'][i] + results['slope'][i] / 1000 * window,
+                    linestyle='--', linewidth=2.5, color=line.get_color())
+    ax.set_xlabel("log j (mA/cm²)")
+    ax.set_ylabel("Overpotential (V)")
+    ax.set_title("Tafel Plots")
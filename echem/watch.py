@@ -0,0 +1,250 @@
+# Roc_Huang
+#
+# 程序功能：
+# 监视 CHI 宏命令（save= / tsave=）的保存文件夹，测试过程中每完成一项技术就立即分析，不必等整轮测试结束。
+# 1. 轮询文件夹（只做一次 scandir），文件大小和 mtime 连续 SETTLE_SECONDS 秒不变才认为保存完成（去抖动）。
+# 2. 只分析新完成或发生变化的文件：EIS -> Rs（高频截距，见 echem.ohmic）与 Kramers–Kronig 检验；LSV -> 10 / 100 mA/cm² 过电位；CV -> 电流密度极值与 Cdl（非法拉第电位处 Δj/2 对扫速拟合，与 echem.cdl 相同）；DRT -> 峰位（与 DRT 处理脚本相同，先用 echem.smoothing 平滑 γ(τ)）。
+# 3. 每个样品的结果保存在内存中，新文件只更新对应的一项（例如 EIS 晚于 LSV 到达时只用已读入的 LSV 重新计算过电位）。
+# 4. 每轮有更新时重写汇总表 watch_summary.csv 和汇总图 watch_summary.png，可选同时增量更新 SQLite 实验目录。
+#
+# 用法：python -m echem.watch [文件夹] [--settle 3] [--interval 1] [--db catalog.sqlite] [--skip-existing]
+# 不指定文件夹时弹出选择对话框。
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from scipy.signal import argrelextrema
+
+from echem import catalog, cdl, chi_parser, linkk, manifest, nyquist, ohmic, smoothing
+
+SETTLE_SECONDS = 3.0
+POLL_SECONDS = 1.0
+
+SUMMARY_CSV = 'watch_summary.csv'
+SUMMARY_PNG = 'watch_summary.png'
+
+
+def drt_peaks(tau, gamma, order=3):
+    """DRT 曲线的极大值位置（与 DRT 处理脚本相同，γ(τ) 按 echem.smoothing 的默认参数平滑后使用 argrelextrema）"""
+    index = argrelextrema(smoothing.smooth([gamma])[0], np.greater, order=order)[0]
+    return [float(tau[i]) for i in index]
+
+
+class Watcher:
+    def __init__(self, folder, settle=SETTLE_SECONDS, db_path=None):
+        self.folder = os.path.abspath(folder)
+        self.settle = settle
+        self.db_path = db_path
+        self.pending = {}  # path -> ((size, mtime_ns), 首次观察到该状态的时间)
+        self.done = {}  # path -> (size, mtime_ns)
+        self.samples = {}  # 文件夹 -> 分析结果
+
+    def _sample(self, experiment):
+        return self.samples.setdefault(experiment['folder'], {
+            'name': experiment['name'],
+            'rs': None,
+            'eis': None,
+            'kk': None,
+            'lsv': None,
+            'eta_10': None,
+            'eta_100': None,
+            'cv': None,
+            'cv_rates': {},  # 扫速 (mV/s) -> (电位, 电流密度 (mA/cm²))
+            'cdl': None,  # 同 echem.cdl.sample_result
+            'drt_peaks': {},
+        })
+
+    def poll(self):
+        """扫描一次文件夹，返回已保存完成、尚未分析的文件 [(experiment, kind, key, path)]"""
+        now = time.time()
+        finished = []
+        for experiment in manifest.crawl(self.folder).values():
+            for kind, key, path in manifest.files_of(experiment):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if self.done.get(path) == signature:
+                    continue
+                seen = self.pending.get(path)
+                if seen is None or seen[0] != signature:
+                    # 文件仍在写入或刚出现，重新计时
+                    self.pending[path] = (signature, now)
+                    continue
+                if now - seen[1] >= self.settle:
+                    finished.append((experiment, kind, key, path))
+                    self.done[path] = signature
+                    del self.pending[path]
+        return finished
+
+    def mark_existing(self):
+        """把当前已有的文件都视为已分析，只处理之后新保存的文件"""
+        for experiment in manifest.crawl(self.folder).values():
+            for _, _, path in manifest.files_of(experiment):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                self.done[path] = (stat.st_size, stat.st_mtime_ns)
+
+    def analyze(self, experiment, kind, key, path):
+        """只分析这一个文件，并更新该样品依赖它的结果"""
+        sample = self._sample(experiment)
+        if kind == 'drt':
+            _, data = chi_parser.read_chi_text(path)
+            if data.shape[0] >= 2:
+                sample['drt_peaks'][key] = drt_peaks(data[0], data[1])
+            return
+
+        data = chi_parser.read_chi_frame(path, manifest.COLUMNS['cv' if kind == 'cv_rate' else kind])
+        if data.empty:
+            print(f"文件 {path} 没有数据")
+            return
+
+        if kind == 'eis':
+            sample['rs'] = ohmic.spectrum_resistance(data['Freq'], data["Z'"], data["Z''"])
+            sample['eis'] = (data["Z'"].to_numpy(), data["Z''"].to_numpy())
+            valid = data['Freq'].to_numpy() > 0
+            sample['kk'] = linkk.validate([(data['Freq'].to_numpy()[valid], data["Z'"].to_numpy()[valid],
+                                            data["Z''"].to_numpy()[valid])])[0]
+            if not sample['kk']['valid']:
+                print(f"{path} 未通过 Kramers–Kronig 检验"
+                      f"（最大残差 {sample['kk']['max_residual']:.2%}，平均残差 {sample['kk']['mean_residual']:.2%}）")
+        elif kind == 'lsv':
+            sample['lsv'] = (data['Potential'].to_numpy(), data['Current'].to_numpy())
+        elif kind == 'cv':
+            sample['cv'] = catalog.cv_extrema(data['Current'])
+        else:
+            sample['cv_rates'][key] = (data['Potential'].to_numpy(), data['Current'].to_numpy() * 1000 / cdl.AREA_CM2)
+            rates = sorted(sample['cv_rates'])
+            if len(rates) >= 2:
+                try:
+                    values = cdl.half_differences([sample['cv_rates'][r] for r in rates])
+                    sample['cdl'] = cdl.sample_result(rates, values)
+                except ValueError as e:
+                    print(f"{sample['name']} 的 Cdl 取值失败: {e}")
+
+        # 过电位依赖 Rs 与 LSV，两者任一更新时用内存中的数据重新计算
+        if kind in ('eis', 'lsv') and sample['rs'] is not None and sample['lsv'] is not None:
+            sample['eta_10'], sample['eta_100'] = catalog.overpotentials(*sample['lsv'], sample['rs'])
+
+    def summary(self):
+        rows = []
+        for folder, sample in sorted(self.samples.items()):
+            rows.append({
+                'Folder': sample['name'],
+                'Resistance (Ω)': sample['rs'],
+                'KK Valid': sample['kk']['valid'] if sample['kk'] else None,
+                'KK Max Residual': sample['kk']['max_residual'] if sample['kk'] else None,
+                'KK Mean Residual': sample['kk']['mean_residual'] if sample['kk'] else None,
+                'Overpotential at 10 mA/cm² (V)': sample['eta_10'],
+                'Overpotential at 100 mA/cm² (V)': sample['eta_100'],
+                'CV Max Current Density (mA/cm²)': sample['cv'][0] if sample['cv'] else None,
+                'CV Min Current Density (mA/cm²)': sample['cv'][1] if sample['cv'] else None,
+                'Cdl (mF/cm²)': sample['cdl']['cdl'] if sample['cdl'] else None,
+                'Cdl R²': sample['cdl']['r2'] if sample['cdl'] else None,
+                'ECSA (cm²)': sample['cdl']['ecsa'] if sample['cdl'] else None,
+                'DRT Peaks (s)': '; '.join(f"{voltage}V: " + ', '.join(f'{tau:.3g}' for tau in peaks)
+                                           for voltage, peaks in sorted(sample['drt_peaks'].items())),
+                'DRT Smoothing': smoothing.describe() if sample['drt_peaks'] else None,
+            })
+        return pd.DataFrame(rows)
+
+    def save(self):
+        """重写汇总表与汇总图（只使用内存中的结果，不重新读取文件）"""
+        csv_path = os.path.join(self.folder, SUMMARY_CSV)
+        self.summary().to_csv(csv_path, index=False, encoding='utf-8-sig')
+
+        fig = Figure(figsize=(16, 12))
+        axes = fig.subplots(2, 2)
+        samples = [sample for _, sample in sorted(self.samples.items())]
+
+        handles = nyquist.overlay(axes[0, 0], ((s['name'] + (' (KK fail)' if s['kk'] and not s['kk']['valid'] else ''), *s['eis'])
+                                               for s in samples if s['eis'] is not None))
+        axes[0, 0].invert_yaxis()
+        axes[0, 0].set_xlabel("Z' (Ω·cm²)")
+        axes[0, 0].set_ylabel("Z'' (Ω·cm²)")
+        if handles:
+            axes[0, 0].legend(handles=handles, loc='best')
+
+        for s in samples:
+            if s['lsv'] is not None:
+                potential, current = s['lsv']
+                axes[0, 1].plot(potential - current * (s['rs'] or 0.0), current * 1000 / catalog.AREA_CM2, label=s['name'])
+        axes[0, 1].set_xlabel("Calibrated Potential (V)")
+        axes[0, 1].set_ylabel("Current Density (mA/cm²)")
+        axes[0, 1].set_title("LSV Curves Comparison")
+
+        for i, s in enumerate(samples):
+            if s['cdl']:
+                cdl.plot(axes[1, 0], s, marker='o', color=f'C{i % 10}')
+        axes[1, 0].set_xlabel('Scan Rate (mV/s)')
+        axes[1, 0].set_ylabel('Δj/2 (mA/cm²)')
+        axes[1, 0].set_title('Scan Rate vs. Δj/2')
+
+        named = [s for s in samples if s['eta_10'] is not None]
+        x = np.arange(len(named))
+        axes[1, 1].bar(x - 0.2, [s['eta_10'] for s in named], width=0.4, label="Overpotential at 10 mA/cm² (V)")
+        axes[1, 1].bar(x + 0.2, [s['eta_100'] or 0.0 for s in named], width=0.4, label="Overpotential at 100 mA/cm² (V)")
+        axes[1, 1].set_xticks(x)
+        axes[1, 1].set_xticklabels([s['name'] for s in named], rotation=45, ha='right', fontsize=8)
+        axes[1, 1].set_title("Overpotential Comparison at 10 and 100 mA/cm²")
+
+        for ax in axes.flat[1:]:
+            if ax.get_legend_handles_labels()[0]:
+                ax.legend(fontsize=8)
+        fig.tight_layout()
+        fig.savefig(os.path.join(self.folder, SUMMARY_PNG))
+
+    def step(self):
+        """轮询一次并分析新完成的文件，返回本轮分析的文件数"""
+        finished = self.poll()
+        for experiment, kind, key, path in finished:
+            try:
+                self.analyze(experiment, kind, key, path)
+                print(f"{time.strftime('%H:%M:%S')} 已分析 {os.path.relpath(path, self.folder)}")
+            except (OSError, ValueError, IndexError) as e:
+                print(f"分析 {path} 失败: {e}")
+        if finished:
+            self.save()
+            if self.db_path:
+                catalog.update(self.db_path, self.folder)
+        return len(finished)
+
+    def run(self, interval=POLL_SECONDS):
+        print(f"正在监视 {self.folder}，按 Ctrl+C 结束")
+        try:
+            while True:
+                self.step()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("已停止监视。")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='监视 CHI 保存文件夹并增量分析新文件')
+    parser.add_argument('folder', nargs='?', help='要监视的文件夹，不指定时弹出选择对话框')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS, help='文件多少秒不变后视为保存完成')
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help='轮询间隔 (s)')
+    parser.add_argument('--db', help='同时增量更新的 SQLite 实验目录')
+    parser.add_argument('--skip-existing', action='store_true', help='不分析启动时已存在的文件')
+    args = parser.parse_args()
+
+    folder = args.folder
+    if not folder:
+        from tkinter import Tk, filedialog
+        root = Tk()
+        root.withdraw()
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+    if folder:
+        watcher = Watcher(folder, settle=args.settle, db_path=args.db)
+        if args.skip_existing:
+            watcher.mark_existing()
+        watcher.run(interval=args.interval)
+    else:
+        print("未选择文件夹。")
@@ -8,8 +8,13 @@
 # 1. 从CV数据文件中提取电位、电流数据。
 # 2. 支持电流密度（mA/mg）的计算，取决于用户输入的活性物质质量。
 # 3. 提供绘制CV图像的功能，可以选择电流或电流密度进行可视化。
-# 4. 拟合扫速与电流（或电流密度）极值的关系，生成拟合曲线并显示。
-# 5. 自动将数据和生成的图像保存到文件中。
+# 4. 拟合扫速与电流（或电流密度）极值的关系（极值取自按半周期分段、批量中值滤波后的电流，见 echem.smoothing），生成拟合曲线并显示；
+#    Cdl 由电位窗口中点处的 Δj/2 对扫速拟合（echem.cdl），拟合图另存为 *_Cdl_Fit.png。
+# 5. 一次性分割全部循环周期，输出每个周期的峰电流、包围电荷及周期间漂移。
+# 6. 识别最后一个周期的氧化还原峰（排除换向点处的电流），给出 ΔEp 与 ip – v^½、log ip – log v 回归（echem.peaks）。
+# 7. 所有文件、所有半周期的阳极 / 阴极电荷与比电容一次积分（echem.charge），输出容量随段数的变化。
+# 8. 两个以上扫速时用 Dunn 方法分离电容与扩散电流，并给出 b 值随电位的变化（echem.dunn）。
+# 9. 自动将数据和生成的图像保存到文件中。
 #
 # 操作方法：
 # 1. 用户输入活性物质质量（单位：mg），如需计算电流密度。
@@ -20,6 +25,7 @@
 
 
 import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import pandas as pd
@@ -27,30 +33,26 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from echem import cdl, charge, chi_parser, cv_cycles, dunn, peaks, smoothing
+
 # 全局变量，用于存储活性物质质量
 active_material_mass = 0.0
 
+# 取电流极值前的平滑方法：CV 电流的极值常在换向点附近，Savitzky–Golay 在此处会把峰值抬高到所有实测点之上，
+# 中值滤波的结果不会超出原始数据的范围
+EXTREMA_SMOOTHING = 'median'
+
 # 提取数据的函数
 def extract_scan_rate_and_data(file_path, active_mass):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
+    # 统一解析器一次性读取头部元数据和数据区
+    meta, data = chi_parser.read_chi_text(file_path)
 
     # 提取扫速
-    scan_rate = None
-    for line in lines:
-        if "Scan Rate (V/s)" in line:
-            scan_rate = float(line.split('=')[1].strip())
-            scan_rate_mV_s = scan_rate * 1000  # 转换为mV/s
-            break
-    
-    # 提取数据部分
-    data = []
-    for line in lines:
-        if line.strip() and line[0].isdigit():
-            potential, current = line.split(',')
-            data.append([float(potential), float(current)])
-    
-    df = pd.DataFrame(data, columns=['Potential/V', 'Current/A'])
+    scan_rate = meta.get('Scan Rate (V/s)')
+    scan_rate_mV_s = scan_rate * 1000 if scan_rate is not None else None  # 转换为mV/s
+
+    df = pd.DataFrame({'Potential/V': data[0], 'Current/A': data[1]})
     
     # 单位转换：电流(A) -> 电流(mA)
     df['Current/A'] = df['Current/A'] * 1e3  # 转换为mA
@@ -75,24 +77,21 @@ def extract_scan_rate_and_data(file_path, active_mass):
     if len(df) < 100:
         print(f"警告：数据点数量少于100 ({len(df)}点)，可能不构成完整周期")
     
-    # 探测电位的变化方向
-    # 计算电位的一阶差分
-    df['potential_diff'] = df['Potential/V'].diff()
-    
-    # 查找方向变化点 (正->负 或 负->正)
-    direction_changes = []
-    
-    for i in range(1, len(df)-1):
-        if (df['potential_diff'].iloc[i] * df['potential_diff'].iloc[i+1]) < 0:
-            direction_changes.append(i)
+    # 对电位差分做一次符号变化检测，得到全部方向变化点 (正->负 或 负->正)
+    potential = df['Potential/V'].to_numpy()
+    direction_changes = cv_cycles.find_vertices(potential)
     
     print(f"检测到的方向变化点数量: {len(direction_changes)}")
     
+    # 所有完整周期的峰电流、包围电荷与漂移，一次性计算
+    bounds = cv_cycles.cycle_bounds(cv_cycles.segment_bounds(potential, direction_changes))
+    cycle_stats = pd.DataFrame(cv_cycles.cycle_statistics(
+        potential, df['Current_Density'].to_numpy(), bounds, scan_rate))
+    
     if len(direction_changes) >= 2:
-        # 至少有两个变化点，取最后两个变化点之间的数据作为最后一个周期
-        # 但需要稍微扩展一下范围，确保包含完整的周期
-        start_idx = direction_changes[-2]
-        end_idx = len(df) - 1  # 使用所有剩余数据，确保包含完整周期
+        # 至少有两个变化点，取倒数第二个变化点之后的全部数据作为最后一个周期，确保包含完整的周期
+        start_idx = cv_cycles.last_cycle_start(direction_changes)
+        end_idx = len(df) - 1
         
         print(f"提取周期范围: 点{start_idx} 到 点{end_idx}")
         last_cycle_data = df.iloc[start_idx:end_idx + 1].copy()
@@ -104,7 +103,7 @@ def extract_scan_rate_and_data(file_path, active_mass):
     # 打印提取周期的电位范围，验证是否合理
     print(f"提取的周期电位范围: {last_cycle_data['Potential/V'].min():.3f}V 到 {last_cycle_data['Potential/V'].max():.3f}V")
     
-    return scan_rate_mV_s, last_cycle_data
+    return scan_rate_mV_s, last_cycle_data, cycle_stats, df
 
 # 绘制CV数据的函数 - 支持电流和电流密度
 def plot_cv_data(scan_rates, all_last_cycle_data, save_path, use_density=False):
@@ -168,8 +167,9 @@ def fit_scan_rate(scan_rates, max_values, min_values, save_path, use_density=Fal
     scan_rate_range = np.linspace(min(scan_rates) * 0.9, max(scan_rates) * 1.1, 100)
     
     # 绘制散点图
-    plt.scatter(scan_rates, max_values, label='Max Values', color='red', s=50)
-    plt.scatter(scan_rates, min_values, label='Min Values', color='blue', s=50)
+    description = smoothing.describe(smoothing.parameters(EXTREMA_SMOOTHING))
+    plt.scatter(scan_rates, max_values, label=f'Max Values ({description})', color='red', s=50)
+    plt.scatter(scan_rates, min_values, label=f'Min Values ({description})', color='blue', s=50)
     
     # 绘制拟合线
     max_fit_line = slope_max * scan_rate_range + intercept_max
@@ -197,6 +197,46 @@ def fit_scan_rate(scan_rates, max_values, min_values, save_path, use_density=Fal
     plt.savefig(save_path, dpi=300)
     plt.show()
 
+# 氧化还原峰：每个文件一行，附 ΔEp 平均值与峰电流对扫速的回归（电流单位与图中一致）
+def peak_analysis(file_paths, scan_rates, all_last_cycle_data, column):
+    rates = [np.nan if rate is None else rate for rate in scan_rates]
+    curves = [(data['Potential/V'].to_numpy(), data[column].to_numpy()) for data in all_last_cycle_data]
+    found, fits = peaks.analyze([(rates, curves)])
+    table = pd.DataFrame({
+        'File': [os.path.basename(path) for path in file_paths],
+        'Scan Rate (mV/s)': scan_rates,
+        'Epa (V)': found['potential'][0, :, 0],
+        'ipa': found['current'][0, :, 0],
+        'Epc (V)': found['potential'][0, :, 1],
+        'ipc': found['current'][0, :, 1],
+        'ΔEp (V)': found['delta_ep'][0],
+    })
+    for side, label in enumerate(('Anodic', 'Cathodic')):
+        table[f'{label} ip–v^½ R²'] = fits['sqrt_r2'][0, side]
+        table[f'{label} ip–v R²'] = fits['linear_r2'][0, side]
+        table[f'{label} log ip–log v Slope'] = fits['log_slope'][0, side]
+    delta_ep = fits['delta_ep'][0]
+    if np.isfinite(delta_ep):
+        print(f"平均 ΔEp: {delta_ep * 1000:.1f} mV（{peaks.reversibility(delta_ep)}），|ipa/ipc|: {fits['ratio'][0]:.3f}")
+    else:
+        print("未识别到成对的氧化还原峰")
+    return table
+
+# 各文件比电容随半周期序号的变化（容量衰减）
+def plot_charge_retention(charge_table, save_path, use_density=False):
+    plt.figure(figsize=(10, 7))
+    for file_name, rows in charge_table.groupby('file', sort=False):
+        plt.plot(rows['segment'], rows['capacitance'], marker='o', markersize=3, label=file_name)
+
+    plt.xlabel('Segment', fontsize=12)
+    plt.ylabel('Specific Capacitance (F/g)' if use_density else 'Capacitance (mF)', fontsize=12)
+    plt.title('Capacitance vs Segment', fontsize=14)
+    plt.legend()
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=300)
+    plt.close()
+
 # 选择文件并处理
 def select_files_and_process():
     # 获取活性物质质量
@@ -224,14 +264,13 @@ def select_files_and_process():
 
     scan_rates = []
     all_last_cycle_data = []
-    max_values = []
-    min_values = []
+    charge_curves = []
     save_folder = None
 
     # 处理选定的文件
     for file_path in file_paths:
         print(f"\n处理文件: {os.path.basename(file_path)}")
-        scan_rate, last_cycle_data = extract_scan_rate_and_data(file_path, active_material_mass)
+        scan_rate, last_cycle_data, cycle_stats, full_data = extract_scan_rate_and_data(file_path, active_material_mass)
 
         # 获取文件所在的文件夹路径
         save_folder = os.path.dirname(file_path)
@@ -256,28 +295,38 @@ def select_files_and_process():
         plt.savefig(image_path)
         plt.close()
         
+        # 保存全部周期的统计量（电流单位与图中一致；charge 为 |∮ I dE| / 扫速，电流为 mA 时单位为 mC）
+        if not cycle_stats.empty:
+            cycles_path = os.path.join(save_folder, f"{os.path.basename(file_path).split('.')[0]}_Cycles.csv")
+            cycle_stats.to_csv(cycles_path, index=False, encoding='utf-8-sig')
+            print(f"共 {len(cycle_stats)} 个完整周期，统计量已保存到: {cycles_path}")
+        
         all_last_cycle_data.append(last_cycle_data)
         scan_rates.append(scan_rate)
-        
-        # 提取极大值和极小值
-        if use_current_density and active_material_mass > 0:
-            max_value = last_cycle_data['Current_Density'].max()
-            min_value = last_cycle_data['Current_Density'].min()
-            print(f"最大电流密度: {max_value:.4f} mA/mg")
-            print(f"最小电流密度: {min_value:.4f} mA/mg")
-        else:
-            max_value = last_cycle_data['Current/A'].max()
-            min_value = last_cycle_data['Current/A'].min()
-            print(f"最大电流: {max_value:.4f} mA")
-            print(f"最小电流: {min_value:.4f} mA")
-            
+        charge_curves.append((full_data['Potential/V'].to_numpy(), full_data['Current/A'].to_numpy(),
+                              scan_rate / 1000 if scan_rate is not None else None))
         print("-" * 40)
-        
-        max_values.append(max_value)
-        min_values.append(min_value)
 
     # 将所有扫速的CV曲线绘制在同一张图中
     if save_folder and len(all_last_cycle_data) > 0:
+        use_density = use_current_density and active_material_mass > 0
+        column = 'Current_Density' if use_density else 'Current/A'
+
+        # 所有文件最后一个周期按换向点分成半周期，一次批量平滑后再取极大值和极小值，避免噪声尖峰被当作极值；
+        # 滤波窗口不跨越换向点
+        halves = []
+        for data in all_last_cycle_data:
+            potential = data['Potential/V'].to_numpy()
+            halves.append(cv_cycles.half_cycles(data[column].to_numpy(), cv_cycles.segment_bounds(potential)))
+        smoothed = iter(smoothing.smooth([half for segments in halves for half in segments], method=EXTREMA_SMOOTHING))
+        smoothed = [[next(smoothed) for _ in segments] for segments in halves]
+        max_values = [float(max(half.max() for half in segments)) for segments in smoothed]
+        min_values = [float(min(half.min() for half in segments)) for segments in smoothed]
+        unit = 'mA/mg' if use_density else 'mA'
+        print(f"电流极值取自分半周期平滑后的曲线: {smoothing.describe(smoothing.parameters(EXTREMA_SMOOTHING))}")
+        for file_path, max_value, min_value in zip(file_paths, max_values, min_values):
+            print(f"{os.path.basename(file_path)}: 最大 {max_value:.4f} {unit}，最小 {min_value:.4f} {unit}")
+
         cv_image_name = "All_Scan_Rates_Last_Cycle"
         if use_current_density and active_material_mass > 0:
             cv_image_name += "_Density"
@@ -290,6 +339,57 @@ def select_files_and_process():
             fit_image_name += "_Density"
         fit_image_path = os.path.join(save_folder, f"{fit_image_name}_Fit.png")
         fit_scan_rate(scan_rates, max_values, min_values, fit_image_path, use_current_density and active_material_mass > 0)
+
+        # 所有文件最后一个周期的氧化还原峰一次识别
+        peak_table = peak_analysis(file_paths, scan_rates, all_last_cycle_data, column)
+        peaks_path = os.path.join(save_folder, "CV_Peaks.csv")
+        peak_table.to_csv(peaks_path, index=False, encoding='utf-8-sig')
+        print(f"氧化还原峰已保存到: {peaks_path}")
+
+        # 全部文件、全部半周期的电荷与比电容（给出质量时除以质量）
+        charges = charge.integrate(charge_curves, active_material_mass if use_density else 0.0)
+        if charges:
+            charge_table = pd.DataFrame(charges)
+            charge_table['file'] = [os.path.basename(file_paths[i]) for i in charge_table['file']]
+            charge_path = os.path.join(save_folder, "CV_Charge.csv")
+            charge_table.to_csv(charge_path, index=False, encoding='utf-8-sig')
+            plot_charge_retention(charge_table, os.path.join(save_folder, "CV_Charge_Retention.png"), use_density)
+            print(f"共 {len(charge_table)} 个半周期的电荷已保存到: {charge_path}")
+
+        # Dunn 电容 / 扩散电流分离与 b 值分析
+        rated = [(rate, data) for rate, data in zip(scan_rates, all_last_cycle_data) if rate is not None]
+        if len(rated) >= 2:
+            unit = 'Current Density (mA/mg)' if column == 'Current_Density' else 'Current (mA)'
+            try:
+                result = dunn.deconvolve([rate for rate, _ in rated],
+                                         [(data['Potential/V'].to_numpy(), data[column].to_numpy()) for _, data in rated])
+                dunn.save(save_folder, result, unit=unit)
+                for rate, fraction in zip(result['scan_rates'], result['fraction']):
+                    print(f"{rate:g} mV/s 电容贡献: {fraction:.1%}")
+            except ValueError as e:
+                print(f"Dunn 分析失败: {e}")
+
+            # 电位窗口中点处 Δj/2 对扫速的斜率即 Cdl，不受法拉第电流极值影响；拟合图与极值拟合图一起保存
+            try:
+                values = cdl.half_differences([(data['Potential/V'].to_numpy(), data[column].to_numpy()) for _, data in rated])
+                result = cdl.sample_result([rate for rate, _ in rated], values)
+                if result is None:
+                    raise ValueError("Δj/2 拟合无效")
+                current_unit = 'mA/mg' if column == 'Current_Density' else 'mA'
+                print(f"Cdl (Δj/2): {result['cdl']:.4f} {current_unit.replace('mA', 'mF')}, R² = {result['r2']:.4f}")
+
+                fig, ax = plt.subplots(figsize=(10, 8))
+                cdl.plot(ax, {'cdl': result}, unit=current_unit, marker='o', color='blue', s=50)
+                ax.set_title('Δj/2 vs Scan Rate (Cdl)', fontsize=14)
+                ax.legend(fontsize=10)
+                ax.grid(True, linestyle='--', alpha=0.7)
+                fig.tight_layout()
+                cdl_image_path = os.path.join(save_folder, f"{fit_image_name}_Cdl_Fit.png")
+                fig.savefig(cdl_image_path, dpi=300)
+                plt.close(fig)
+                print(f"Cdl 拟合图已保存到: {cdl_image_path}")
+            except ValueError as e:
+                print(f"Cdl 计算失败: {e}")
         
         print(f"所有图像已保存到: {save_folder}")
     else:
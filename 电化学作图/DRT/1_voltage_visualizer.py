@@ -7,6 +7,9 @@ from scipy.signal import find_peaks
 import tkinter as tk
 from tkinter import filedialog, simpledialog
 import matplotlib
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import chi_parser
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -124,30 +127,11 @@ def main():
 def read_data_file(file_path):
     """读取数据文件，跳过头部信息，提取tau和gamma值"""
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            
-            # 找到"tau, gamma(tau)"所在行
-            data_start = 0
-            for i, line in enumerate(lines):
-                if "tau, gamma(tau)" in line:
-                    data_start = i + 1
-                    break
-            
-            # 提取数据
-            tau = []
-            gamma = []
-            for line in lines[data_start:]:
-                if line.strip():  # 跳过空行
-                    parts = line.strip().split(',')
-                    if len(parts) == 2:
-                        try:
-                            tau.append(float(parts[0]))
-                            gamma.append(float(parts[1]))
-                        except ValueError:
-                            continue
-            
-            return np.array(tau), np.array(gamma)
+        # 统一解析器自动定位 "tau, gamma(tau)" 之后的数据区并整体转换
+        _, data = chi_parser.read_chi_text(file_path)
+        if data.shape[0] < 2:
+            return np.array([]), np.array([])
+        return data[0], data[1]
     except Exception as e:
         print(f"读取文件 {file_path} 时出错: {e}")
         return None, None
@@ -9,6 +9,9 @@ from tkinter import filedialog, simpledialog, messagebox
 from scipy.signal import argrelextrema
 import matplotlib.cm as cm
 import matplotlib
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import chi_parser, smoothing
 
 
 # 设置中文字体支持
@@ -35,7 +38,8 @@ def main():
     all_voltage_values = []
     all_max_points = []
     
-    # 处理文件夹中的所有.txt文件
+    # 先读取文件夹中的所有.txt文件，全部 γ(τ) 一次批量平滑后再找极值，避免噪声尖峰被当作极值
+    records = []
     for filename in os.listdir(folder_path):
         if filename.endswith(".txt"):
             # 从文件名中提取电压值
@@ -49,22 +53,28 @@ def main():
                 tau, gamma = read_data_file(file_path)
                 
                 if tau is not None and gamma is not None:
-                    # 找出极大值点
-                    max_indices = find_extrema(gamma, max=True)
-                    
-                    # 提取对应的点
-                    max_points = [(tau[i], gamma[i]) for i in max_indices]
-                    
-                    # 保存极值点到新文件
-                    save_extrema_points(output_dir, filename, voltage, max_points)
-                    
-                    # 添加到汇总列表
-                    all_voltage_values.append(voltage)
-                    
-                    # 为每个极值点添加对应的电压信息
-                    max_with_voltage = [(voltage, x, y) for x, y in max_points]
-                    
-                    all_max_points.extend(max_with_voltage)
+                    records.append((filename, voltage, tau, gamma))
+    
+    smoothed = smoothing.smooth([gamma for _, _, _, gamma in records])
+    print(f"γ(τ) 平滑: {smoothing.describe()}")
+    
+    for (filename, voltage, tau, gamma), gamma_smooth in zip(records, smoothed):
+        # 找出极大值点
+        max_indices = find_extrema(gamma_smooth, max=True)
+        
+        # 提取对应的点
+        max_points = [(tau[i], gamma_smooth[i]) for i in max_indices]
+        
+        # 保存极值点到新文件
+        save_extrema_points(output_dir, filename, voltage, max_points)
+        
+        # 添加到汇总列表
+        all_voltage_values.append(voltage)
+        
+        # 为每个极值点添加对应的电压信息
+        max_with_voltage = [(voltage, x, y) for x, y in max_points]
+        
+        all_max_points.extend(max_with_voltage)
     
     # 按电压值排序
     all_voltage_values = np.array(all_voltage_values)
@@ -167,30 +177,11 @@ def get_voltage_ranges(root, all_voltage_values):
 def read_data_file(file_path):
     """读取数据文件，跳过头部信息，提取tau和gamma值"""
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            
-            # 找到"tau, gamma(tau)"所在行
-            data_start = 0
-            for i, line in enumerate(lines):
-                if "tau, gamma(tau)" in line:
-                    data_start = i + 1
-                    break
-            
-            # 提取数据
-            tau = []
-            gamma = []
-            for line in lines[data_start:]:
-                if line.strip():  # 跳过空行
-                    parts = line.strip().split(',')
-                    if len(parts) == 2:
-                        try:
-                            tau.append(float(parts[0]))
-                            gamma.append(float(parts[1]))
-                        except ValueError:
-                            continue
-            
-            return np.array(tau), np.array(gamma)
+        # 统一解析器自动定位 "tau, gamma(tau)" 之后的数据区并整体转换
+        _, data = chi_parser.read_chi_text(file_path)
+        if data.shape[0] < 2:
+            return np.array([]), np.array([])
+        return data[0], data[1]
     except Exception as e:
         print(f"读取文件 {file_path} 时出错: {e}")
         return None, None
@@ -209,7 +200,8 @@ def save_extrema_points(output_dir, original_filename, voltage, max_points):
     
     with open(output_file, 'w') as file:
         file.write(f"电压值: {voltage}V\n")
-        file.write(f"原始文件: {original_filename}\n\n")
+        file.write(f"原始文件: {original_filename}\n")
+        file.write(f"平滑: {smoothing.describe()}（极值取自平滑后的 gamma）\n\n")
         
         file.write("极大值点:\n")
         file.write("tau, gamma(tau)\n")
@@ -9,6 +9,9 @@ from tkinter import filedialog, simpledialog
 from scipy.signal import argrelextrema
 import matplotlib.cm as cm
 import matplotlib
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import chi_parser, smoothing
 
 
 # 设置中文字体支持
@@ -40,7 +43,8 @@ def main():
     all_max_points = []
     all_min_points = []
     
-    # 处理文件夹中的所有.txt文件
+    # 先读取文件夹中的所有.txt文件，全部 γ(τ) 一次批量平滑后再找极值，避免噪声尖峰被当作极值
+    records = []
     for filename in os.listdir(folder_path):
         if filename.endswith(".txt"):
             # 从文件名中提取电压值
@@ -54,34 +58,40 @@ def main():
                 tau, gamma = read_data_file(file_path)
                 
                 if tau is not None and gamma is not None:
-                    # 找出极大值和极小值点
-                    max_indices = find_extrema(gamma, max=True)
-                    min_indices = find_extrema(gamma, max=False)
-                    
-                    # 提取对应的点
-                    max_points = [(tau[i], gamma[i]) for i in max_indices]
-                    min_points = [(tau[i], gamma[i]) for i in min_indices]
-                    
-                    # 根据tau范围过滤极值点
-                    if tau_min != -1 or tau_max != -1:
-                        max_points = filter_points_by_tau(max_points, tau_min, tau_max)
-                        min_points = filter_points_by_tau(min_points, tau_min, tau_max)
-                    
-                    # 为每个文件绘制单独的图
-                    plot_single_file(output_dir, filename, voltage, tau, gamma, max_points, min_points)
-                    
-                    # 保存极值点到新文件
-                    save_extrema_points(output_dir, filename, voltage, max_points, min_points)
-                    
-                    # 添加到汇总列表
-                    all_voltage_values.append(voltage)
-                    
-                    # 为每个极值点添加对应的电压信息
-                    max_with_voltage = [(voltage, x, y) for x, y in max_points]
-                    min_with_voltage = [(voltage, x, y) for x, y in min_points]
-                    
-                    all_max_points.extend(max_with_voltage)
-                    all_min_points.extend(min_with_voltage)
+                    records.append((filename, voltage, tau, gamma))
+    
+    smoothed = smoothing.smooth([gamma for _, _, _, gamma in records])
+    print(f"γ(τ) 平滑: {smoothing.describe()}")
+    
+    for (filename, voltage, tau, gamma), gamma_smooth in zip(records, smoothed):
+        # 找出极大值和极小值点
+        max_indices = find_extrema(gamma_smooth, max=True)
+        min_indices = find_extrema(gamma_smooth, max=False)
+        
+        # 提取对应的点
+        max_points = [(tau[i], gamma_smooth[i]) for i in max_indices]
+        min_points = [(tau[i], gamma_smooth[i]) for i in min_indices]
+        
+        # 根据tau范围过滤极值点
+        if tau_min != -1 or tau_max != -1:
+            max_points = filter_points_by_tau(max_points, tau_min, tau_max)
+            min_points = filter_points_by_tau(min_points, tau_min, tau_max)
+        
+        # 为每个文件绘制单独的图
+        plot_single_file(output_dir, filename, voltage, tau, gamma, max_points, min_points, gamma_smooth)
+        
+        # 保存极值点到新文件
+        save_extrema_points(output_dir, filename, voltage, max_points, min_points)
+        
+        # 添加到汇总列表
+        all_voltage_values.append(voltage)
+        
+        # 为每个极值点添加对应的电压信息
+        max_with_voltage = [(voltage, x, y) for x, y in max_points]
+        min_with_voltage = [(voltage, x, y) for x, y in min_points]
+        
+        all_max_points.extend(max_with_voltage)
+        all_min_points.extend(min_with_voltage)
     
     # 按电压值排序
     sorted_indices = np.argsort(all_voltage_values)
@@ -106,30 +116,11 @@ def filter_points_by_tau(points, tau_min, tau_max):
 def read_data_file(file_path):
     """读取数据文件，跳过头部信息，提取tau和gamma值"""
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            
-            # 找到"tau, gamma(tau)"所在行
-            data_start = 0
-            for i, line in enumerate(lines):
-                if "tau, gamma(tau)" in line:
-                    data_start = i + 1
-                    break
-            
-            # 提取数据
-            tau = []
-            gamma = []
-            for line in lines[data_start:]:
-                if line.strip():  # 跳过空行
-                    parts = line.strip().split(',')
-                    if len(parts) == 2:
-                        try:
-                            tau.append(float(parts[0]))
-                            gamma.append(float(parts[1]))
-                        except ValueError:
-                            continue
-            
-            return np.array(tau), np.array(gamma)
+        # 统一解析器自动定位 "tau, gamma(tau)" 之后的数据区并整体转换
+        _, data = chi_parser.read_chi_text(file_path)
+        if data.shape[0] < 2:
+            return np.array([]), np.array([])
+        return data[0], data[1]
     except Exception as e:
         print(f"读取文件 {file_path} 时出错: {e}")
         return None, None
@@ -148,7 +139,8 @@ def save_extrema_points(output_dir, original_filename, voltage, max_points, min_
     
     with open(output_file, 'w') as file:
         file.write(f"电压值: {voltage}V\n")
-        file.write(f"原始文件: {original_filename}\n\n")
+        file.write(f"原始文件: {original_filename}\n")
+        file.write(f"平滑: {smoothing.describe()}（极值取自平滑后的 gamma）\n\n")
         
         file.write("极大值点:\n")
         file.write("tau, gamma(tau)\n")
@@ -160,13 +152,15 @@ def save_extrema_points(output_dir, original_filename, voltage, max_points, min_
         for tau, gamma in min_points:
             file.write(f"{tau:.15e}, {gamma:.15e}\n")
 
-def plot_single_file(output_dir, filename, voltage, tau, gamma, max_points, min_points):
-    """为单个文件绘制图形"""
+def plot_single_file(output_dir, filename, voltage, tau, gamma, max_points, min_points, smoothed=None):
+    """为单个文件绘制图形，给出 smoothed 时同时绘制平滑后的曲线"""
     base_name = os.path.splitext(filename)[0]
     plt.figure(figsize=(12, 8))
     
     # 绘制原始曲线
     plt.plot(tau, gamma, 'k-', linewidth=1, alpha=0.7)
+    if smoothed is not None:
+        plt.plot(tau, smoothed, 'g-', linewidth=1.5, label=f'平滑 {smoothing.describe()}')
     
     # 绘制极值点
     if max_points:
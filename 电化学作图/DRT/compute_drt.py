@@ -0,0 +1,167 @@
+import csv
+import os
+import re
+import sys
+import time
+import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import filedialog, messagebox
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import cache, drt
+
+# Built-in replacement for the MATLAB DRTtools step: reads the {Init E}.txt spectra written by
+# process_eis_files.py and writes DRTtools-style "tau, gamma(tau)" files for voltage_visualizer.py
+# and the DRT_voltage_processor scripts.
+
+PEAK_COLUMNS = ['file', 'voltage', 'tau', 'tau_lower', 'tau_upper', 'gamma', 'gamma_lower', 'gamma_upper', 'detected']
+
+def compute_drt_file(file_path, output_path, lam, options, bootstrap_samples=0):
+    """
+    Invert one spectrum; lam is a number or one of drt.LAMBDA_METHODS. Runs in a worker process.
+    With bootstrap_samples > 0 the inversion is repeated on resampled residuals and the gamma(tau)
+    band is written to uncertainty/<name>_bands.txt; the peaks with their intervals are returned.
+    """
+    freq, z_real, z_imag = drt.read_spectrum(file_path)
+    if isinstance(lam, str):
+        lam, _ = drt.select_lambda(freq, z_real, z_imag, method=lam, **options)
+    if bootstrap_samples:
+        result = drt.bootstrap(freq, z_real, z_imag, samples=bootstrap_samples, seed=0, lam=lam, **options)
+        band_folder = os.path.join(os.path.dirname(output_path), "uncertainty")
+        os.makedirs(band_folder, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(output_path))[0]
+        drt.write_bands(os.path.join(band_folder, f"{base_name}_bands.txt"), result)
+    else:
+        result = drt.solve(freq, z_real, z_imag, lam=lam, **options)
+    drt.write_drt(output_path, result)
+    return result['R_inf'], lam, result.get('peaks', [])
+
+def compute_drt_files(folder_path, output_folder, log_widget, lam=drt.DEFAULT_LAMBDA,
+                      order=drt.DEFAULT_ORDER, basis='gaussian', bootstrap_samples=0, workers=None):
+    filenames = [filename for filename in sorted(os.listdir(folder_path))
+                 if filename.endswith('.txt') and not os.path.isdir(os.path.join(folder_path, filename))]
+    options = {'order': order, 'basis': basis}
+
+    # Files are independent, so they are spread over worker processes; each worker keeps its own
+    # kernel / SVD cache, so spectra measured on the same frequency list are factored once per worker;
+    # cache.worker_init writes each worker's parse-cache index back once when the worker exits
+    start = time.perf_counter()
+    count = 0
+    peak_rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=cache.worker_init) as executor:
+        futures = [executor.submit(compute_drt_file, os.path.join(folder_path, filename),
+                                   os.path.join(output_folder, filename), lam, options, bootstrap_samples)
+                   for filename in filenames]
+        for filename, future in zip(filenames, futures):
+            try:
+                r_inf, chosen, peaks = future.result()
+                count += 1
+                log_widget.insert(tk.END, f"DRT: {filename} (λ = {chosen:.3g}, R_inf = {r_inf:.4g} ohm)\n")
+                voltage_match = re.search(r'(\d+\.\d+)', filename)
+                voltage = float(voltage_match.group(1)) if voltage_match else None
+                peak_rows += [{'file': filename, 'voltage': voltage, **peak} for peak in peaks]
+            except Exception as e:
+                log_widget.insert(tk.END, f"Error processing {filename}: {str(e)}\n")
+
+    if bootstrap_samples:
+        # Peak positions / heights with their bootstrap intervals for every file, one row per peak
+        peak_file = os.path.join(output_folder, "uncertainty", "peak_uncertainty.csv")
+        os.makedirs(os.path.dirname(peak_file), exist_ok=True)
+        with open(peak_file, 'w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.DictWriter(file, fieldnames=PEAK_COLUMNS)
+            writer.writeheader()
+            writer.writerows(peak_rows)
+        log_widget.insert(tk.END, f"Peak intervals ({bootstrap_samples} bootstrap samples) saved to: {peak_file}\n")
+
+    log_widget.insert(tk.END, f"\nDRT complete! {count} spectra in {time.perf_counter() - start:.2f} s.\n"
+                              f"Results saved to: {output_folder}\n")
+    return count
+
+def browse_folder(entry):
+    """Allow user to select a folder."""
+    folder_path = filedialog.askdirectory(title="Select processed_data folder")
+    if folder_path:
+        entry.delete(0, tk.END)
+        entry.insert(0, folder_path)
+
+def start_processing(folder_path_entry, lambda_method_var, lambda_entry, order_var, basis_var, bootstrap_var,
+                     samples_entry, log_widget):
+    folder_path = folder_path_entry.get()
+    if not folder_path:
+        messagebox.showerror("Error", "Please select a folder.")
+        return
+    lam = lambda_method_var.get()
+    if lam == "manual":
+        try:
+            lam = float(lambda_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Regularization parameter must be a number.")
+            return
+    bootstrap_samples = 0
+    if bootstrap_var.get():
+        try:
+            bootstrap_samples = int(samples_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Number of bootstrap samples must be an integer.")
+            return
+
+    output_folder = os.path.join(folder_path, "drt_results")
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    try:
+        count = compute_drt_files(folder_path, output_folder, log_widget, lam=lam,
+                                  order=int(order_var.get()), basis=basis_var.get(),
+                                  bootstrap_samples=bootstrap_samples)
+        messagebox.showinfo("DRT Complete", f"{count} spectra processed.\nResults saved to: {output_folder}")
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+def create_main_window():
+    root = tk.Tk()
+    root.title("DRT Inversion")
+
+    tk.Label(root, text="Select processed_data folder:").grid(row=0, column=0, sticky="w")
+    folder_path_entry = tk.Entry(root, width=50)
+    folder_path_entry.grid(row=0, column=1)
+    tk.Button(root, text="Browse", command=lambda: browse_folder(folder_path_entry)).grid(row=0, column=2)
+
+    # Same defaults as DRTtools: lambda = 1e-3, 1st order derivative, Gaussian RBF.
+    # GCV / L-curve / discrepancy pick lambda per file; the chosen value is written into each result file.
+    tk.Label(root, text="Regularization parameter (λ):").grid(row=1, column=0, sticky="w")
+    lambda_method_var = tk.StringVar(value="manual")
+    tk.OptionMenu(root, lambda_method_var, "manual", *drt.LAMBDA_METHODS).grid(row=1, column=1, sticky="w")
+    lambda_entry = tk.Entry(root, width=12)
+    lambda_entry.insert(0, str(drt.DEFAULT_LAMBDA))
+    lambda_entry.grid(row=1, column=2, sticky="w")
+
+    tk.Label(root, text="Regularization derivative:").grid(row=2, column=0, sticky="w")
+    order_var = tk.StringVar(value=str(drt.DEFAULT_ORDER))
+    tk.OptionMenu(root, order_var, "0", "1", "2").grid(row=2, column=1, sticky="w")
+
+    tk.Label(root, text="Discretization:").grid(row=3, column=0, sticky="w")
+    basis_var = tk.StringVar(value='gaussian')
+    tk.OptionMenu(root, basis_var, *drt.BASES).grid(row=3, column=1, sticky="w")
+
+    # Bootstrap: repeat the inversion on resampled residuals to get intervals for gamma(tau) and the peaks
+    bootstrap_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Bootstrap uncertainty, samples:", variable=bootstrap_var).grid(row=4, column=0, sticky="w")
+    samples_entry = tk.Entry(root, width=12)
+    samples_entry.insert(0, str(drt.BOOTSTRAP_SAMPLES))
+    samples_entry.grid(row=4, column=1, sticky="w")
+
+    tk.Label(root, text="Processing Log:").grid(row=5, column=0, sticky="w")
+    log_widget = tk.Text(root, width=80, height=20, wrap=tk.WORD)
+    log_widget.grid(row=6, column=0, columnspan=3)
+    log_widget.insert(tk.END, "Logs will appear here...\n")
+
+    process_button = tk.Button(root, text="Start DRT",
+                               command=lambda: start_processing(folder_path_entry, lambda_method_var, lambda_entry,
+                                                                order_var, basis_var, bootstrap_var, samples_entry,
+                                                                log_widget))
+    process_button.grid(row=7, column=0, columnspan=3)
+
+    root.mainloop()
+
+if __name__ == "__main__":
+    create_main_window()
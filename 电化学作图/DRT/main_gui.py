@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import messagebox
 import subprocess
+import sys
 import os
 
 # Function to run process_charge_discharge.py
@@ -18,15 +19,25 @@ def run_process_charge_discharge(log_widget):
 # Function to run process_eis_files.py
 def run_process_eis_files(log_widget):
     try:
-        # Adjust the path to the script based on your local setup
-        script_path = r"E:\Matlab\DRTtools-master\import file samples\process_eis_files.py"
-        result = subprocess.run(['python', script_path], capture_output=True, text=True)
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "process_eis_files.py")
+        result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
         log_widget.insert(tk.END, result.stdout)
         log_widget.insert(tk.END, result.stderr)
         log_widget.insert(tk.END, "Process completed for EIS files.\n")
     except Exception as e:
         log_widget.insert(tk.END, f"Error: {str(e)}\n")
 
+# Function to run compute_drt.py (built-in DRT inversion, replaces the MATLAB DRTtools step)
+def run_compute_drt(log_widget):
+    try:
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compute_drt.py")
+        result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
+        log_widget.insert(tk.END, result.stdout)
+        log_widget.insert(tk.END, result.stderr)
+        log_widget.insert(tk.END, "Process completed for DRT inversion.\n")
+    except Exception as e:
+        log_widget.insert(tk.END, f"Error: {str(e)}\n")
+
 # Function to run voltage_visualizer.py
 def run_voltage_visualizer(log_widget):
     try:
@@ -50,7 +61,7 @@ def create_main_window():
     log_label.grid(row=0, column=0, sticky="w")
 
     log_widget = tk.Text(root, width=80, height=20, wrap=tk.WORD)
-    log_widget.grid(row=1, column=0, columnspan=3)
+    log_widget.grid(row=1, column=0, columnspan=4)
     log_widget.insert(tk.END, "Logs will appear here...\n")
 
     # Button to run process_charge_discharge.py
@@ -63,14 +74,19 @@ def create_main_window():
                                    command=lambda: run_process_eis_files(log_widget))
     process_eis_button.grid(row=2, column=1, pady=10)
 
+    # Button to run compute_drt.py
+    compute_drt_button = tk.Button(root, text="Run DRT Inversion",
+                                   command=lambda: run_compute_drt(log_widget))
+    compute_drt_button.grid(row=2, column=2, pady=10)
+
     # Button to run voltage_visualizer.py
     voltage_visualizer_button = tk.Button(root, text="Run Voltage Visualizer",
                                           command=lambda: run_voltage_visualizer(log_widget))
-    voltage_visualizer_button.grid(row=2, column=2, pady=10)
+    voltage_visualizer_button.grid(row=2, column=3, pady=10)
 
     # Exit button
     exit_button = tk.Button(root, text="Exit", command=root.quit)
-    exit_button.grid(row=3, column=0, columnspan=3)
+    exit_button.grid(row=3, column=0, columnspan=4)
 
     root.mainloop()
 
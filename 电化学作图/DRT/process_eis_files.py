@@ -1,75 +1,51 @@
 import os
-import re
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import numpy as np
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import chi_parser
+
 def process_eis_files(folder_path, output_folder, log_widget):
     # Process each file in the folder
     processed_count = 0
     log_file = open("eis_processing_log.txt", "w")  # Open log file for writing
 
-    for filename in os.listdir(folder_path):
+    filenames = os.listdir(folder_path)
+    for filename in filenames:
         file_path = os.path.join(folder_path, filename)
         
         # Skip directories and non-text files
         if os.path.isdir(file_path) or not (filename.endswith('.txt') or filename.endswith('.bin')):
             continue
+        # A raw .bin next to its text export would be written to the same output file; use the export
+        if filename.endswith('.bin') and chi_parser.select_export(filenames, os.path.splitext(filename)[0]) != filename:
+            continue
             
         try:
-            # Read the file content
-            with open(file_path, 'r') as file:
-                content = file.readlines()
+            # Parse header metadata and the numeric block in one pass (.bin files go to chi_binary)
+            meta, data = chi_parser.read_chi_file(file_path)
+            data = np.atleast_2d(np.asarray(data, dtype=np.float64))
                 
-            # Extract Init E value for renaming
-            init_e_value = None
-            for line in content:
-                if "Init E (V) =" in line:
-                    match = re.search(r'Init E \(V\) = ([-+]?\d*\.\d+|\d+)', line)
-                    if match:
-                        init_e_value = match.group(1)
-                    break
+            # Extract Init E value for renaming; text exports keep the header's own formatting (e.g. -0.10)
+            init_e_value = meta.get("Init E (V)")
+            if not isinstance(init_e_value, (int, float)):
+                init_e_value = None
+            elif filename.endswith('.txt'):
+                init_e_value = chi_parser.header_text(file_path, "Init E (V)") or init_e_value
             
-            if not init_e_value:
+            if init_e_value is None:
                 log_msg = f"Could not find Init E value in {filename}, skipping...\n"
                 log_widget.insert(tk.END, log_msg)
                 log_file.write(log_msg)
                 continue
                 
-            # Find where data begins (typically after headers)
-            data_lines = []
-            
-            # For EIS-1--1.txt format
-            if "Freq/Hz, Z'/ohm, Z\"/ohm" in ''.join(content):
-                for line in content:
-                    # Skip empty lines
-                    if line.strip() == "":
-                        continue
-                    
-                    # Check if this line contains numeric data
-                    parts = line.strip().split(',')
-                    if len(parts) >= 3 and is_numeric(parts[0].strip()):
-                        freq = float(parts[0].strip())
-                        z_real = float(parts[1].strip())
-                        z_imag = float(parts[2].strip())
-                        data_lines.append(f"{freq:15.6f} {z_real:15.6f} {z_imag:15.6f}\n")
+            # Works for both the CHI "Freq/Hz, Z'/ohm, Z\"/ohm" export and the
+            # space separated demo.txt format: first three columns are freq, Z', Z"
+            data_lines = data[:3].T if data.shape[0] >= 3 else np.empty((0, 3))
             
-            # For demo.txt format which is already close to desired format
-            else:
-                for line in content:
-                    # Skip empty lines
-                    if line.strip() == "":
-                        continue
-                    
-                    # Check if this line looks like data (3 space-separated numbers)
-                    parts = line.strip().split()
-                    if len(parts) >= 3 and all(is_numeric(part) for part in parts[:3]):
-                        freq = float(parts[0])
-                        z_real = float(parts[1])
-                        z_imag = float(parts[2])
-                        data_lines.append(f"{freq:15.6f} {z_real:15.6f} {z_imag:15.6f}\n")
-            
-            if not data_lines:
+            if len(data_lines) == 0:
                 log_msg = f"No valid data found in {filename}, skipping...\n"
                 log_widget.insert(tk.END, log_msg)
                 log_file.write(log_msg)
@@ -80,8 +56,7 @@ def process_eis_files(folder_path, output_folder, log_widget):
             output_path = os.path.join(output_folder, output_filename)
             
             # Write processed data to new file
-            with open(output_path, 'w') as outfile:
-                outfile.writelines(data_lines)
+            np.savetxt(output_path, data_lines, fmt='%15.6f', delimiter=' ')
                 
             processed_count += 1
             log_msg = f"Processed: {filename} → {output_filename}\n"
@@ -100,14 +75,6 @@ def process_eis_files(folder_path, output_folder, log_widget):
 
     return processed_count
 
-def is_numeric(value):
-    """Check if a string can be converted to a float."""
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
-
 def browse_folder(entry):
     """Allow user to select a folder."""
     folder_path = filedialog.askdirectory(title="Select folder containing EIS files")
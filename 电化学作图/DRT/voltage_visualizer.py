@@ -6,6 +6,9 @@ from scipy.signal import find_peaks
 import tkinter as tk
 from tkinter import filedialog, simpledialog
 import matplotlib
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import chi_parser, drt, smoothing
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -68,6 +71,20 @@ def create_main_window():
     y_spacing_entry.insert(0, str(y_spacing))
     y_spacing_entry.grid(row=2, column=1)
 
+    # 联合反演：直接选择 process_eis_files.py 生成的 processed_data 文件夹，对整个电压序列一起做 DRT
+    joint_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="联合反演（选择 EIS 谱文件夹）", variable=joint_var).grid(row=6, column=0, columnspan=2)
+
+    tk.Label(root, text="τ 方向正则化 λ:").grid(row=7, column=0)
+    lambda_entry = tk.Entry(root)
+    lambda_entry.insert(0, str(drt.DEFAULT_LAMBDA))
+    lambda_entry.grid(row=7, column=1)
+
+    tk.Label(root, text="电压方向平滑 μ:").grid(row=8, column=0)
+    mu_entry = tk.Entry(root)
+    mu_entry.insert(0, str(drt.DEFAULT_MU))
+    mu_entry.grid(row=8, column=1)
+
     # 创建文件夹选择按钮
     def browse_folder():
         folder_path = filedialog.askdirectory(title="请选择包含数据文件的文件夹")
@@ -104,24 +121,27 @@ def create_main_window():
         # 存储所有文件的数据
         all_data = []
 
-        # 处理文件夹中的所有.txt文件
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".txt"):
-                voltage_match = re.search(r'(\d+\.\d+)', filename)
-                if voltage_match:
-                    voltage = float(voltage_match.group(1))
-                    print(f"处理文件: {filename}, 电压值: {voltage}V")
+        if joint_var.get():
+            all_data = read_joint_drt(folder_path, output_dir, float(lambda_entry.get()), float(mu_entry.get()))
+        else:
+            # 处理文件夹中的所有.txt文件
+            for filename in os.listdir(folder_path):
+                if filename.endswith(".txt"):
+                    voltage_match = re.search(r'(\d+\.\d+)', filename)
+                    if voltage_match:
+                        voltage = float(voltage_match.group(1))
+                        print(f"处理文件: {filename}, 电压值: {voltage}V")
 
-                    file_path = os.path.join(folder_path, filename)
-                    tau, gamma = read_data_file(file_path)
+                        file_path = os.path.join(folder_path, filename)
+                        tau, gamma = read_data_file(file_path)
 
-                    if tau is not None and gamma is not None and len(tau) > 0 and len(gamma) > 0:
-                        mask = (tau >= X_MIN) & (tau <= X_MAX)
-                        tau_filtered = tau[mask]
-                        gamma_filtered = gamma[mask]
+                        if tau is not None and gamma is not None and len(tau) > 0 and len(gamma) > 0:
+                            mask = (tau >= X_MIN) & (tau <= X_MAX)
+                            tau_filtered = tau[mask]
+                            gamma_filtered = gamma[mask]
 
-                        if len(tau_filtered) > 0:
-                            all_data.append((voltage, tau_filtered, gamma_filtered))
+                            if len(tau_filtered) > 0:
+                                all_data.append((voltage, tau_filtered, gamma_filtered))
 
         all_data.sort(key=lambda x: x[0])
 
@@ -148,13 +168,26 @@ def create_main_window():
         print(f"已选择电压区间: {min_voltage}V - {max_voltage}V")
         print(f"包含的数据文件数量: {len(filtered_data)}")
 
+        # 全部曲线一次批量平滑，之后的曲线与峰值标记都基于平滑后的 γ(τ)
+        smoothed = smoothing.smooth([g for _, _, g in filtered_data])
+        filtered_data = [(v, t, s) for (v, t, _), s in zip(filtered_data, smoothed)]
+        print(f"γ(τ) 平滑: {smoothing.describe()}")
+
         # 绘图操作
         if filtered_data:
+            # 联合反演的结果本身就在同一 τ 网格上，γ(τ, V) 矩阵直接用于热图，不再逐条插值
+            grid = None
+            if joint_var.get():
+                grid = (filtered_data[0][1], [v for v, _, _ in filtered_data], np.array([g for _, _, g in filtered_data]))
+
+            with open(os.path.join(output_dir, 'smoothing_parameters.txt'), 'w', encoding='utf-8') as file:
+                file.write(f"{smoothing.describe()}\n")
+
             plot_2d_curves(filtered_data, output_dir, min_voltage, max_voltage, with_markers=True)
             plot_2d_curves(filtered_data, output_dir, min_voltage, max_voltage, with_markers=False)
 
-            plot_heatmap_with_markers(filtered_data, output_dir, min_voltage, max_voltage)
-            plot_heatmap_plain(filtered_data, output_dir, min_voltage, max_voltage)
+            plot_heatmap_with_markers(filtered_data, output_dir, min_voltage, max_voltage, grid=grid)
+            plot_heatmap_plain(filtered_data, output_dir, min_voltage, max_voltage, grid=grid)
 
             plot_mountain_view(filtered_data, output_dir, min_voltage, max_voltage, with_markers=True)
             plot_mountain_view(filtered_data, output_dir, min_voltage, max_voltage, with_markers=False)
@@ -170,40 +203,48 @@ def create_main_window():
 
     root.mainloop()
 
+def read_joint_drt(folder_path, output_dir, lam, mu):
+    """读取文件夹中文件名带电压的 EIS 谱并联合反演，返回与 read_data_file 结果相同结构的 [(电压, tau, gamma)]"""
+    spectra = []
+    for filename in os.listdir(folder_path):
+        voltage_match = re.search(r'(\d+\.\d+)', filename)
+        if filename.endswith(".txt") and voltage_match:
+            try:
+                spectra.append((float(voltage_match.group(1)), *drt.read_spectrum(os.path.join(folder_path, filename))))
+            except Exception as e:
+                print(f"读取文件 {filename} 时出错: {e}")
+    if not spectra:
+        return []
+
+    print(f"联合反演 {len(spectra)} 条 EIS 谱...")
+    result = drt.solve_joint(spectra, lam=lam, mu=mu)
+
+    # 同时按 DRTtools 格式保存每个电压的结果
+    joint_dir = os.path.join(output_dir, "joint_drt")
+    os.makedirs(joint_dir, exist_ok=True)
+    mask = (result['tau'] >= X_MIN) & (result['tau'] <= X_MAX)
+    all_data = []
+    for i, voltage in enumerate(result['voltages']):
+        drt.write_drt(os.path.join(joint_dir, f"{voltage}.txt"),
+                      {'tau': result['tau'], 'gamma': result['gamma'][i], 'R_inf': result['R_inf'][i], 'L': result['L'][i]})
+        all_data.append((voltage, result['tau'][mask], result['gamma'][i][mask]))
+    return all_data
+
 def read_data_file(file_path):
     """读取数据文件，跳过头部信息，提取tau和gamma值"""
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            
-            # 找到"tau, gamma(tau)"所在行
-            data_start = 0
-            for i, line in enumerate(lines):
-                if "tau, gamma(tau)" in line:
-                    data_start = i + 1
-                    break
-            
-            # 提取数据
-            tau = []
-            gamma = []
-            for line in lines[data_start:]:
-                if line.strip():  # 跳过空行
-                    parts = line.strip().split(',')
-                    if len(parts) == 2:
-                        try:
-                            tau.append(float(parts[0]))
-                            gamma.append(float(parts[1]))
-                        except ValueError:
-                            continue
-            
-            return np.array(tau), np.array(gamma)
+        # 统一解析器自动定位 "tau, gamma(tau)" 之后的数据区并整体转换
+        _, data = chi_parser.read_chi_text(file_path)
+        if data.shape[0] < 2:
+            return np.array([]), np.array([])
+        return data[0], data[1]
     except Exception as e:
         print(f"读取文件 {file_path} 时出错: {e}")
         return None, None
 
 # 定义统一的峰值检测函数
 def find_peaks_unified(gamma):
-    """统一的峰值检测函数，所有图形函数使用相同的峰值检测方法"""
+    """统一的峰值检测函数，所有图形函数使用相同的峰值检测方法；gamma 为 process_data 中批量平滑后的曲线"""
     # 找出所有极大值点
     peaks, _ = find_peaks(gamma)  # 找到所有的局部极大值点
     
@@ -311,8 +352,11 @@ def plot_2d_curves(data, output_dir, min_voltage, max_voltage, with_markers=True
     plt.savefig(os.path.join(output_dir, f'2d_curves_with_legend_{marker_suffix}_{min_voltage}V-{max_voltage}V.png'), dpi=300)
     plt.close(fig)
 
-def plot_heatmap_common_setup(data, num_points=500):
-    """公共数据准备函数"""
+def plot_heatmap_common_setup(data, num_points=500, grid=None):
+    """公共数据准备函数；grid 为已在同一 τ 网格上的 (tau, voltages, gamma_matrix)（联合反演结果）时直接返回"""
+    if grid is not None:
+        return grid
+
     # 创建对数均匀分布的tau网格
     tau_grid = np.logspace(np.log10(X_MIN), np.log10(X_MAX), num_points)
     
@@ -344,10 +388,10 @@ def plot_heatmap_common_setup(data, num_points=500):
     return tau_grid, voltages, gamma_matrix
 
 # 带标记版本
-def plot_heatmap_with_markers(data, output_dir, min_voltage, max_voltage):
+def plot_heatmap_with_markers(data, output_dir, min_voltage, max_voltage, grid=None):
     """生成带极值点标记的热图"""
     # 公共数据准备
-    tau_grid, voltages, gamma_matrix = plot_heatmap_common_setup(data)
+    tau_grid, voltages, gamma_matrix = plot_heatmap_common_setup(data, grid=grid)
     
     # 创建图形
     fig, ax = plt.subplots(figsize=(6, 4))
@@ -398,10 +442,10 @@ def plot_heatmap_with_markers(data, output_dir, min_voltage, max_voltage):
     _save_figure(output_dir, min_voltage, max_voltage, "with_markers")
 
 # 无标记版本
-def plot_heatmap_plain(data, output_dir, min_voltage, max_voltage):
+def plot_heatmap_plain(data, output_dir, min_voltage, max_voltage, grid=None):
     """生成无标记的纯净热图"""
     # 公共数据准备
-    tau_grid, voltages, gamma_matrix = plot_heatmap_common_setup(data)
+    tau_grid, voltages, gamma_matrix = plot_heatmap_common_setup(data, grid=grid)
     
     # 创建图形
     fig, ax = plt.subplots(figsize=(6, 4))
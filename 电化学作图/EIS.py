@@ -9,7 +9,7 @@
 # 2. 支持生成多种数据可视化图表，包括：
 #    - Nyquist图
 #    - Mountain图
-#    - Heatmap图
+#    - Heatmap图（可选择 Z' 网格分辨率，以及同一格子取最后一个点或平均值）
 #    - 3D表面图
 # 3. 提供数据处理和图像保存功能，生成的数据和图像会自动保存为文件。
 # 4. 提供结果保存功能，将所有图表和数据保存为Excel文件及PNG图像。
@@ -23,7 +23,7 @@
 # 作者：Roc_Huang
 
 import os
-import re
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -36,6 +36,9 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 import seaborn as sns
 from mpl_toolkits.mplot3d import Axes3D
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from echem import chi_parser, eis_grid
+
 class EISAnalyzer:
     def __init__(self, root):
         self.root = root
@@ -70,6 +73,16 @@ class EISAnalyzer:
         self.heatmap_btn = tk.Button(self.button_frame, text="Heatmap", command=self.create_heatmap, state=tk.DISABLED)
         self.heatmap_btn.pack(side=tk.LEFT, padx=5)
         
+        # Heatmap grid options: Z' resolution and how points in the same cell are combined
+        self.resolution_var = tk.IntVar(value=100)
+        self.resolution_spin = tk.Spinbox(self.button_frame, from_=10, to=2000, increment=10, width=5,
+                                          textvariable=self.resolution_var, command=self.create_heatmap)
+        self.resolution_spin.pack(side=tk.LEFT)
+        self.grid_mode_var = tk.StringVar(value=eis_grid.MODES[0])
+        self.grid_mode_menu = tk.OptionMenu(self.button_frame, self.grid_mode_var, *eis_grid.MODES,
+                                            command=lambda _: self.create_heatmap())
+        self.grid_mode_menu.pack(side=tk.LEFT, padx=(0, 5))
+        
         self.surface_btn = tk.Button(self.button_frame, text="3D Surface", command=self.create_3d_surface, state=tk.DISABLED)
         self.surface_btn.pack(side=tk.LEFT, padx=5)
         
@@ -99,6 +112,7 @@ class EISAnalyzer:
         # Data storage
         self.combined_df = None
         self.output_dir = None
+        self.heatmap_cache = None  # (resolution, mode) -> grid, reused across redraws
         
     def select_files(self):
         filetypes = [("Text files", "*.txt"), ("All files", "*.*")]
@@ -111,54 +125,41 @@ class EISAnalyzer:
         else:
             self.status_label.config(text="No files selected")
     
-    def extract_voltage(self, file_content):
-        voltage_match = re.search(r"Init E \(V\) = ([-+]?\d*\.\d+|\d+)", file_content)
-        if voltage_match:
-            return float(voltage_match.group(1))
+    def extract_voltage(self, meta):
+        voltage = meta.get("Init E (V)")
+        if isinstance(voltage, (int, float)):
+            return float(voltage)
         return None
     
-    def extract_impedance_data(self, file_content):
-        # Skip header lines and extract impedance data
-        lines = file_content.split("\n")
-        data = []
-        data_started = False
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith("Freq/Hz"):
-                data_started = True
-                continue
-            
-            if data_started and line:
-                parts = line.split(",")
-                if len(parts) >= 4:
-                    try:
-                        freq = float(parts[0].strip())
-                        z_real = float(parts[1].strip())
-                        z_imag = float(parts[2].strip())
-                        z_abs = float(parts[3].strip())
-                        phase = float(parts[4].strip()) if len(parts) > 4 else 0.0
-                        data.append([freq, z_real, z_imag, z_abs, phase])
-                    except ValueError:
-                        continue
-        
-        return pd.DataFrame(data, columns=["Frequency", "Z_real", "Z_imag", "Z_abs", "Phase"])
+    def extract_impedance_data(self, data):
+        # Columns from the shared CHI parser: Freq, Z', Z", |Z|, Phase
+        if data.shape[0] < 4 or data.shape[1] == 0:
+            return pd.DataFrame(columns=["Frequency", "Z_real", "Z_imag", "Z_abs", "Phase"])
+        
+        phase = data[4] if data.shape[0] > 4 else np.zeros(data.shape[1])
+        return pd.DataFrame({
+            "Frequency": data[0],
+            "Z_real": data[1],
+            "Z_imag": data[2],
+            "Z_abs": data[3],
+            "Phase": phase,
+        })
     
     def process_data(self):
         self.data_frames = []
         self.voltage_values = []
+        self.heatmap_cache = None
         
         for file_path in self.files:
             try:
-                with open(file_path, "r") as f:
-                    content = f.read()
+                meta, data = chi_parser.read_chi_text(file_path)
                 
-                voltage = self.extract_voltage(content)
+                voltage = self.extract_voltage(meta)
                 if voltage is None:
                     messagebox.showwarning("Warning", f"Could not extract voltage from {os.path.basename(file_path)}")
                     continue
                 
-                df = self.extract_impedance_data(content)
+                df = self.extract_impedance_data(data)
                 if df.empty:
                     messagebox.showwarning("Warning", f"Could not extract impedance data from {os.path.basename(file_path)}")
                     continue
@@ -268,6 +269,27 @@ class EISAnalyzer:
         self.fig.tight_layout()
         self.canvas.draw()
     
+    def get_heatmap_grid(self):
+        try:
+            resolution = max(int(self.resolution_var.get()), 2)
+        except (tk.TclError, ValueError):
+            resolution = 100
+        key = (resolution, self.grid_mode_var.get())
+        if self.heatmap_cache is not None and self.heatmap_cache[0] == key:
+            return self.heatmap_cache[1]
+        
+        # Sort spectra by voltage, then map every point onto the Z' grid in one vectorized step
+        sorted_indices = np.argsort(self.voltage_values, kind='stable')
+        z_real_arrays = [self.data_frames[i]["Z_real"].to_numpy() for i in sorted_indices]
+        z_imag_arrays = [-self.data_frames[i]["Z_imag"].to_numpy() for i in sorted_indices]
+        voltage_values = sorted(self.voltage_values)
+        
+        z_real_values = eis_grid.z_real_axis(z_real_arrays, resolution)
+        grid_data = eis_grid.grid_spectra(z_real_arrays, z_imag_arrays, z_real_values, mode=key[1])
+        
+        self.heatmap_cache = (key, (z_real_values, voltage_values, grid_data))
+        return self.heatmap_cache[1]
+    
     def create_heatmap(self):
         if not self.data_frames:
             return
@@ -276,35 +298,7 @@ class EISAnalyzer:
         self.fig.clear()
         ax = self.fig.add_subplot(111)
         
-        # Sort data frames by voltage
-        sorted_indices = np.argsort(self.voltage_values)
-        sorted_data_frames = [self.data_frames[i] for i in sorted_indices]
-        sorted_voltages = [self.voltage_values[i] for i in sorted_indices]
-        
-        # Create interpolated grid for Z_real vs Voltage
-        z_real_values = set()
-        
-        for df in self.data_frames:
-            z_real_values.update(df["Z_real"].values)
-        
-        z_real_values = sorted(z_real_values)
-        voltage_values = sorted(self.voltage_values)
-        
-        # Filter z_real values to avoid too many points
-        if len(z_real_values) > 100:
-            z_real_values = np.linspace(min(z_real_values), max(z_real_values), 100)
-            
-        # Create a grid of Z_imag values
-        grid_data = np.zeros((len(voltage_values), len(z_real_values)))
-        
-        # Fill the grid with -Z_imag values
-        for v_idx, (df, voltage) in enumerate(zip(sorted_data_frames, sorted_voltages)):
-            for _, row in df.iterrows():
-                try:
-                    z_real_idx = np.abs(np.array(z_real_values) - row["Z_real"]).argmin()
-                    grid_data[v_idx, z_real_idx] = -row["Z_imag"]
-                except:
-                    continue
+        z_real_values, voltage_values, grid_data = self.get_heatmap_grid()
         
         # Create heatmap
         im = ax.pcolormesh(z_real_values, voltage_values, grid_data, shading='auto', cmap='viridis')
@@ -3,11 +3,18 @@ import matplotlib.pyplot as plt
 plt.rcParams['font.family'] = 'serif'  # 或者其他字体
 
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import gridspec
 from tkinter import Tk, filedialog
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import ensemble, linkk, manifest, nyquist, ohmic, overpotential, tafel
+
+# iR 补偿比例，1.0 为完全补偿
+IR_COMPENSATION = ohmic.COMPENSATION
+
 # 使用 Tkinter 选择主文件夹
 def select_folder():
     root = Tk()
@@ -15,69 +22,22 @@ def select_folder():
     folder_path = filedialog.askdirectory(title="选择包含数据的主文件夹")
     return folder_path
 
-# 获取溶液电阻，即 EIS 文件中 data["Z'"] 的第一个数据
-def get_resistance_value(eis_file_path):
+# 获取用于 iR 校正的溶液电阻：EIS 高频段 Z'' = 0 的交点（见 echem.ohmic），乘以补偿比例 IR_COMPENSATION
+def get_resistance_value(experiment):
     try:
-        eis_data = pd.read_csv(eis_file_path, skiprows=21, header=None, names=['Freq', "Z'", "Z''", 'Z', 'Phase'])
-        resistance = eis_data["Z'"].iloc[0]  # 取出第一个 Z' 数据
+        # EIS 数据在本次运行中只读取一次，Nyquist 图与 LSV 校准共用；主程序中已一次性估计全部样品的 Rs
+        resistance = ohmic.resistance(experiment, compensation=IR_COMPENSATION)
+        if resistance is None:
+            raise FileNotFoundError("没有 EIS 文件")
         return resistance
     except (FileNotFoundError, IndexError, ValueError) as e:
-        print(f"读取 EIS 文件 {eis_file_path} 失败: {e}")
+        print(f"读取 {experiment['name']} 的 EIS 文件失败: {e}")
         return None
 
-# 计算过电位
-def calculate_overpotential(voltage, current_density):
-    calibrated_voltage = voltage + 0.652 - 1.23
-    return calibrated_voltage
-
 # 处理每个子文件夹的 EIS 文件，并在同一张图上绘制多个 Nyquist 图
-def process_eis_files(ax, main_folder):
-    color_cycle = plt.cm.tab20.colors  # 使用颜色循环
-    color_index = 0  # 颜色索引
-
-    max_z_prime = 0
-    max_z_double_prime = 0
-
-    # 第一遍，确定所有文件的最大 Z' 和 Z'' 值
-    for subdir, _, files in os.walk(main_folder):
-        for file in files:
-            if file.lower() == 'eis.txt':
-                file_path = os.path.join(subdir, file)
-                
-                # 读取 EIS.txt 数据
-                data = pd.read_csv(file_path, skiprows=21, header=None, names=['Freq', "Z'", "Z''", 'Z', 'Phase'])
-                
-                # 提取第二列和第三列数据
-                x = data["Z'"]
-                y = data["Z''"]
-
-                # 更新最大值
-                max_z_prime = max(max_z_prime, max(x))
-                max_z_double_prime = max(max_z_double_prime, abs(min(y)))
-
-    # 设置轴范围
-    max_abs = max(max_z_prime, max_z_double_prime)
-    ax.set_xlim(0, max_abs)  # Z' axis from 0 to max_abs
-    ax.set_ylim(-max_abs, 0)  # Z'' axis from -max_abs to 0
-
-    # 第二遍，绘制图形
-    for subdir, _, files in os.walk(main_folder):
-        subfolder_name = os.path.basename(subdir)
-        
-        for file in files:
-            if file.lower() == 'eis.txt':
-                file_path = os.path.join(subdir, file)
-                
-                # 读取 EIS.txt 数据
-                data = pd.read_csv(file_path, skiprows=21, header=None, names=['Freq', "Z'", "Z''", 'Z', 'Phase'])
-                
-                # 提取第二列和第三列数据
-                x = data["Z'"]
-                y = data["Z''"]
-
-                # Plot configuration for each subfolder with different color
-                ax.plot(x, y, marker='o', label=subfolder_name, color=color_cycle[color_index % len(color_cycle)])
-                color_index += 1
+def process_eis_files(ax, experiments):
+    # 每个 EIS 文件只读取一次，边读边更新坐标范围，所有曲线合并为一个集合对象绘制
+    handles = nyquist.overlay(ax, nyquist.iter_spectra(experiments), colors=plt.cm.tab20.colors)
 
     # Invert y-axis to keep Z'' negative values downward
     ax.invert_yaxis()
@@ -86,65 +46,51 @@ def process_eis_files(ax, main_folder):
     ax.set_xlabel("Z' (Ω·cm²)")
     ax.set_ylabel("Z'' (Ω·cm²)")
     ax.grid(True)
-    ax.legend(loc='best')  # 显示图例
+    ax.legend(handles=handles, loc='best')  # 显示图例
 
 # 处理每个子文件夹的 LSV 文件并绘制对比图
-def process_lsv_files(ax, main_folder):
-    overpotential_data = []
+def process_lsv_files(ax, experiments):
+    names, curves, resistances, kk_valid = [], [], [], []
 
-    for subdir, _, files in os.walk(main_folder):
-        subfolder_name = os.path.basename(subdir)
-        eis_file_path = os.path.join(subdir, 'EIS.txt')
-        resistance = get_resistance_value(eis_file_path)  # 获取电阻值
+    for experiment in experiments:
+        subfolder_name = experiment['name']
+        resistance = get_resistance_value(experiment)  # 获取电阻值
 
         # 跳过没有电阻值的子文件夹
         if resistance is None:
             print(f"子文件夹 {subfolder_name} 没有有效的电阻值，跳过该文件夹。")
             continue
 
-        for file in files:
-            if file.lower() == 'lsv.txt':
-                file_path = os.path.join(subdir, file)
-
-                # 读取 lsv.txt 数据，从第 20 行开始，跳过文件头部信息
-                try:
-                    data = pd.read_csv(file_path, skiprows=20, header=None, names=['Potential', 'Current'])
-                    if data.empty:
-                        print(f"文件 {file_path} 没有数据")
-                        continue
-                except ValueError as e:
-                    print(f"文件 {file_path} 读取失败: {e}")
-                    continue
-
-                # 确保 'Potential' 和 'Current' 列为数值类型
-                data["Potential"] = pd.to_numeric(data["Potential"], errors='coerce')
-                data["Current"] = pd.to_numeric(data["Current"], errors='coerce')
-                data = data.dropna()  # 删除无法转换为数值的行
-
-                # 确保 resistance 为数值
-                if resistance is not None:
-                    resistance = float(resistance)
-
-                # 校准电位和计算电流密度
-                x = data["Potential"] - data["Current"] * resistance
-                current_density = data["Current"] * 1000 / 0.196  # 计算电流密度 (mA/cm^2)
-
-                # 绘制每个文件的 LSV 曲线在同一个图中
-                ax.plot(x, current_density, label=subfolder_name)
-
-                # 计算 10 和 100 mA/cm² 时的过电位
-                overpotential_10 = calculate_overpotential(x[current_density >= 10].iloc[0], 10) if (current_density >= 10).any() else None
-                overpotential_100 = calculate_overpotential(x[current_density >= 100].iloc[0], 100) if (current_density >= 100).any() else None
-
-                overpotential_10 = overpotential_10 if overpotential_10 is not None else 0.0
-                overpotential_100 = overpotential_100 if overpotential_100 is not None else 0.0
-                # 收集每个子文件夹的溶液电阻和过电位数据
-                overpotential_data.append({
-                    "Folder": subfolder_name,
-                    "Resistance (Ω)": resistance,
-                    "Overpotential at 10 mA/cm² (V)": overpotential_10,
-                    "Overpotential at 100 mA/cm² (V)": overpotential_100
-                })
+        # 清单中已优先选择导出的 lsv.txt，没有导出时为原始 lsv.bin
+        file_path = experiment['lsv']
+        if file_path is None:
+            continue
+
+        # 读取 lsv 数据，数据起始行由文件头部确定，各列直接按 float64 读取
+        try:
+            data = manifest.read_frame(experiment, 'lsv')
+            if data.empty:
+                print(f"文件 {file_path} 没有数据")
+                continue
+        except ValueError as e:
+            print(f"文件 {file_path} 读取失败: {e}")
+            continue
+
+        # 确保 resistance 为数值
+        if resistance is not None:
+            resistance = float(resistance)
+
+        # 校准电位和计算电流密度 (mA/cm^2)
+        x, current_density = overpotential.corrected_curve(data["Potential"], data["Current"], resistance)
+
+        # 绘制每个文件的 LSV 曲线在同一个图中
+        ax.plot(x, current_density, label=subfolder_name)
+
+        # 过电位在循环结束后对所有样品一次性计算
+        names.append(subfolder_name)
+        curves.append((x, current_density))
+        resistances.append(resistance)
+        kk_valid.append(experiment['kk']['valid'] if experiment['kk'] is not None else None)
 
     # 绘制 LSV 对比图
     ax.set_xlabel("Calibrated Potential (V)")
@@ -153,7 +99,14 @@ def process_lsv_files(ax, main_folder):
     ax.legend()
     ax.grid(True)
 
-    return overpotential_data
+    # 所有样品在 overpotential.TARGETS 各电流密度下的过电位（插值），达不到的记为 0.0
+    overpotential_data = overpotential.table(names, curves, columns={"Resistance (Ω)": resistances, "KK Valid": kk_valid})
+    for row in overpotential_data:
+        for target in overpotential.TARGETS:
+            if row[overpotential.column_name(target)] is None:
+                row[overpotential.column_name(target)] = 0.0
+
+    return overpotential_data, names, curves
 
 # 生成过电位柱状图
 def plot_overpotential_bar_chart(ax, overpotential_data):
@@ -186,6 +139,33 @@ def plot_overpotential_bar_chart(ax, overpotential_data):
     ax.legend()
     ax.grid(True)
 
+# Tafel 分析：所有样品一次拟合，叠加图与结果表保存在主文件夹（与 Combined_Plots.png 同一目录）
+def save_tafel_analysis(main_folder, names, curves):
+    results = tafel.fit(curves)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    tafel.plot(ax, names, curves, results)
+    ax.legend(fontsize=8)
+    ax.grid(True)
+    fig.tight_layout()
+    plot_path = os.path.join(main_folder, tafel.OUTPUT_PNG)
+    fig.savefig(plot_path, dpi=300)
+    plt.close(fig)
+    print(f"已保存 Tafel 图：{plot_path}")
+
+    csv_path = os.path.join(main_folder, tafel.OUTPUT_CSV)
+    pd.DataFrame(tafel.table(names, results)).to_csv(csv_path, index=False, encoding='utf-8-sig')
+    print(f"Tafel 斜率已保存为 CSV 文件: {csv_path}")
+
+# 重复样品（文件夹名只差末尾编号，见 echem.ensemble.REPLICATE）的 LSV 平均曲线与百分位带，没有重复样品时不输出
+def save_lsv_ensemble(main_folder, names, curves):
+    if len(set(map(ensemble.group_name, names))) == len(names):
+        return
+    grid, values = ensemble.resample_lsv(curves)
+    groups, stats = ensemble.statistics(values, names)
+    png, csv = ensemble.save(main_folder, 'lsv', grid, groups, stats, "Calibrated Potential (V)", "Current Density (mA/cm²)")
+    print(f"已保存重复样品的 LSV 带状图：{png}，统计表：{csv}")
+
 # 主程序
 if __name__ == "__main__":
     main_folder = select_folder()
@@ -198,11 +178,16 @@ if __name__ == "__main__":
         ax2 = fig.add_subplot(gs[0, 1])  # 第一行第二个子图
         ax3 = fig.add_subplot(gs[1, :])   # 第二行的柱状图，占据整行
 
+        # 只遍历一次目录，生成实验清单，后续各步骤共用
+        experiments = list(manifest.crawl(main_folder).values())
+        linkk.validate_experiments(experiments)  # EIS 的 Kramers–Kronig 检验，未通过的样品在图例和结果中标记
+        ohmic.estimate_experiments(experiments)  # 所有样品的 Rs 一次性估计
+
         # 处理并合并 EIS 文件的 Nyquist 图
-        process_eis_files(ax1, main_folder)
+        process_eis_files(ax1, experiments)
 
         # 处理 LSV 文件并获取过电位数据
-        overpotential_data = process_lsv_files(ax2, main_folder)
+        overpotential_data, names, curves = process_lsv_files(ax2, experiments)
 
         # 生成过电位柱状图
         plot_overpotential_bar_chart(ax3, overpotential_data)
@@ -216,5 +201,11 @@ if __name__ == "__main__":
         plt.show()  # 显示图像
         plt.close(fig)
         print(f"已保存合并图像：{save_path}")
+
+        # Tafel 斜率、交换电流密度与拟合区间
+        save_tafel_analysis(main_folder, names, curves)
+
+        # 重复样品的平均曲线与百分位带
+        save_lsv_ensemble(main_folder, names, curves)
     else:
         print("未选择文件夹。")
@@ -1,8 +1,15 @@
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from tkinter import Tk, filedialog
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from echem import circuit, linkk, manifest, ohmic, overpotential
+
+# iR 补偿比例，1.0 为完全补偿
+IR_COMPENSATION = ohmic.COMPENSATION
+
 # 使用 Tkinter 选择主文件夹
 def select_folder():
     root = Tk()
@@ -10,77 +17,62 @@ def select_folder():
     folder_path = filedialog.askdirectory(title="选择包含数据的主文件夹")
     return folder_path
 
-# 获取溶液电阻，即 EIS 文件中 data["Z'"] 的第一个数据
-def get_resistance_value(eis_file_path):
+# 获取用于 iR 校正的溶液电阻：EIS 高频段 Z'' = 0 的交点（见 echem.ohmic），乘以补偿比例 IR_COMPENSATION
+def get_resistance_value(experiment):
     try:
-        eis_data = pd.read_csv(eis_file_path, skiprows=21, header=None, names=['Freq', "Z'", "Z''", 'Z', 'Phase'])
-        resistance = eis_data["Z'"].iloc[0]  # 取出第一个 Z' 数据
+        # EIS 数据在本次运行中只读取一次，Nyquist 图与 LSV 校准共用；主程序中已一次性估计全部样品的 Rs
+        resistance = ohmic.resistance(experiment, compensation=IR_COMPENSATION)
+        if resistance is None:
+            raise FileNotFoundError("没有 EIS 文件")
         return resistance
     except (FileNotFoundError, IndexError, ValueError) as e:
-        print(f"读取 EIS 文件 {eis_file_path} 失败: {e}")
+        print(f"读取 {experiment['name']} 的 EIS 文件失败: {e}")
         return None
 
-# 计算过电位
-def calculate_overpotential(voltage, current_density):
-    calibrated_voltage = voltage + 0.652 - 1.23
-    return calibrated_voltage
-
 # 处理每个子文件夹的 LSV 文件并绘制对比图
-def process_lsv_files(main_folder):
+def process_lsv_files(main_folder, experiments):
     plt.figure(figsize=(10, 8))
-    overpotential_data = []
+    names, curves, resistances, kk_valid = [], [], [], []
 
-    for subdir, _, files in os.walk(main_folder):
-        subfolder_name = os.path.basename(subdir)
-        eis_file_path = os.path.join(subdir, 'EIS.txt')
-        resistance = get_resistance_value(eis_file_path)  # 获取电阻值
+    for experiment in experiments:
+        subfolder_name = experiment['name']
+        resistance = get_resistance_value(experiment)  # 获取电阻值
 
         # 跳过没有电阻值的子文件夹
         if resistance is None:
             print(f"子文件夹 {subfolder_name} 没有有效的电阻值，跳过该文件夹。")
             continue
 
-        for file in files:
-            if file.lower() == 'lsv.txt':
-                file_path = os.path.join(subdir, file)
-
-                # 读取 lsv.txt 数据，从第 20 行开始，跳过文件头部信息
-                try:
-                    data = pd.read_csv(file_path, skiprows=20, header=None, names=['Potential', 'Current'])
-                    if data.empty:
-                        print(f"文件 {file_path} 没有数据")
-                        continue
-                except ValueError as e:
-                    print(f"文件 {file_path} 读取失败: {e}")
-                    continue
-
-                # 确保 'Potential' 和 'Current' 列为数值类型
-                data["Potential"] = pd.to_numeric(data["Potential"], errors='coerce')
-                data["Current"] = pd.to_numeric(data["Current"], errors='coerce')
-                data = data.dropna()  # 删除无法转换为数值的行
-
-                # 确保 resistance 为数值
-                if resistance is not None:
-                    resistance = float(resistance)
-
-                # 校准电位和计算电流密度
-                x = data["Potential"] - data["Current"] * resistance
-                current_density = data["Current"] * 1000 / 0.196  # 计算电流密度 (mA/cm^2)
-
-                # 绘制每个文件的 LSV 曲线在同一个图中
-                plt.plot(x, current_density, label=subfolder_name)
-
-                # 计算 10 和 100 mA/cm² 时的过电位
-                overpotential_10 = calculate_overpotential(x[current_density >= 10].iloc[0], 10) if (current_density >= 10).any() else None
-                overpotential_100 = calculate_overpotential(x[current_density >= 100].iloc[0], 100) if (current_density >= 100).any() else None
-
-                # 收集每个子文件夹的溶液电阻和过电位数据
-                overpotential_data.append({
-                    "Folder": subfolder_name,
-                    "Resistance (Ω)": resistance,
-                    "Overpotential at 10 mA/cm² (V)": overpotential_10,
-                    "Overpotential at 100 mA/cm² (V)": overpotential_100
-                })
+        # 清单中已优先选择导出的 lsv.txt，没有导出时为原始 lsv.bin
+        file_path = experiment['lsv']
+        if file_path is None:
+            continue
+
+        # 读取 lsv 数据，数据起始行由文件头部确定，各列直接按 float64 读取
+        try:
+            data = manifest.read_frame(experiment, 'lsv')
+            if data.empty:
+                print(f"文件 {file_path} 没有数据")
+                continue
+        except ValueError as e:
+            print(f"文件 {file_path} 读取失败: {e}")
+            continue
+
+        # 确保 resistance 为数值
+        if resistance is not None:
+            resistance = float(resistance)
+
+        # 校准电位和计算电流密度 (mA/cm^2)
+        x, current_density = overpotential.corrected_curve(data["Potential"], data["Current"], resistance)
+
+        # 绘制每个文件的 LSV 曲线在同一个图中
+        plt.plot(x, current_density, label=subfolder_name)
+
+        # 过电位在循环结束后对所有样品一次性计算
+        names.append(subfolder_name)
+        curves.append((x, current_density))
+        resistances.append(resistance)
+        kk_valid.append(experiment['kk']['valid'] if experiment['kk'] is not None else None)
 
     # 绘制 LSV 对比图
     plt.xlabel("Calibrated Potential (V)")
@@ -90,6 +82,9 @@ def process_lsv_files(main_folder):
     plt.grid(True)
     plt.show()
 
+    # 所有样品在 overpotential.TARGETS 各电流密度下的过电位（插值），每个样品一行
+    overpotential_data = overpotential.table(names, curves, columns={"Resistance (Ω)": resistances, "KK Valid": kk_valid})
+
     # 对 overpotential_data 按 "Overpotential at 10 mA/cm² (V)" 从小到大排序
     overpotential_data = sorted(overpotential_data, key=lambda d: d["Overpotential at 10 mA/cm² (V)"] or float('inf'))
 
@@ -130,7 +125,16 @@ def process_lsv_files(main_folder):
 if __name__ == "__main__":
     main_folder = select_folder()
     if main_folder:
-        process_lsv_files(main_folder)  # 处理 LSV 文件
+        experiments = list(manifest.crawl(main_folder).values())  # 只遍历一次目录，生成实验清单
+        linkk.validate_experiments(experiments)  # EIS 的 Kramers–Kronig 检验，未通过的样品在结果表中标记
+        ohmic.estimate_experiments(experiments)  # 所有样品的 Rs 一次性估计
+        process_lsv_files(main_folder, experiments)  # 处理 LSV 文件
+
+        # 等效电路拟合（Rs、Rct、Q、n），参数表与 overpotential_data.csv 保存在同一目录
+        circuit_table = circuit.fit_experiments(experiments)
+        circuit_csv_path = os.path.join(main_folder, circuit.OUTPUT_CSV)
+        circuit_table.to_csv(circuit_csv_path, index=False, encoding='utf-8-sig')
+        print(f"等效电路参数已保存为 CSV 文件: {circuit_csv_path}")
         print("所有子文件夹的处理已完成。")
     else:
         print("未选择文件夹。")